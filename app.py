@@ -1,13 +1,32 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file
+from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file, g, has_app_context
+from flask import before_render_template, template_rendered
 from datetime import timedelta, datetime, date
 import calendar
 from flask_sqlalchemy import SQLAlchemy
-import pandas as pd
 from io import BytesIO
-from xhtml2pdf import pisa
+import tempfile
+import json
+import queue
+import uuid
+import base64
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter, deque, namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
 import os
 from werkzeug.utils import secure_filename
-from PIL import Image
+from werkzeug.http import is_resource_modified
+import sqlite3
+import hashlib
+import re
+import threading
+import time
+import logging
+from sqlalchemy import event, table, column, literal_column
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 # -------------------------------
 # Flask App Config
@@ -17,72 +36,510 @@ app.secret_key = "your_secret_key"
 app.permanent_session_lifetime = timedelta(minutes=30)
 
 # -------------------------------
-# MySQL DB Config
+# DB Config
 # -------------------------------
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///church_register.db'
+# SQLite by default; set DATABASE_URL (e.g. postgresql://...) to opt in to a
+# database server instead
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///church_register.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Connection pool, sized per deployment (an in-memory SQLite database keeps
+# its single shared connection)
+def engine_options(database_uri):
+    options = {}
+    if database_uri not in ('sqlite://', 'sqlite:///:memory:'):
+        options.update({
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        })
+    if not database_uri.startswith('sqlite'):
+        options.update({
+            'pool_pre_ping': True,
+            'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        })
+    return options
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
+# Applied to every new SQLite connection. WAL lets readers carry on while a
+# teacher is writing; the busy timeout makes writers wait their turn instead
+# of failing with "database is locked". foreign_keys makes SQLite honour the
+# ON DELETE rules, so deleting a student takes its attendance with it.
+app.config['SQLITE_PRAGMAS'] = {
+    'foreign_keys': 'ON',
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024)),  # Negative means KiB
+}
+
+# Attendance risk: Sundays looked back over, and how many misses flag a
+# student as at risk or get them deactivated
+app.config['ATTENDANCE_RISK_WINDOW'] = 4
+app.config['ATTENDANCE_RISK_THRESHOLD'] = 3
+app.config['ATTENDANCE_DEACTIVATE_THRESHOLD'] = 4
+
+# Class placement by age: each class takes students up to and including its
+# max age, the last (max age None) everyone older. Override with a JSON list
+# of [class, max_age] pairs in CLASS_AGE_BANDS.
+app.config['CLASS_AGE_BANDS'] = [
+    ('Genesis', 5),
+    ('Exodus', 7),
+    ('Psalms', 9),
+    ('Proverbs', 11),
+    ('Revelation', 13),
+    ('High Schoolers', None),
+]
+if os.environ.get('CLASS_AGE_BANDS'):
+    app.config['CLASS_AGE_BANDS'] = [tuple(band) for band in json.loads(os.environ['CLASS_AGE_BANDS'])]
+
+# Rendered attendance PDFs are kept on disk; least recently used files are
+# evicted once the cache grows past the limit
+app.config['REPORT_CACHE_DIR'] = os.path.join(app.instance_path, 'report_cache')
+app.config['REPORT_CACHE_MAX_BYTES'] = int(os.environ.get('REPORT_CACHE_MAX_MB', 200)) * 1024 * 1024
+
+# Report exports (PDF/Excel) run on a background pool; finished files are
+# kept for REPORT_JOB_TTL_MINUTES and then cleaned up
+app.config['REPORT_JOB_DIR'] = os.path.join(app.instance_path, 'report_jobs')
+app.config['REPORT_JOB_WORKERS'] = int(os.environ.get('REPORT_JOB_WORKERS', 2))
+app.config['REPORT_JOBS_PER_USER'] = int(os.environ.get('REPORT_JOBS_PER_USER', 2))
+app.config['REPORT_JOB_TTL_MINUTES'] = int(os.environ.get('REPORT_JOB_TTL_MINUTES', 60))
+
+# Live attendance (/attendance/stream): each open dashboard holds a worker
+# thread and a queue of at most ATTENDANCE_STREAM_QUEUE_SIZE unsent updates.
+# Off by default: under a single sync worker one open dashboard would take
+# the only worker. Turn it on only with more threads than MAX_CLIENTS.
+app.config['ATTENDANCE_STREAM_ENABLED'] = os.environ.get('ATTENDANCE_STREAM_ENABLED') == '1'
+app.config['ATTENDANCE_STREAM_MAX_CLIENTS'] = int(os.environ.get('ATTENDANCE_STREAM_MAX_CLIENTS', 50))
+app.config['ATTENDANCE_STREAM_QUEUE_SIZE'] = int(os.environ.get('ATTENDANCE_STREAM_QUEUE_SIZE', 100))
+app.config['ATTENDANCE_STREAM_KEEPALIVE_SECONDS'] = int(os.environ.get('ATTENDANCE_STREAM_KEEPALIVE_SECONDS', 15))
+
+# Opt-in request profiling (see /admin/perf). A statement run more than
+# PERF_N_PLUS_ONE_THRESHOLD times in one request is flagged as N+1.
+app.config['PERF_INSTRUMENTATION'] = os.environ.get('PERF_INSTRUMENTATION') == '1'
+app.config['PERF_N_PLUS_ONE_THRESHOLD'] = int(os.environ.get('PERF_N_PLUS_ONE_THRESHOLD', 50))
+app.config['PERF_SLOW_REQUEST_MS'] = int(os.environ.get('PERF_SLOW_REQUEST_MS', 500))
+app.config['PERF_RECENT_REQUESTS'] = int(os.environ.get('PERF_RECENT_REQUESTS', 200))
+
 # Image upload configuration - use absolute path
 import os
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads', 'profiles')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-
-# Create upload directory if it doesn't exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Unreferenced uploads younger than this are left alone by the orphan sweep,
+# so a file saved just before its student row is committed survives
+app.config['UPLOAD_GC_GRACE_MINUTES'] = int(os.environ.get('UPLOAD_GC_GRACE_MINUTES', 60))
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def resize_image(image_path, max_size=(200, 200)):
-    """Resize image to max_size while maintaining aspect ratio"""
+# -------------------------------
+# Profile Image Pipeline
+# -------------------------------
+# Every upload gets a list, card and detail size in WebP and JPEG, written
+# off the request path to static/uploads/profiles/variants
+PROFILE_IMAGE_SIZES = {'list': 48, 'card': 200, 'detail': 800}
+PROFILE_IMAGE_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+PROFILE_ORIGINAL_MAX_SIZE = 1600
+
+image_executor = None  # Started by create_app()
+_images_in_progress = set()
+_images_lock = threading.Lock()
+_profile_photo_cache = {}  # (filename, mtime_ns) -> URLs, once all variants exist
+
+def variant_folder():
+    return os.path.join(app.config['UPLOAD_FOLDER'], 'variants')
+
+def image_variant_name(filename, width, ext):
+    return f"{os.path.splitext(filename)[0]}_{width}.{ext}"
+
+def save_image_atomically(img, path, fmt, **options):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    img.save(tmp_path, fmt, **options)
+    os.replace(tmp_path, path)
+
+def sanitize_upload(path):
+    """Strip EXIF (e.g. GPS) from a JPEG/PNG and cap its size, in place; return whether it changed.
+
+    Runs before an upload is hashed, so its stored name always matches its bytes.
+    """
+    from PIL import Image, ImageOps  # Only uploads need Pillow
     try:
-        with Image.open(image_path) as img:
-            img.thumbnail(max_size, Image.Resampling.LANCZOS)
-            img.save(image_path, optimize=True, quality=85)
-    except Exception as e:
-        print(f"Error resizing image: {e}")
+        with Image.open(path) as original:
+            original_format = original.format
+            if original_format not in ('JPEG', 'PNG') or not (
+                    original.getexif() or max(original.size) > PROFILE_ORIGINAL_MAX_SIZE):
+                return False
+            img = ImageOps.exif_transpose(original)
+    except OSError:
+        return False  # Not an image Pillow can read; the variant worker reports it
+    img.thumbnail((PROFILE_ORIGINAL_MAX_SIZE, PROFILE_ORIGINAL_MAX_SIZE), Image.Resampling.LANCZOS)
+    if original_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    save_image_atomically(img, path, original_format, optimize=True, quality=90)
+    return True
+
+def process_profile_image(filename):
+    """Write all of an upload's size/format variants; the stored original is left as it is."""
+    from PIL import Image, ImageOps  # Only the image worker needs Pillow
+    path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    os.makedirs(variant_folder(), exist_ok=True)
+
+    with Image.open(path) as original:
+        img = ImageOps.exif_transpose(original)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, 'white')
+            background.paste(img, mask=img.getchannel('A'))
+            img = background
+        else:
+            img = img.convert('RGB')
+
+    for width in PROFILE_IMAGE_SIZES.values():
+        variant = img.copy()
+        variant.thumbnail((width, width), Image.Resampling.LANCZOS)
+        for ext, fmt in PROFILE_IMAGE_FORMATS.items():
+            variant_path = os.path.join(variant_folder(), image_variant_name(filename, width, ext))
+            save_image_atomically(variant, variant_path, fmt, optimize=True, quality=82)
+
+def queue_profile_image(filename):
+    """Generate an upload's variants in the background (once at a time per file)."""
+    with _images_lock:
+        if filename in _images_in_progress:
+            return
+        _images_in_progress.add(filename)
+
+    def run():
+        try:
+            process_profile_image(filename)
+            # Photo URLs switch to the variants, so cached student JSON is stale
+            with app.app_context():
+                bump_data_versions([PHOTO_SCOPE])
+                db.session.commit()
+        except Exception as e:
+            print(f"Error processing image {filename}: {e}")
+        finally:
+            with _images_lock:
+                _images_in_progress.discard(filename)
+
+    image_executor.submit(run)
+
+def remove_profile_image_variants(filename):
+    for width in PROFILE_IMAGE_SIZES.values():
+        for ext in PROFILE_IMAGE_FORMATS:
+            variant_path = os.path.join(variant_folder(), image_variant_name(filename, width, ext))
+            if os.path.exists(variant_path):
+                os.remove(variant_path)
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def profile_photo(filename):
+    """Return the URLs templates need to show an upload.
+
+    {'list', 'card', 'detail'} are single JPEG URLs and {'webp', 'jpg'}
+    are srcset strings. Variant URLs carry the original's content hash, so
+    browsers can cache them forever. Until the variants exist (e.g. for
+    uploads from before the pipeline) they are queued and every URL points
+    at the original.
+    """
+    path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    original_url = url_for('static', filename='uploads/profiles/' + filename)
+    fallback = {'list': original_url, 'card': original_url, 'detail': original_url, 'webp': '', 'jpg': ''}
+    try:
+        key = (filename, os.stat(path).st_mtime_ns)
+    except OSError:
+        return fallback
+    if key in _profile_photo_cache:
+        return _profile_photo_cache[key]
+
+    names = {(width, ext): image_variant_name(filename, width, ext)
+             for width in PROFILE_IMAGE_SIZES.values() for ext in PROFILE_IMAGE_FORMATS}
+    if not all(os.path.exists(os.path.join(variant_folder(), name)) for name in names.values()):
+        queue_profile_image(filename)
+        return fallback
+
+    if CONTENT_ADDRESSED_NAME.match(filename):
+        version = os.path.splitext(filename)[0][:12]
+    else:
+        version = file_digest(path)[:12]
+    urls = {key: url_for('static', filename='uploads/profiles/variants/' + name, v=version)
+            for key, name in names.items()}
+    photo = {label: urls[(width, 'jpg')] for label, width in PROFILE_IMAGE_SIZES.items()}
+    for ext in PROFILE_IMAGE_FORMATS:
+        photo[ext] = ", ".join(f"{urls[(width, ext)]} {width}w" for width in PROFILE_IMAGE_SIZES.values())
+    _profile_photo_cache[key] = photo
+    return photo
+
+@app.after_request
+def cache_versioned_uploads(response):
+    # Variant URLs change whenever the image does, so they never need revalidating
+    if request.path.startswith('/static/uploads/') and request.args.get('v') and response.status_code == 200:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    return response
+
+# Bound to the app by create_app()
+db = SQLAlchemy()
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
 
-db = SQLAlchemy(app)
+# -------------------------------
+# Performance Instrumentation
+# -------------------------------
+# Off unless PERF_INSTRUMENTATION is set, in which case create_app() hooks
+# the listeners below in. Each request and report job then gets a `g.perf`
+# profile (DB, template and export time, repeated statements) that is
+# logged as one JSON line and summed per route for /admin/perf, and every
+# response carries its statement count in X-Query-Count. When it is off,
+# nothing is registered, so statements and responses pay nothing for it.
+perf_logger = logging.getLogger('ccl_register.perf')
+
+_perf_lock = threading.Lock()
+_perf_routes = {}
+_perf_recent = deque()  # Sized from PERF_RECENT_REQUESTS by create_app()
+
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    if not has_app_context():
+        return
+    g.query_count = g.get('query_count', 0) + 1
+    perf = g.get('perf')
+    if perf is not None:
+        perf['statements'][statement] += 1
+        conn.info.setdefault('perf_started', []).append(time.perf_counter())
+
+def time_query(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and g.get('perf') is not None and conn.info.get('perf_started'):
+        g.perf['db_ms'] += (time.perf_counter() - conn.info['perf_started'].pop()) * 1000
+
+def start_render_timer(sender, template, context, **extra):
+    if g.get('perf') is not None:
+        g.perf['render_started'].append(time.perf_counter())
+
+def stop_render_timer(sender, template, context, **extra):
+    if g.get('perf') is not None and g.perf['render_started']:
+        g.perf['render_ms'] += (time.perf_counter() - g.perf['render_started'].pop()) * 1000
+
+@contextmanager
+def perf_timer(key):
+    """Add the time spent in the block to g.perf[key], e.g. 'export_ms'."""
+    perf = g.get('perf') if has_app_context() else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if perf is not None:
+            perf[key] += (time.perf_counter() - start) * 1000
+
+def perf_begin():
+    """Start profiling the current request or job, if instrumentation is on."""
+    if app.config['PERF_INSTRUMENTATION']:
+        g.perf = {'started': time.perf_counter(), 'db_ms': 0.0, 'render_ms': 0.0, 'export_ms': 0.0,
+                  'render_started': [], 'statements': Counter()}
+
+def perf_finish(route, status):
+    """Close the current profile, log it and add it to the per-route totals."""
+    perf = g.pop('perf', None)
+    if perf is None:
+        return None
+
+    threshold = app.config['PERF_N_PLUS_ONE_THRESHOLD']
+    record = {
+        'route': route,
+        'status': status,
+        'at': datetime.now().isoformat(timespec='seconds'),
+        'total_ms': round((time.perf_counter() - perf['started']) * 1000, 1),
+        'queries': sum(perf['statements'].values()),
+        'db_ms': round(perf['db_ms'], 1),
+        'render_ms': round(perf['render_ms'], 1),
+        'export_ms': round(perf['export_ms'], 1),
+        'n_plus_one': [{'statement': statement, 'count': count}
+                       for statement, count in perf['statements'].most_common() if count > threshold],
+    }
+    record['slow'] = record['total_ms'] >= app.config['PERF_SLOW_REQUEST_MS']
+
+    with _perf_lock:
+        _perf_recent.append(record)
+        totals = _perf_routes.setdefault(route, {
+            'route': route, 'requests': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'queries': 0,
+            'db_ms': 0.0, 'render_ms': 0.0, 'export_ms': 0.0, 'slow': 0, 'n_plus_one': 0
+        })
+        totals['requests'] += 1
+        totals['max_ms'] = max(totals['max_ms'], record['total_ms'])
+        totals['slow'] += record['slow']
+        totals['n_plus_one'] += bool(record['n_plus_one'])
+        for key in ('total_ms', 'queries', 'db_ms', 'render_ms', 'export_ms'):
+            totals[key] += record[key]
+
+    level = logging.WARNING if record['slow'] or record['n_plus_one'] else logging.INFO
+    perf_logger.log(level, json.dumps(record))
+    return record
+
+def perf_summary():
+    """Per-route averages (slowest first) and the recent slow or N+1 requests."""
+    with _perf_lock:
+        routes = [dict(totals) for totals in _perf_routes.values()]
+        flagged = [record for record in _perf_recent if record['slow'] or record['n_plus_one']]
+    for totals in routes:
+        for key in ('total_ms', 'queries', 'db_ms', 'render_ms', 'export_ms'):
+            totals[f'avg_{key}'] = round(totals[key] / totals['requests'], 1)
+    routes.sort(key=lambda totals: totals['total_ms'], reverse=True)
+    return {'enabled': app.config['PERF_INSTRUMENTATION'], 'routes': routes, 'flagged': flagged[::-1]}
+
+def start_request_profile():
+    if request.endpoint != 'static':
+        perf_begin()
+
+def report_query_count(response):
+    count = g.get('query_count', 0)
+    response.headers['X-Query-Count'] = str(count)
+    app.logger.debug("%s %s: %d queries", request.method, request.endpoint, count)
+    perf_finish(f"{request.method} {request.endpoint}", response.status_code)
+    return response
+
+def enable_perf_instrumentation():
+    """Register the profiling listeners and request hooks (once; called by create_app)."""
+    if event.contains(Engine, "before_cursor_execute", count_query):
+        return
+    event.listen(Engine, "before_cursor_execute", count_query)
+    event.listen(Engine, "after_cursor_execute", time_query)
+    before_render_template.connect(start_render_timer, app)
+    template_rendered.connect(stop_render_timer, app)
+    app.before_request(start_request_profile)
+    app.after_request(report_query_count)
 
 # -------------------------------
 # Student Model (Table)
 # -------------------------------
 class Student(db.Model):
+    __table_args__ = (
+        # Serves the paginated lists, which filter on status and walk (class, name, id)
+        db.Index('ix_student_status_class_name_id', 'status', 'student_class', 'name', 'id'),
+        # Age queries (placement, promotion, "turning 6 by September") are dob ranges over active students
+        db.Index('ix_student_status_dob', 'status', 'dob'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    dob = db.Column(db.String(20), nullable=False)
+    dob = db.Column(db.Date, nullable=False)
     parent = db.Column(db.String(100))
     contact = db.Column(db.String(50))
     student_class = db.Column(db.String(50))
     status = db.Column(db.String(10), default="active")
     deletion_requested = db.Column(db.Boolean, default=False)
-    profile_image = db.Column(db.String(200))  # Store image filename
+    profile_image = db.Column(db.String(200), index=True)  # Stored upload name, "<sha256>.<ext>"
     family_id = db.Column(db.String(50))  # For grouping family members
 
          # Attendance Model
 class Attendance(db.Model):
+    __table_args__ = (
+        db.Index('ux_attendance_student_date', 'student_id', 'date', unique=True),
+        db.Index('ix_attendance_date', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    student_id = db.Column(db.Integer, db.ForeignKey(Student.id), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey(Student.id, ondelete='CASCADE'), nullable=False)
     date = db.Column(db.Date, nullable=False)
     present = db.Column(db.Boolean, default=True)
 
-    # Relationship (optional but powerful)
-    student = db.relationship('Student', backref=db.backref('attendances', lazy=True))
+    # Relationship (optional but powerful); the database deletes a student's rows
+    student = db.relationship('Student', backref=db.backref('attendances', lazy=True, passive_deletes=True))
+
+# -------------------------------
+# Attendance Rollups
+# -------------------------------
+# Monthly totals kept up to date by apply_attendance_changes() whenever
+# attendance is written. student_class is the class the student was in when
+# the month was first marked, so promotions don't rewrite past class totals.
+class AttendanceRollup(db.Model):
+    __table_args__ = (
+        db.Index('ux_attendance_rollup_student_month', 'student_id', 'year', 'month', unique=True),
+        db.Index('ix_attendance_rollup_class_month', 'student_class', 'year', 'month'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey(Student.id, ondelete='CASCADE'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    student_class = db.Column(db.String(50))
+    present_count = db.Column(db.Integer, nullable=False, default=0)
+    marked_count = db.Column(db.Integer, nullable=False, default=0)
+
+class ClassAttendanceRollup(db.Model):
+    __table_args__ = (
+        db.Index('ux_class_attendance_rollup_class_month', 'student_class', 'year', 'month', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_class = db.Column(db.String(50), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    present_count = db.Column(db.Integer, nullable=False, default=0)
+    student_count = db.Column(db.Integer, nullable=False, default=0)  # Students with any mark that month
+    sundays_held = db.Column(db.Integer, nullable=False, default=0)  # Sundays with any mark for the class
+
+# Marks per class per Sunday. A class month's sundays_held counts its days
+# here, so a save adjusts one counter instead of recounting the month.
+class ClassAttendanceDay(db.Model):
+    __table_args__ = (
+        db.Index('ux_class_attendance_day_class_date', 'student_class', 'date', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_class = db.Column(db.String(50), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    marked_count = db.Column(db.Integer, nullable=False, default=0)
 
 # -------------------------------
 # Inventory Model (Table)
 # -------------------------------
 class Inventory(db.Model):
+    __table_args__ = (
+        db.Index('ux_inventory_qr_code', 'qr_code', unique=True),
+        db.Index('ix_inventory_category', 'category'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     item_name = db.Column(db.String(100), nullable=False)
     quantity = db.Column(db.Integer, default=0)
-    description = db.Column(db.String(200))
+    category = db.Column(db.String(100))
+    qr_code = db.Column(db.String(100))
+    description = db.Column(db.String(200))  # Legacy "{category} - QR: {code}", see migration 0005
     date_added = db.Column(db.DateTime, default=datetime.now)
     last_checked = db.Column(db.DateTime, default=datetime.now)
     notes = db.Column(db.Text)  # For missing items explanations
 
+class ScanSession(db.Model):
+    # One stock-take; several scanners can post codes to the same session
+    id = db.Column(db.String(32), primary_key=True)
+    category = db.Column(db.String(100))  # None for the whole inventory
+    started_by = db.Column(db.String(100))
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    closed_at = db.Column(db.DateTime)
+    scanned_count = db.Column(db.Integer, nullable=False, default=0)
+    unknown_count = db.Column(db.Integer, nullable=False, default=0)
+
+class Category(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
 class InventoryAudit(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     item_id = db.Column(db.Integer, db.ForeignKey('inventory.id'), nullable=False)
@@ -90,10 +547,25 @@ class InventoryAudit(db.Model):
     date = db.Column(db.DateTime, default=datetime.now)
     user = db.Column(db.String(100))
     notes = db.Column(db.Text)
+    scan_session_id = db.Column(db.String(32), index=True)  # Stock-take that wrote a 'found'/'missing' row
 
     # Relationship
     item = db.relationship('Inventory', backref=db.backref('audit_logs', lazy=True))
 
+# -------------------------------
+# Promotion Log Model
+# -------------------------------
+# One row per student moved; rows written by the same promotion share a run_id
+class PromotionLog(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.String(32), nullable=False, index=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id', ondelete='CASCADE'), nullable=False, index=True)
+    from_class = db.Column(db.String(50))
+    to_class = db.Column(db.String(50), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # 'automatic' or 'manual'
+    promoted_by = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'))
+    promoted_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
 # -------------------------------
 # User Model
 # -------------------------------
@@ -109,11 +581,587 @@ class User(db.Model):
     preferred_class = db.Column(db.String(50), nullable=True)
     status = db.Column(db.String(20), nullable=False, default="pending")
     registration_message = db.Column(db.Text, nullable=True)
-    approved_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    approved_by = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
     approved_at = db.Column(db.DateTime, nullable=True)
     last_login = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
 
+# -------------------------------
+# Schema Migration Log
+# -------------------------------
+class SchemaMigration(db.Model):
+    name = db.Column(db.String(100), primary_key=True)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+# -------------------------------
+# Report Job Model
+# -------------------------------
+class ReportJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # 'attendance_pdf', 'attendance_excel', 'inventory_pdf', 'inventory_excel'
+    params = db.Column(db.Text)  # JSON of the export's query arguments
+    user_id = db.Column(db.Integer, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'running', 'done', 'failed'
+    filename = db.Column(db.String(200))
+    mimetype = db.Column(db.String(100))
+    file_path = db.Column(db.String(300))
+    error = db.Column(db.Text)
+    etag = db.Column(db.String(64), index=True)  # Data the export was queued for; equal tags reuse the file
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    finished_at = db.Column(db.DateTime)
+
+# -------------------------------
+# Data Version Model
+# -------------------------------
+class DataVersion(db.Model):
+    # Bumped in the same transaction as any write to the data behind a scope,
+    # e.g. "attendance:Genesis:2026-03" or "roster:Genesis"
+    scope = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime)  # Sent as Last-Modified
+
+# -------------------------------
+# Upload Storage
+# -------------------------------
+# Uploads are stored once per distinct content as "<sha256>.<ext>", so the
+# same photo uploaded for several siblings (or twice in one second) shares a
+# single file. Student.profile_image rows are the references. Nothing is
+# deleted when a reference goes: another request may be handing the same
+# file to a new student in a transaction not yet committed. The orphan
+# sweep (flask gc-uploads) removes files unreferenced for the whole grace
+# period, and store_upload() restarts that period whenever it reuses one.
+CONTENT_ADDRESSED_NAME = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]+$')
+
+_uploads_lock = threading.Lock()
+
+def upload_extension(filename):
+    ext = filename.rsplit('.', 1)[1].lower()
+    return 'jpg' if ext == 'jpeg' else ext
+
+def store_upload(file):
+    """Save an uploaded file under its content hash and return the stored name.
+
+    The hash is taken after sanitize_upload(), so it is the hash of the
+    bytes on disk.
+    """
+    folder = app.config['UPLOAD_FOLDER']
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            shutil.copyfileobj(file.stream, out, 65536)
+        sanitize_upload(tmp_path)
+        digest = file_digest(tmp_path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    filename = f"{digest}.{upload_extension(file.filename)}"
+    path = os.path.join(folder, filename)
+    with _uploads_lock:
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            # Refresh the mtime so the orphan sweep's grace period covers it again
+            os.utime(path)
+        else:
+            os.replace(tmp_path, path)
+    queue_profile_image(filename)
+    return filename
+
+def upload_ref_counts(filenames=None):
+    """Return {filename: number of students referencing it}."""
+    query = db.session.query(Student.profile_image, db.func.count(Student.id)) \
+        .filter(Student.profile_image.isnot(None)) \
+        .group_by(Student.profile_image)
+    if filenames is not None:
+        query = query.filter(Student.profile_image.in_(list(filenames)))
+    return dict(query.all())
+
+def delete_upload(filename):
+    path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if os.path.exists(path):
+        os.remove(path)
+    remove_profile_image_variants(filename)
+
+def collect_orphan_uploads():
+    """Delete uploads and variants no student references; return the number removed."""
+    folder = app.config['UPLOAD_FOLDER']
+    cutoff = (datetime.now() - timedelta(minutes=app.config['UPLOAD_GC_GRACE_MINUTES'])).timestamp()
+    removed = 0
+    with _uploads_lock:
+        referenced = set(upload_ref_counts())
+        for entry in os.scandir(folder):
+            if not entry.is_file() or entry.name in referenced:
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    delete_upload(entry.name)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+
+        if os.path.isdir(variant_folder()):
+            originals = {os.path.splitext(name)[0] for name in os.listdir(folder)}
+            for entry in os.scandir(variant_folder()):
+                if entry.name.rsplit('_', 1)[0] not in originals:
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+    return removed
+
+# Run from cron or by hand: flask --app 'app:create_app()' gc-uploads
+@app.cli.command('gc-uploads')
+def gc_uploads_command():
+    """Delete uploads no student references, once past the grace period."""
+    print(f"Removed {collect_orphan_uploads()} unreferenced uploads")
+
+# -------------------------------
+# Student Search
+# -------------------------------
+# On SQLite, name/parent/contact are indexed in an FTS5 table that triggers
+# keep in step with student (created by migration 0003). Other databases
+# fall back to LIKE filters.
+STUDENT_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS student_search USING fts5("
+    "name, parent, contact, content='student', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS student_search_ai AFTER INSERT ON student BEGIN "
+    "INSERT INTO student_search(rowid, name, parent, contact) VALUES (new.id, new.name, new.parent, new.contact); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS student_search_ad AFTER DELETE ON student BEGIN "
+    "INSERT INTO student_search(student_search, rowid, name, parent, contact) "
+    "VALUES ('delete', old.id, old.name, old.parent, old.contact); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS student_search_au AFTER UPDATE OF name, parent, contact ON student BEGIN "
+    "INSERT INTO student_search(student_search, rowid, name, parent, contact) "
+    "VALUES ('delete', old.id, old.name, old.parent, old.contact); "
+    "INSERT INTO student_search(rowid, name, parent, contact) VALUES (new.id, new.name, new.parent, new.contact); "
+    "END",
+    "INSERT INTO student_search(student_search) VALUES ('rebuild')",
+]
+STUDENTS_PER_PAGE = 50
+AUTOCOMPLETE_LIMIT = 8
+
+student_search_table = table('student_search', column('rowid'), column('student_search'))
+_search_available = {}  # Engine -> whether student_search exists; reset by run_migrations()
+
+def search_terms(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+def student_search_available():
+    engine = db.engine
+    if engine not in _search_available:
+        # search_students() needs MATERIALIZED CTEs, added in SQLite 3.35
+        _search_available[engine] = (
+            engine.dialect.name == 'sqlite' and sqlite3.sqlite_version_info >= (3, 35)
+            and db.session.execute(db.text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'student_search'"
+            )).first() is not None
+        )
+    return _search_available[engine]
+
+def search_students(query, text):
+    """Narrow a Student query to rows matching every word of `text` as a prefix.
+
+    Results come back best match first (a name hit outranks a parent or
+    contact hit), then by name.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return query.order_by(Student.name, Student.id)
+
+    if student_search_available():
+        # Materialized so the MATCH runs once, rather than once per student
+        # when the planner picks a student index to drive the join
+        match = " ".join(f'"{term}"*' for term in terms)
+        matches = db.select(
+            student_search_table.c.rowid.label('student_id'),
+            db.func.bm25(literal_column('student_search'), 10.0, 2.0, 2.0).label('rank')
+        ).where(student_search_table.c.student_search.op('MATCH')(match)) \
+            .cte('student_matches').prefix_with('MATERIALIZED')
+        return query.join(matches, matches.c.student_id == Student.id) \
+            .order_by(matches.c.rank, Student.name, Student.id)
+
+    for term in terms:
+        pattern = f"%{term}%"
+        query = query.filter(db.or_(Student.name.ilike(pattern),
+                                    Student.parent.ilike(pattern),
+                                    Student.contact.ilike(pattern)))
+    return query.order_by(Student.name, Student.id)
+
+# -------------------------------
+# Student Lists
+# -------------------------------
+# Long student lists are served a page at a time. Pages continue from an
+# opaque cursor: the (student_class, name, id) of the last row shown, or,
+# for ranked search results, the offset to continue from. Students without
+# a class come first on every database (SQLite's default, not PostgreSQL's).
+STUDENT_LIST_ORDER = (Student.student_class.nulls_first(), Student.name, Student.id)
+
+def encode_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+def decode_cursor(cursor):
+    """Return the value packed into a cursor (None for the first page); ValueError if malformed."""
+    if not cursor:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def after_cursor(student_class, name, student_id):
+    """Filter for the rows that follow (student_class, name, id) in list order.
+
+    A row value comparison is never true against NULL, so the rows without
+    a class need their own branch: after one of them come the rest of them
+    and then every row with a class.
+    """
+    if student_class is None:
+        return db.or_(db.and_(Student.student_class.is_(None),
+                              db.tuple_(Student.name, Student.id) > db.tuple_(name, student_id)),
+                      Student.student_class.isnot(None))
+    # Rows without a class sort first, so they are never after this one
+    return db.tuple_(Student.student_class, Student.name, Student.id) > db.tuple_(student_class, name, student_id)
+
+def keyset_page(query, cursor=None, per_page=None):
+    """Return (students, next_cursor) for one page of a Student query in list order."""
+    per_page = per_page or STUDENTS_PER_PAGE
+    after = decode_cursor(cursor)
+    if after is not None:
+        if not isinstance(after, list) or len(after) != len(STUDENT_LIST_ORDER):
+            raise ValueError(f"Invalid cursor: {cursor}")
+        query = query.filter(after_cursor(*after))
+    students = query.order_by(*STUDENT_LIST_ORDER).limit(per_page + 1).all()
+    if len(students) <= per_page:
+        return students, None
+    last = students[per_page - 1]
+    return students[:per_page], encode_cursor([last.student_class, last.name, last.id])
+
+def search_page(query, text, cursor=None, per_page=None):
+    """Like keyset_page, for search results kept in rank order."""
+    per_page = per_page or STUDENTS_PER_PAGE
+    offset = decode_cursor(cursor) or 0
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    students = search_students(query, text).offset(offset).limit(per_page + 1).all()
+    if len(students) <= per_page:
+        return students, None
+    return students[:per_page], encode_cursor(offset + per_page)
+
+def dashboard_rows(selected_class, sundays, cursor=None):
+    """One page of dashboard rows with their attendance for the month's Sundays."""
+    query = Student.query.filter(Student.status == "active")
+    if selected_class:
+        query = query.filter(Student.student_class == selected_class)
+    students, next_cursor = keyset_page(query, cursor)
+    return {
+        "students": students,
+        "sundays": sundays,
+        "attendance_grid": load_attendance_grid(students, sundays, selected_class),
+        "next_cursor": next_cursor,
+    }
+
+def all_students_query(selected_class=None):
+    # Only active students with photos are listed
+    query = Student.query.filter(Student.status == "active", Student.profile_image != None)
+    if selected_class:
+        query = query.filter_by(student_class=selected_class)
+    return query
+
+def all_students_rows(selected_class, search_query, cursor=None):
+    """One page of the all_students list: browsed in class order, or searched by rank."""
+    query = all_students_query(selected_class)
+    if search_terms(search_query):
+        students, next_cursor = search_page(query, search_query, cursor)
+    else:
+        students, next_cursor = keyset_page(query, cursor)
+    return {"students": students, "next_cursor": next_cursor}
+
+def status_rows(status, cursor=None):
+    """One page of manage_status cards for students with the given status."""
+    students, next_cursor = keyset_page(Student.query.filter(Student.status == status), cursor)
+    return {"students": students, "status": status, "next_cursor": next_cursor}
+
+# -------------------------------
+# Schema Migrations
+# -------------------------------
+def migrate_attendance_indexes():
+    """Drop duplicate (student_id, date) rows, then add the attendance indexes.
+
+    mark_attendance used to update the first matching row, so the lowest id
+    of each duplicate group is the one that holds the latest value.
+    """
+    db.session.execute(db.text(
+        "DELETE FROM attendance WHERE id NOT IN "
+        "(SELECT MIN(id) FROM attendance GROUP BY student_id, date)"
+    ))
+    connection = db.session.connection()
+    for index in Attendance.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+def migrate_content_addressed_uploads():
+    """Rename existing uploads to their content hash and merge duplicates."""
+    folder = app.config['UPLOAD_FOLDER']
+    for index in Student.__table__.indexes:
+        index.create(db.session.connection(), checkfirst=True)
+
+    for filename in list(upload_ref_counts()):
+        path = os.path.join(folder, filename)
+        if CONTENT_ADDRESSED_NAME.match(filename) or not os.path.exists(path):
+            continue
+        stored = f"{file_digest(path)}.{upload_extension(filename)}"
+        stored_path = os.path.join(folder, stored)
+        if os.path.exists(stored_path):
+            os.remove(path)
+        else:
+            os.replace(path, stored_path)
+        remove_profile_image_variants(filename)
+        Student.query.filter_by(profile_image=filename).update(
+            {Student.profile_image: stored}, synchronize_session=False)
+
+def migrate_sanitized_uploads():
+    """Strip EXIF from uploads stored before it happened on upload, renaming them to their new hash.
+
+    The image worker used to rewrite originals in place, so their names may
+    no longer match their bytes either; those are renamed too.
+    """
+    folder = app.config['UPLOAD_FOLDER']
+    for filename in list(upload_ref_counts()):
+        path = os.path.join(folder, filename)
+        if not os.path.exists(path):
+            continue
+        sanitize_upload(path)
+        stored = f"{file_digest(path)}.{upload_extension(filename)}"
+        if stored == filename:
+            continue
+        stored_path = os.path.join(folder, stored)
+        if os.path.exists(stored_path):
+            os.remove(path)
+        else:
+            os.replace(path, stored_path)
+        remove_profile_image_variants(filename)
+        Student.query.filter_by(profile_image=filename).update(
+            {Student.profile_image: stored}, synchronize_session=False)
+
+def migrate_student_search():
+    """Create and fill the FTS5 index behind search_students (SQLite only)."""
+    if db.engine.dialect.name != 'sqlite':
+        return
+    for statement in STUDENT_SEARCH_DDL:
+        db.session.execute(db.text(statement))
+
+def migrate_student_list_index():
+    for index in Student.__table__.indexes:
+        index.create(db.session.connection(), checkfirst=True)
+
+def migrate_inventory_columns():
+    """Split Inventory.description into category/qr_code and replace placeholder items.
+
+    Items used to be stored as description = "{category} - QR: {code}", and
+    empty categories were kept alive by "<Category> Placeholder" items with a
+    PLACEHOLDER_ code.
+    """
+    connection = db.session.connection()
+    existing = {c['name'] for c in db.inspect(connection).get_columns('inventory')}
+    for name in ('category', 'qr_code'):
+        if name not in existing:
+            connection.execute(db.text(f"ALTER TABLE inventory ADD COLUMN {name} VARCHAR(100)"))
+    Category.__table__.create(connection, checkfirst=True)
+
+    # SQLite spells it instr(); PostgreSQL strpos()
+    find = 'strpos' if connection.dialect.name == 'postgresql' else 'instr'
+    connection.execute(db.text(
+        f"UPDATE inventory SET "
+        f"category = substr(description, 1, {find}(description, ' - QR: ') - 1), "
+        f"qr_code = substr(description, {find}(description, ' - QR: ') + 7) "
+        f"WHERE category IS NULL AND {find}(description, ' - QR: ') > 0"
+    ))
+    connection.execute(db.text(
+        "UPDATE inventory SET category = description WHERE category IS NULL AND description IS NOT NULL"
+    ))
+
+    # Every category in use (placeholders included) becomes a Category row
+    names = [row[0] for row in connection.execute(db.text(
+        "SELECT DISTINCT category FROM inventory WHERE category IS NOT NULL AND category != ''"
+    ))]
+    known = {row[0] for row in connection.execute(db.select(Category.name))}
+    for name in names:
+        if name not in known:
+            connection.execute(db.insert(Category).values(name=name, created_at=datetime.now()))
+
+    placeholders = "SELECT id FROM inventory WHERE qr_code LIKE 'PLACEHOLDER!_%' ESCAPE '!'"
+    connection.execute(db.text(f"DELETE FROM inventory_audit WHERE item_id IN ({placeholders})"))
+    connection.execute(db.text(f"DELETE FROM inventory WHERE id IN ({placeholders})"))
+
+    # Codes were only checked with a LIKE, so keep the oldest item per code
+    # and mark later duplicates before the unique index goes on
+    connection.execute(db.text(
+        "UPDATE inventory SET qr_code = qr_code || '-DUP' || id "
+        "WHERE qr_code IS NOT NULL AND id NOT IN (SELECT MIN(id) FROM inventory WHERE qr_code IS NOT NULL GROUP BY qr_code)"
+    ))
+    for index in Inventory.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+def migrate_scan_sessions():
+    connection = db.session.connection()
+    existing = {c['name'] for c in db.inspect(connection).get_columns('inventory_audit')}
+    if 'scan_session_id' not in existing:
+        connection.execute(db.text("ALTER TABLE inventory_audit ADD COLUMN scan_session_id VARCHAR(32)"))
+    for index in InventoryAudit.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    ScanSession.__table__.create(connection, checkfirst=True)
+
+def migrate_attendance_rollups():
+    connection = db.session.connection()
+    AttendanceRollup.__table__.create(connection, checkfirst=True)
+    ClassAttendanceRollup.__table__.create(connection, checkfirst=True)
+    ClassAttendanceDay.__table__.create(connection, checkfirst=True)
+    rebuild_attendance_rollups()
+
+# Formats accepted when migration 0009 turns stored dob text into dates
+LEGACY_DOB_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d', '%d-%m-%Y', '%d.%m.%Y')
+
+def parse_legacy_dob(value):
+    for fmt in LEGACY_DOB_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt).date()
+        except (AttributeError, ValueError):
+            continue
+    return None
+
+def migrate_student_dob_date():
+    """Validate every stored dob, rewrite it as YYYY-MM-DD and index it.
+
+    PostgreSQL columns are converted to DATE. SQLite has no date storage
+    class and keeps ISO text in the existing column, which compares and
+    indexes in date order. Fails, changing nothing, if any dob is unreadable.
+    """
+    connection = db.session.connection()
+    fixes, invalid = [], []
+    for student_id, value in connection.execute(db.text("SELECT id, CAST(dob AS TEXT) FROM student")):
+        parsed = parse_legacy_dob(value)
+        if parsed is None:
+            invalid.append(f"{student_id} ({value!r})")
+        elif parsed.isoformat() != value:
+            fixes.append({'id': student_id, 'dob': parsed.isoformat()})
+    if invalid:
+        raise RuntimeError("Students with an unreadable date of birth: " + ", ".join(invalid))
+
+    if fixes:
+        connection.execute(db.text("UPDATE student SET dob = :dob WHERE id = :id"), fixes)
+    if db.engine.dialect.name == 'postgresql':
+        connection.execute(db.text("ALTER TABLE student ALTER COLUMN dob TYPE DATE USING dob::date"))
+    for index in Student.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+def migrate_promotion_log():
+    PromotionLog.__table__.create(db.session.connection(), checkfirst=True)
+
+def foreign_key_rules(connection, table):
+    """{column: ondelete} for the foreign keys `table` has in the database."""
+    return {tuple(fk['constrained_columns']): (fk.get('options') or {}).get('ondelete')
+            for fk in db.inspect(connection).get_foreign_keys(table.name)}
+
+def rebuild_sqlite_table(connection, table):
+    """Recreate `table` from its model definition, keeping the rows (SQLite can't alter constraints)."""
+    existing = {c['name'] for c in db.inspect(connection).get_columns(table.name)}
+    columns = ", ".join(c.name for c in table.columns if c.name in existing)
+    ddl = str(db.schema.CreateTable(table).compile(connection)).replace(table.name, f"{table.name}__new", 1)
+    connection.execute(db.text(ddl))
+    connection.execute(db.text(f"INSERT INTO {table.name}__new ({columns}) SELECT {columns} FROM {table.name}"))
+    connection.execute(db.text(f"DROP TABLE {table.name}"))
+    connection.execute(db.text(f"ALTER TABLE {table.name}__new RENAME TO {table.name}"))
+    for index in table.indexes:
+        index.create(connection)
+
+def migrate_cascade_deletes():
+    """Give attendance and the promotion log the model's ON DELETE rules.
+
+    Rows that already point at a deleted student are removed first (a
+    deleted user is cleared from promoted_by), since the rebuilt tables
+    would reject them.
+    """
+    connection = db.session.connection()
+    for table in (Attendance.__table__, PromotionLog.__table__):
+        wanted = {tuple(fk.parent.name for fk in constraint.elements): constraint.ondelete
+                  for constraint in table.foreign_key_constraints}
+        if foreign_key_rules(connection, table) == wanted:
+            continue
+
+        for fk in table.foreign_keys:
+            orphaned = (f"{fk.parent.name} IS NOT NULL AND {fk.parent.name} NOT IN "
+                        f"(SELECT {fk.column.name} FROM \"{fk.column.table.name}\")")
+            if fk.ondelete == 'CASCADE':
+                removed = connection.execute(db.text(f"DELETE FROM {table.name} WHERE {orphaned}")).rowcount
+            else:
+                removed = connection.execute(db.text(f"UPDATE {table.name} SET {fk.parent.name} = NULL WHERE {orphaned}")).rowcount
+            if removed:
+                print(f"{table.name}: cleared {removed} rows pointing at a missing {fk.column.table.name}")
+
+        if db.engine.dialect.name == 'sqlite':
+            rebuild_sqlite_table(connection, table)
+            continue
+        for fk in db.inspect(connection).get_foreign_keys(table.name):
+            connection.execute(db.text(f"ALTER TABLE {table.name} DROP CONSTRAINT {fk['name']}"))
+        for constraint in table.foreign_key_constraints:
+            connection.execute(db.schema.AddConstraint(constraint))
+
+def migrate_class_attendance_days():
+    """Add the marks-per-Sunday table behind sundays_held and rebuild the rollups.
+
+    Unmarked values (NULL) become absent, which is how the rollups always
+    counted them, so a save can tell an existing row's old value from the new one.
+    """
+    connection = db.session.connection()
+    connection.execute(db.text("UPDATE attendance SET present = :absent WHERE present IS NULL"), {'absent': False})
+    ClassAttendanceDay.__table__.create(connection, checkfirst=True)
+    rebuild_attendance_rollups()
+
+def migrate_conditional_get():
+    connection = db.session.connection()
+    inspector = db.inspect(connection)
+    if 'updated_at' not in {c['name'] for c in inspector.get_columns('data_version')}:
+        connection.execute(db.text("ALTER TABLE data_version ADD COLUMN updated_at TIMESTAMP"))
+    if 'etag' not in {c['name'] for c in inspector.get_columns('report_job')}:
+        connection.execute(db.text("ALTER TABLE report_job ADD COLUMN etag VARCHAR(64)"))
+    for index in ReportJob.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+# Applied in order, once each; names are recorded in schema_migration
+MIGRATIONS = [
+    ('0001_attendance_indexes', migrate_attendance_indexes),
+    ('0002_content_addressed_uploads', migrate_content_addressed_uploads),
+    ('0003_student_search', migrate_student_search),
+    ('0004_student_list_index', migrate_student_list_index),
+    ('0005_inventory_columns', migrate_inventory_columns),
+    ('0006_scan_sessions', migrate_scan_sessions),
+    ('0007_attendance_rollups', migrate_attendance_rollups),
+    ('0008_promotion_log', migrate_promotion_log),
+    ('0009_student_dob_date', migrate_student_dob_date),
+    ('0010_cascade_deletes', migrate_cascade_deletes),
+    ('0011_conditional_get', migrate_conditional_get),
+    ('0012_class_attendance_days', migrate_class_attendance_days),
+    ('0013_sanitized_uploads', migrate_sanitized_uploads),
+]
+
+def run_migrations():
+    """Apply pending migrations to an existing database, one transaction each."""
+    applied = {row.name for row in SchemaMigration.query.all()}
+    for name, migration in MIGRATIONS:
+        if name in applied:
+            continue
+        try:
+            migration()
+            db.session.add(SchemaMigration(name=name))
+            db.session.commit()
+            print(f"Applied migration {name}")
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            _search_available.clear()  # The schema may have changed
+
 # -------------------------------
 # Initialize Default Users
 # -------------------------------
@@ -152,20 +1200,1288 @@ def create_default_users():
 # -------------------------------
 # Helper: Get all Sundays in a month
 # -------------------------------
+@lru_cache(maxsize=256)
 def get_sundays(year, month):
+    # Cached, so a tuple keeps callers from changing the shared copy
     sundays = []
     cal = calendar.Calendar()
     for day in cal.itermonthdates(year, month):
         if day.weekday() == 6 and day.month == month:
             sundays.append(day)
+    return tuple(sundays)
+
+# -------------------------------
+# Class Placement by Age
+# -------------------------------
+# Age bands become birth-date ranges for a given day, so placement can be
+# done by comparing dob in SQL instead of computing every student's age
+def years_before(day, years):
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:  # 29 February
+        return day.replace(year=day.year - years, day=28)
+
+def age_on(dob, today=None):
+    today = today or date.today()
+    return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+
+def age_band_ranges(today=None):
+    """[(class, born_after, born_on_or_before)] for `today`; None leaves a side open."""
+    today = today or date.today()
+    ranges, youngest = [], None
+    for student_class, max_age in app.config['CLASS_AGE_BANDS']:
+        oldest = years_before(today, max_age + 1) if max_age is not None else None
+        ranges.append((student_class, oldest, youngest))
+        youngest = oldest
+    return ranges
+
+def age_band_labels():
+    """[(class, "0-5"), ..., (class, "14+")] for display."""
+    labels, min_age = [], 0
+    for student_class, max_age in app.config['CLASS_AGE_BANDS']:
+        labels.append((student_class, f"{min_age}-{max_age}" if max_age is not None else f"{min_age}+"))
+        min_age = (max_age or 0) + 1
+    return labels
+
+def dob_in_range(born_after, born_on_or_before):
+    # A range scan on ix_student_status_dob once combined with the status filter
+    conditions = []
+    if born_after:
+        conditions.append(Student.dob > born_after)
+    if born_on_or_before:
+        conditions.append(Student.dob <= born_on_or_before)
+    return db.and_(db.true(), *conditions)
+
+def class_for_dob(dob, today=None):
+    """Age-appropriate class for a birth date."""
+    for student_class, born_after, born_on_or_before in age_band_ranges(today):
+        if (not born_after or dob > born_after) and (not born_on_or_before or dob <= born_on_or_before):
+            return student_class
+    return app.config['CLASS_AGE_BANDS'][-1][0]
+
+def students_turning(age, before, since=None):
+    """Active students whose `age`th birthday falls before `before` (and on or after `since`).
+
+    E.g. students_turning(6, date(2026, 9, 1)) is everyone who is 6 by the
+    start of September.
+    """
+    query = Student.query.filter(Student.status == 'active', Student.dob < years_before(before, age))
+    if since:
+        query = query.filter(Student.dob >= years_before(since, age))
+    return query.order_by(Student.dob, Student.id)
+
+def target_class_expression(today=None):
+    """SQL CASE giving each student's age-appropriate class."""
+    return db.case(*[(dob_in_range(born_after, born_on_or_before), student_class)
+                     for student_class, born_after, born_on_or_before in age_band_ranges(today)])
+
+# -------------------------------
+# Data Versions
+# -------------------------------
+# "*" stands for all classes, so the All Classes reports change too
+def attendance_scopes(student_class, day):
+    month = day.strftime('%Y-%m')
+    return [f"attendance:{student_class}:{month}", f"attendance:*:{month}"]
+
+def roster_scopes(student_class):
+    return [f"roster:{student_class}", "roster:*"]
+
+# Items and categories, behind the inventory page and reports
+INVENTORY_SCOPE = 'inventory'
+# Bumped when the image worker finishes an upload's variants
+PHOTO_SCOPE = 'photos'
+
+def dialect_insert(model):
+    """Return an INSERT for `model` that supports ON CONFLICT on this database."""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as postgresql_insert  # Only PostgreSQL deployments load it
+        return postgresql_insert(model)
+    return sqlite_insert(model)
+
+def bump_data_versions(scopes, connection=None):
+    """Increment the version of every scope as part of the current transaction."""
+    scopes = sorted(set(scopes))
+    if not scopes:
+        return
+    now = datetime.now()
+    stmt = dialect_insert(DataVersion).values([{'scope': scope, 'version': 1, 'updated_at': now} for scope in scopes])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DataVersion.scope],
+        set_={'version': DataVersion.version + 1, 'updated_at': now}
+    )
+    (connection or db.session).execute(stmt)
+
+def get_data_versions(scopes):
+    """Return {scope: version} in one query; scopes never written are 0."""
+    versions = dict.fromkeys(scopes, 0)
+    versions.update(db.session.query(DataVersion.scope, DataVersion.version).filter(
+        DataVersion.scope.in_(list(scopes))
+    ))
+    return versions
+
+@event.listens_for(db.session, "after_flush")
+def bump_versions_after_flush(session, flush_context):
+    """Bump data versions and adjust attendance rollups for rows changed through the ORM.
+
+    Bulk statements bypass this hook and do both themselves.
+    """
+    scopes = []
+    attendance = []
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Student):
+            history = db.inspect(obj).attrs.student_class.history
+            for student_class in {obj.student_class, *history.deleted}:
+                scopes.extend(roster_scopes(student_class))
+        elif isinstance(obj, Attendance):
+            attendance.append(obj)
+        elif isinstance(obj, User):
+            state = db.inspect(obj)
+            if obj in session.new or obj in session.deleted or any(
+                    state.attrs[name].history.has_changes() for name in TEACHER_PANEL_COLUMNS):
+                scopes.append(TEACHER_SCOPE)
+        elif isinstance(obj, (Inventory, Category)):
+            scopes.append(INVENTORY_SCOPE)
+
+    changes = []
+    writes = orm_attendance_writes(session, attendance)
+    if writes:
+        # One lookup for every student involved, old keys included
+        classes = dict(session.connection().execute(
+            db.select(Student.id, Student.student_class)
+            .where(Student.id.in_({student_id for student_id, _, _, _ in writes}))
+        ).all())
+        for student_id, day, old, new in writes:
+            scopes.extend(attendance_scopes(classes.get(student_id), day))
+            changes.append((student_id, classes.get(student_id), day, old, new))
+    bump_data_versions(scopes, session.connection())
+    apply_attendance_changes(changes, session.connection())
+
+def loaded_value(state, name):
+    """`name` as last loaded from the database, ignoring unflushed changes."""
+    history = state.attrs[name].history
+    if history.has_changes():
+        return history.deleted[0] if history.deleted else None
+    return state.attrs[name].value
+
+def orm_attendance_writes(session, objects):
+    """(student_id, date, old_present, new_present) for Attendance objects being flushed.
+
+    None stands for a row that didn't exist before or doesn't after. A row
+    moved to another student or date is a removal under its old key plus an
+    insert under the new one; rows whose present didn't change are left out.
+    """
+    writes = []
+    for obj in objects:
+        state = db.inspect(obj)
+        old = None if obj in session.new else (
+            loaded_value(state, 'student_id'), loaded_value(state, 'date'), bool(loaded_value(state, 'present')))
+        new = None if obj in session.deleted else (obj.student_id, obj.date, bool(obj.present))
+        if old and new and old[:2] == new[:2]:
+            if old[2] != new[2]:
+                writes.append((*new[:2], old[2], new[2]))
+            continue
+        if old:
+            writes.append((*old[:2], old[2], None))
+        if new:
+            writes.append((*new[:2], None, new[2]))
+    return writes
+
+# -------------------------------
+# Conditional GET
+# -------------------------------
+# Strong ETags built from data versions, so an unchanged report or record is
+# answered with 304 before any of the work behind it is done
+def data_validators(scopes, *key):
+    """Return (etag, last_modified) for the current versions of `scopes` plus `key`."""
+    rows = {scope: (version, updated_at) for scope, version, updated_at in db.session.query(
+        DataVersion.scope, DataVersion.version, DataVersion.updated_at
+    ).filter(DataVersion.scope.in_(sorted(set(scopes))))}
+    state = [(scope, rows.get(scope, (0, None))[0]) for scope in sorted(set(scopes))]
+    etag = hashlib.sha256(json.dumps([state, *key], default=str).encode()).hexdigest()[:32]
+    modified = [updated_at for _, updated_at in rows.values() if updated_at]
+    return etag, max(modified).replace(microsecond=0) if modified else None
+
+def not_modified(scopes, *key):
+    """Return a 304 response if the client's copy is still current, otherwise None.
+
+    The tag covers the URL (path and query) and `key` as well as the
+    scopes; add_validators() puts it on the response the route goes on to build.
+    """
+    etag, last_modified = data_validators(scopes, request.full_path, *key)
+    g.validators = (etag, last_modified)
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return app.response_class(status=304)
+
+@app.after_request
+def add_validators(response):
+    validators = g.get('validators')
+    if validators and response.status_code in (200, 304):
+        etag, last_modified = validators
+        response.set_etag(etag)
+        if last_modified:
+            response.last_modified = last_modified
+        # Keep a copy, but check back every time
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    return response
+
+# -------------------------------
+# Helper: Maintain attendance rollups
+# -------------------------------
+def month_bounds(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+def attendance_rate(present_count, possible):
+    return round(100 * present_count / possible, 1) if possible else None
+
+def apply_attendance_changes(changes, connection=None):
+    """Adjust the rollups by signed deltas for a set of attendance writes.
+
+    `changes` holds (student_id, student_class, date, old_present,
+    new_present) tuples, None standing for a row that didn't exist before or
+    doesn't after. Nothing is re-aggregated: each upsert adds the change to
+    the stored counters and returns the new totals, which tell when a
+    student month or a class's Sunday gained its first mark or lost its
+    last. New student months are filed under `student_class`. Runs in the
+    caller's transaction, so rollups never lag the attendance rows. Does
+    not commit.
+    """
+    execute = (connection or db.session).execute
+    months = {}
+    for student_id, student_class, day, old, new in changes:
+        present = bool(new) - bool(old)
+        marked = (new is not None) - (old is not None)
+        if present or marked:
+            delta = months.setdefault((student_id, day.year, day.month),
+                                      {'student_class': student_class, 'present': 0, 'marked': 0, 'days': Counter()})
+            delta['present'] += present
+            delta['marked'] += marked
+            delta['days'][day] += marked
+
+    class_deltas = {}  # (class, year, month) -> [present, students, sundays]
+    day_deltas = Counter()  # (class, date) -> marks
+    keys = list(months)
+    for start in range(0, len(keys), UPSERT_CHUNK_SIZE):
+        rows = [{'student_id': student_id, 'year': year, 'month': month,
+                 'student_class': months[(student_id, year, month)]['student_class'],
+                 'present_count': months[(student_id, year, month)]['present'],
+                 'marked_count': months[(student_id, year, month)]['marked']}
+                for student_id, year, month in keys[start:start + UPSERT_CHUNK_SIZE]]
+        stmt = dialect_insert(AttendanceRollup).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AttendanceRollup.student_id, AttendanceRollup.year, AttendanceRollup.month],
+            set_={'present_count': AttendanceRollup.present_count + stmt.excluded.present_count,
+                  'marked_count': AttendanceRollup.marked_count + stmt.excluded.marked_count}
+        ).returning(AttendanceRollup.student_id, AttendanceRollup.year, AttendanceRollup.month,
+                    AttendanceRollup.student_class, AttendanceRollup.marked_count)
+        emptied = {}  # (year, month) -> students left with no marks
+        for student_id, year, month, student_class, marked_after in execute(stmt).all():
+            delta = months[(student_id, year, month)]
+            if marked_after <= 0:
+                emptied.setdefault((year, month), []).append(student_id)
+            if student_class is None:
+                continue
+            totals = class_deltas.setdefault((student_class, year, month), [0, 0, 0])
+            totals[0] += delta['present']
+            totals[1] += (marked_after > 0) - (marked_after - delta['marked'] > 0)
+            for day, marks in delta['days'].items():
+                if marks:
+                    day_deltas[(student_class, day)] += marks
+        for (year, month), student_ids in emptied.items():
+            execute(db.delete(AttendanceRollup).where(
+                AttendanceRollup.student_id.in_(student_ids),
+                AttendanceRollup.year == year, AttendanceRollup.month == month))
+
+    days = [key for key, marks in day_deltas.items() if marks]
+    for start in range(0, len(days), UPSERT_CHUNK_SIZE):
+        rows = [{'student_class': student_class, 'date': day, 'marked_count': day_deltas[(student_class, day)]}
+                for student_class, day in days[start:start + UPSERT_CHUNK_SIZE]]
+        stmt = dialect_insert(ClassAttendanceDay).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ClassAttendanceDay.student_class, ClassAttendanceDay.date],
+            set_={'marked_count': ClassAttendanceDay.marked_count + stmt.excluded.marked_count}
+        ).returning(ClassAttendanceDay.student_class, ClassAttendanceDay.date, ClassAttendanceDay.marked_count)
+        emptied = {}  # class -> days left with no marks
+        for student_class, day, marked_after in execute(stmt).all():
+            if marked_after <= 0:
+                emptied.setdefault(student_class, []).append(day)
+            totals = class_deltas.setdefault((student_class, day.year, day.month), [0, 0, 0])
+            totals[2] += (marked_after > 0) - (marked_after - day_deltas[(student_class, day)] > 0)
+        for student_class, emptied_days in emptied.items():
+            execute(db.delete(ClassAttendanceDay).where(
+                ClassAttendanceDay.student_class == student_class, ClassAttendanceDay.date.in_(emptied_days)))
+
+    rows = [{'student_class': student_class, 'year': year, 'month': month,
+             'present_count': present, 'student_count': students, 'sundays_held': held}
+            for (student_class, year, month), (present, students, held) in class_deltas.items()
+            if present or students or held]
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        stmt = dialect_insert(ClassAttendanceRollup).values(rows[start:start + UPSERT_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ClassAttendanceRollup.student_class, ClassAttendanceRollup.year, ClassAttendanceRollup.month],
+            set_={'present_count': ClassAttendanceRollup.present_count + stmt.excluded.present_count,
+                  'student_count': ClassAttendanceRollup.student_count + stmt.excluded.student_count,
+                  'sundays_held': ClassAttendanceRollup.sundays_held + stmt.excluded.sundays_held}
+        )
+        execute(stmt)
+
+def refresh_attendance_rollups(student_months, connection=None):
+    """Recompute the rollups behind a set of (student_id, year, month) keys from the attendance rows.
+
+    The backfill path (rebuilds, migrations); saves go through
+    apply_attendance_changes() instead. The touched students' months are
+    re-aggregated, followed by the class months they belong to (before and
+    after, if a student changed class). Does not commit.
+    """
+    execute = (connection or db.session).execute
+    students_by_month = {}
+    for student_id, year, month in student_months:
+        students_by_month.setdefault((year, month), set()).add(student_id)
+
+    class_months = set()
+    for (year, month), student_ids in students_by_month.items():
+        first, last = month_bounds(year, month)
+        student_ids = sorted(student_ids)
+        for start in range(0, len(student_ids), UPSERT_CHUNK_SIZE):
+            chunk = student_ids[start:start + UPSERT_CHUNK_SIZE]
+            # Classes the rows were filed under before this write
+            class_months.update((student_class, year, month) for (student_class,) in execute(
+                db.select(AttendanceRollup.student_class).distinct().where(
+                    AttendanceRollup.student_id.in_(chunk),
+                    AttendanceRollup.year == year, AttendanceRollup.month == month)
+            ))
+
+            rows = [
+                {'student_id': student_id, 'year': year, 'month': month, 'student_class': student_class,
+                 'present_count': int(present or 0), 'marked_count': marked}
+                for student_id, student_class, present, marked in execute(
+                    db.select(Attendance.student_id, Student.student_class,
+                              db.func.sum(db.case((Attendance.present == True, 1), else_=0)),
+                              db.func.count(Attendance.id))
+                    .join(Student, Student.id == Attendance.student_id)
+                    .where(Attendance.student_id.in_(chunk), Attendance.date.between(first, last))
+                    .group_by(Attendance.student_id, Student.student_class)
+                )
+            ]
+            # Replace rather than upsert, so students whose marks were all removed drop out
+            execute(db.delete(AttendanceRollup).where(
+                AttendanceRollup.student_id.in_(chunk),
+                AttendanceRollup.year == year, AttendanceRollup.month == month))
+            if rows:
+                execute(db.insert(AttendanceRollup), rows)
+                class_months.update((row['student_class'], year, month) for row in rows)
+
+    refresh_class_rollups(class_months, connection)
+
+def rollup_class_months(student_ids):
+    """(class, year, month) keys the given students' rollups count towards."""
+    return set(db.session.query(AttendanceRollup.student_class, AttendanceRollup.year, AttendanceRollup.month)
+               .filter(AttendanceRollup.student_id.in_(list(student_ids))).distinct())
+
+def refresh_class_rollups(class_months, connection=None):
+    """Recompute the class totals and marks per Sunday for a set of (class, year, month) keys.
+
+    Used after rebuilds and purges, once the student rollups are current.
+    """
+    execute = (connection or db.session).execute
+    for student_class, year, month in class_months:
+        if student_class is None:
+            continue
+        first, last = month_bounds(year, month)
+        in_class = db.and_(AttendanceRollup.student_class == student_class,
+                           AttendanceRollup.year == year, AttendanceRollup.month == month)
+        present, students = execute(
+            db.select(db.func.coalesce(db.func.sum(AttendanceRollup.present_count), 0),
+                      db.func.count(AttendanceRollup.id)).where(in_class)
+        ).one()
+        days = execute(
+            db.select(Attendance.date, db.func.count(Attendance.id))
+            .join(AttendanceRollup, db.and_(AttendanceRollup.student_id == Attendance.student_id, in_class))
+            .where(Attendance.date.between(first, last))
+            .group_by(Attendance.date)
+        ).all()
+        execute(db.delete(ClassAttendanceDay).where(ClassAttendanceDay.student_class == student_class,
+                                                    ClassAttendanceDay.date.between(first, last)))
+        if days:
+            execute(db.insert(ClassAttendanceDay), [
+                {'student_class': student_class, 'date': day, 'marked_count': marks} for day, marks in days])
+        stmt = dialect_insert(ClassAttendanceRollup).values(
+            student_class=student_class, year=year, month=month,
+            present_count=present, student_count=students, sundays_held=len(days))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ClassAttendanceRollup.student_class, ClassAttendanceRollup.year, ClassAttendanceRollup.month],
+            set_={'present_count': stmt.excluded.present_count,
+                  'student_count': stmt.excluded.student_count,
+                  'sundays_held': stmt.excluded.sundays_held}
+        )
+        execute(stmt)
+
+def student_month_totals(student_ids, year, month):
+    """Return {student_id: present_count} for one month from the rollup."""
+    totals = dict.fromkeys(student_ids, 0)
+    ids = list(totals)
+    for start in range(0, len(ids), UPSERT_CHUNK_SIZE):
+        totals.update(db.session.query(AttendanceRollup.student_id, AttendanceRollup.present_count).filter(
+            AttendanceRollup.student_id.in_(ids[start:start + UPSERT_CHUNK_SIZE]),
+            AttendanceRollup.year == year, AttendanceRollup.month == month
+        ))
+    return totals
+
+def class_rollup_dict(row):
+    return {
+        'class': row.student_class,
+        'year': row.year,
+        'month': row.month,
+        'present_count': row.present_count,
+        'student_count': row.student_count,
+        'sundays_held': row.sundays_held,
+        'rate': attendance_rate(row.present_count, row.student_count * row.sundays_held),
+    }
+
+def class_comparison(year, month):
+    """Every class's totals for one month, best attendance rate first."""
+    rows = ClassAttendanceRollup.query.filter_by(year=year, month=month).all()
+    return sorted((class_rollup_dict(row) for row in rows), key=lambda r: (-(r['rate'] or 0), r['class']))
+
+def attendance_trend(start, end, student_class=None):
+    """Monthly totals from (year, month) `start` to `end`, for one class or all of them."""
+    query = db.session.query(
+        ClassAttendanceRollup.year, ClassAttendanceRollup.month,
+        db.func.sum(ClassAttendanceRollup.present_count),
+        db.func.sum(ClassAttendanceRollup.student_count * ClassAttendanceRollup.sundays_held),
+        db.func.sum(ClassAttendanceRollup.student_count),
+        db.func.max(ClassAttendanceRollup.sundays_held)
+    ).filter(
+        ClassAttendanceRollup.year * 100 + ClassAttendanceRollup.month >= start[0] * 100 + start[1],
+        ClassAttendanceRollup.year * 100 + ClassAttendanceRollup.month <= end[0] * 100 + end[1]
+    )
+    if student_class:
+        query = query.filter(ClassAttendanceRollup.student_class == student_class)
+    rows = query.group_by(ClassAttendanceRollup.year, ClassAttendanceRollup.month) \
+        .order_by(ClassAttendanceRollup.year, ClassAttendanceRollup.month)
+    return [
+        {'year': year, 'month': month, 'present_count': int(present), 'student_count': int(students),
+         'sundays_held': held, 'rate': attendance_rate(present, possible)}
+        for year, month, present, possible, students, held in rows
+    ]
+
+def rebuild_attendance_rollups():
+    """Recompute every rollup from the raw attendance rows (used by migrations 0007 and 0012)."""
+    db.session.execute(db.delete(AttendanceRollup))
+    db.session.execute(db.delete(ClassAttendanceRollup))
+    db.session.execute(db.delete(ClassAttendanceDay))
+    keys = db.session.query(Attendance.student_id,
+                            db.extract('year', Attendance.date), db.extract('month', Attendance.date)).distinct()
+    refresh_attendance_rollups({(student_id, int(year), int(month)) for student_id, year, month in keys})
+
+# -------------------------------
+# Student Purge
+# -------------------------------
+# Students are deleted by predicate, a chunk per transaction, so a teacher
+# marking attendance waits for one chunk at most. Their attendance, rollups
+# and promotion history go with them through ON DELETE CASCADE.
+PURGE_CHUNK_SIZE = 200
+
+def purge_students(condition, dry_run=False, chunk_size=PURGE_CHUNK_SIZE, progress=None):
+    """Delete every student matching `condition`; return {'matched': n, 'deleted': n}.
+
+    With dry_run nothing is deleted. `progress(deleted, matched)` is called
+    after each chunk commits; if a chunk fails, the earlier ones stay deleted.
+    """
+    matched = Student.query.filter(condition).count()
+    deleted = 0
+    while not dry_run:
+        rows = db.session.query(Student.id, Student.student_class) \
+            .filter(condition).order_by(Student.id).limit(chunk_size).all()
+        if not rows:
+            break
+        ids = [row.id for row in rows]
+        class_months = rollup_class_months(ids)
+        db.session.execute(db.delete(Student).where(Student.id.in_(ids)),
+                           execution_options={'synchronize_session': False})
+        refresh_class_rollups(class_months)
+        bump_data_versions([scope for row in rows for scope in roster_scopes(row.student_class)])
+        db.session.commit()
+
+        deleted += len(ids)
+        app.logger.info("Purged %d of %d students", deleted, matched)
+        if progress:
+            progress(deleted, matched)
+    return {'matched': matched, 'deleted': deleted}
+
+# -------------------------------
+# Helper: Save attendance marks
+# -------------------------------
+UPSERT_CHUNK_SIZE = 500  # Keeps each statement well under SQLite's bound-parameter limit
+
+def upsert_attendance(records):
+    """Insert or update attendance rows keyed on (student_id, date).
+
+    `records` is a list of dicts with student_id, date and present; if a
+    key repeats, the last one wins. Each chunk inserts the missing rows
+    (ON CONFLICT DO NOTHING), then flips the existing rows whose value
+    differs. Both statements return the rows they changed, and only those
+    bump versions and adjust the rollups. Does not commit.
+    """
+    records = list({(r['student_id'], r['date']): r for r in records}.values())
+    scopes, changes = [], []
+    for start in range(0, len(records), UPSERT_CHUNK_SIZE):
+        chunk = records[start:start + UPSERT_CHUNK_SIZE]
+        stmt = dialect_insert(Attendance).values(chunk)
+        stmt = stmt.on_conflict_do_nothing(index_elements=[Attendance.student_id, Attendance.date]) \
+            .returning(Attendance.student_id, Attendance.date)
+        inserted = set(db.session.execute(stmt).all())
+
+        # One UPDATE per date and value, so each is a lookup on the (student_id, date) index
+        existing = {}
+        for record in chunk:
+            if (record['student_id'], record['date']) not in inserted:
+                existing.setdefault((record['date'], bool(record['present'])), []).append(record['student_id'])
+        flipped = set()
+        for (day, present), student_ids in existing.items():
+            flipped.update(db.session.execute(
+                db.update(Attendance)
+                .where(Attendance.date == day, Attendance.student_id.in_(student_ids),
+                       Attendance.present.isnot(present))
+                .values(present=present)
+                .returning(Attendance.student_id, Attendance.date),
+                execution_options={'synchronize_session': False}
+            ).all())
+
+        classes = dict(db.session.query(Student.id, Student.student_class).filter(
+            Student.id.in_({record['student_id'] for record in chunk})
+        ))
+        for record in chunk:
+            key = (record['student_id'], record['date'])
+            if key in inserted or key in flipped:
+                present = bool(record['present'])
+                student_class = classes.get(record['student_id'])
+                scopes.extend(attendance_scopes(student_class, record['date']))
+                changes.append((record['student_id'], student_class, record['date'],
+                                None if key in inserted else not present, present))
+        # Sent to open dashboards once the transaction commits
+        db.session.info.setdefault('attendance_marks', []).extend(
+            (record['student_id'], classes.get(record['student_id']), record['date'], record['present'])
+            for record in chunk)
+    bump_data_versions(scopes)
+    apply_attendance_changes(changes)
+
+# -------------------------------
+# Live Attendance Stream
+# -------------------------------
+# An in-process fan-out: every committed upsert_attendance() is pushed to the
+# dashboards streaming /attendance/stream as [student_id, date, present]
+# deltas. Each stream has a bounded queue; one that falls behind is cleared
+# and told to resync (reload) instead of buffering without limit.
+ATTENDANCE_RESYNC = 'resync'
+
+_stream_lock = threading.Lock()
+_stream_clients = []
+
+def subscribe_attendance(student_class=None):
+    """Register a stream for one class (or all); None if the server is at its limit."""
+    client = {'class': student_class, 'queue': queue.Queue(app.config['ATTENDANCE_STREAM_QUEUE_SIZE'])}
+    with _stream_lock:
+        if len(_stream_clients) >= app.config['ATTENDANCE_STREAM_MAX_CLIENTS']:
+            return None
+        _stream_clients.append(client)
+    return client
+
+def unsubscribe_attendance(client):
+    with _stream_lock:
+        if client in _stream_clients:
+            _stream_clients.remove(client)
+
+def publish_attendance(marks):
+    """Queue (student_id, class, date, present) marks for every stream showing that class."""
+    with _stream_lock:
+        clients = list(_stream_clients)
+    for client in clients:
+        delta = [[student_id, day.isoformat(), bool(present)]
+                 for student_id, student_class, day, present in marks
+                 if client['class'] in (None, student_class)]
+        if not delta:
+            continue
+        try:
+            client['queue'].put_nowait(delta)
+        except queue.Full:
+            # Too far behind to catch up mark by mark
+            while True:
+                try:
+                    client['queue'].get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                client['queue'].put_nowait(ATTENDANCE_RESYNC)
+            except queue.Full:
+                pass
+
+@event.listens_for(db.session, "after_commit")
+def publish_committed_attendance(session):
+    marks = session.info.pop('attendance_marks', None)
+    if marks:
+        publish_attendance(marks)
+
+@event.listens_for(db.session, "after_rollback")
+def discard_rolled_back_attendance(session):
+    session.info.pop('attendance_marks', None)
+
+def attendance_events(client):
+    """Server-sent events for one stream, with a comment line as keep-alive."""
+    keepalive = app.config['ATTENDANCE_STREAM_KEEPALIVE_SECONDS']
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                delta = client['queue'].get(timeout=keepalive)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if delta == ATTENDANCE_RESYNC:
+                yield "event: resync\ndata: {}\n\n"
+            else:
+                yield f"event: marks\ndata: {json.dumps({'marks': delta})}\n\n"
+    finally:
+        unsubscribe_attendance(client)
+
+# -------------------------------
+# Helper: Attendance grid for a month
+# -------------------------------
+def load_attendance_grid(students, sundays, student_class=None):
+    """Return {student_id: [present, ...]} with one column per Sunday.
+
+    The whole month is fetched in a single query instead of one lookup
+    per checkbox. Students without a record get False for that Sunday.
+    """
+    grid = {student.id: [False] * len(sundays) for student in students}
+    if not grid or not sundays:
+        return grid
+
+    columns = {sunday: index for index, sunday in enumerate(sundays)}
+    query = db.session.query(Attendance.student_id, Attendance.date, Attendance.present).join(
+        Student, Attendance.student_id == Student.id
+    ).filter(
+        Student.status == "active",
+        Attendance.date.between(sundays[0], sundays[-1])
+    )
+    if student_class:
+        query = query.filter(Student.student_class == student_class)
+
+    for student_id, day, present in query:
+        row = grid.get(student_id)
+        if row is not None and day in columns:
+            row[columns[day]] = bool(present)
+
+    return grid
+
+# -------------------------------
+# Attendance Risk Engine
+# -------------------------------
+def last_sundays(count, today=None):
+    """Return the `count` most recent Sundays before today, newest first."""
+    today = today or date.today()
+    days_back = (today.weekday() + 1) % 7 or 7  # If today is Sunday, start from the previous one
+    latest = today - timedelta(days=days_back)
+    return [latest - timedelta(weeks=i) for i in range(count)]
+
+def attendance_risk(window=None, threshold=None, today=None, with_details=False):
+    """Return active students who missed `threshold`+ of the last `window` Sundays.
+
+    Missed counts for every active student come from one grouped query.
+    With `with_details`, each entry also gets a per-Sunday attendance list
+    (one more query for the whole window).
+    """
+    window = window or app.config['ATTENDANCE_RISK_WINDOW']
+    threshold = threshold or app.config['ATTENDANCE_RISK_THRESHOLD']
+    deactivate_threshold = app.config['ATTENDANCE_DEACTIVATE_THRESHOLD']
+    sundays = last_sundays(window, today)
+
+    attended = db.func.count(db.distinct(Attendance.date))
+    rows = db.session.query(Student.id, Student.name, Student.student_class, attended).outerjoin(
+        Attendance, db.and_(
+            Attendance.student_id == Student.id,
+            Attendance.date.in_(sundays),
+            Attendance.present == True
+        )
+    ).filter(
+        Student.status == 'active'
+    ).group_by(Student.id).having(attended <= window - threshold).order_by(Student.id).all()
+
+    present_days = {}
+    if with_details and rows:
+        records = db.session.query(Attendance.student_id, Attendance.date).join(
+            Student, Attendance.student_id == Student.id
+        ).filter(
+            Student.status == 'active',
+            Attendance.date.in_(sundays),
+            Attendance.present == True
+        )
+        for student_id, day in records:
+            present_days.setdefault(student_id, set()).add(day)
+
+    students_at_risk = []
+    for student_id, name, student_class, attended_count in rows:
+        missed_count = window - attended_count
+        entry = {
+            'id': student_id,
+            'name': name,
+            'class': student_class,
+            'missed_count': missed_count,
+            'will_deactivate': missed_count >= deactivate_threshold
+        }
+        if with_details:
+            days = present_days.get(student_id, set())
+            entry['attendance'] = [{'date': sunday, 'present': sunday in days} for sunday in sundays]
+        students_at_risk.append(entry)
+
+    return students_at_risk
+
+def deactivate_absent_students(window=None, threshold=None, today=None):
+    """Mark inactive every active student who missed `threshold`+ of the last `window` Sundays.
+
+    Runs as a single UPDATE and returns the number of students deactivated.
+    Does not commit.
+    """
+    window = window or app.config['ATTENDANCE_RISK_WINDOW']
+    threshold = threshold or app.config['ATTENDANCE_DEACTIVATE_THRESHOLD']
+    sundays = last_sundays(window, today)
+
+    attended = db.session.query(db.func.count(db.distinct(Attendance.date))).filter(
+        Attendance.student_id == Student.id,
+        Attendance.date.in_(sundays),
+        Attendance.present == True
+    ).correlate(Student).scalar_subquery()
+
+    absent = Student.query.filter(Student.status == 'active', attended <= window - threshold)
+
+    scopes = []
+    for (student_class,) in absent.with_entities(Student.student_class).distinct():
+        scopes.extend(roster_scopes(student_class))
+    bump_data_versions(scopes)
+
+    return absent.update({Student.status: 'inactive'}, synchronize_session=False)
+
+# -------------------------------
+# Helper: Report date ranges
+# -------------------------------
+def get_report_range(args, today=None):
+    """Return ((year, month), (end_year, end_month)) for a report request.
+
+    Defaults to the current month. `end_month`/`end_year` extend the range
+    over several months, and `period=year` covers the whole of `year`.
+    """
+    today = today or date.today()
+    month = int(args.get("month", today.month))
+    year = int(args.get("year", today.year))
+    if args.get("period") == "year":
+        return (year, 1), (year, 12)
+
+    end = (int(args.get("end_year", year)), int(args.get("end_month", month)))
+    return (year, month), max(end, (year, month))
+
+def get_sundays_between(start, end):
+    """Return every Sunday from month `start` to month `end`, both (year, month)."""
+    sundays = []
+    year, month = start
+    while (year, month) <= end:
+        sundays.extend(get_sundays(year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
     return sundays
 
+# -------------------------------
+# Report Context
+# -------------------------------
+# The dashboard, the attendance report and the Excel/PDF exports all start
+# from the same month, class and roster. Rosters are cached per class until
+# a student write bumps the class's roster version.
+RosterEntry = namedtuple('RosterEntry', ['id', 'name', 'student_class'])
+
+_roster_cache = {}
+_roster_lock = threading.Lock()
+
+def report_params(args, today=None):
+    """Return (year, month, selected_class) from report query arguments."""
+    today = today or date.today()
+    return (int(args.get("year", today.year)), int(args.get("month", today.month)),
+            args.get("class_name") or None)
+
+def get_roster(student_class=None):
+    """Active students of a class (or every class), in id order, as RosterEntry tuples."""
+    scope = roster_scopes(student_class or '*')[0]
+    version = get_data_versions([scope])[scope]
+    with _roster_lock:
+        cached = _roster_cache.get(scope)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    query = db.session.query(Student.id, Student.name, Student.student_class).filter(Student.status == "active")
+    if student_class:
+        query = query.filter(Student.student_class == student_class)
+    roster = tuple(RosterEntry(*row) for row in query.order_by(Student.id))
+    with _roster_lock:
+        _roster_cache[scope] = (version, roster)
+    return roster
+
+def report_context(year, month, selected_class=None):
+    """Roster and attendance for one class's month, built once per request or job."""
+    key = (year, month, selected_class)
+    contexts = g.setdefault('report_contexts', {})
+    if key not in contexts:
+        sundays = get_sundays(year, month)
+        students = get_roster(selected_class)
+        contexts[key] = {
+            "year": year,
+            "month": month,
+            "selected_class": selected_class,
+            "sundays": sundays,
+            "students": students,
+            "attendance_grid": load_attendance_grid(students, sundays, selected_class),
+            "present_totals": student_month_totals([s.id for s in students], year, month),
+        }
+    return contexts[key]
+
+# -------------------------------
+# Class Coverage
+# -------------------------------
+# The teacher management page: teachers by status plus, for every class, its
+# active teacher and number of active students. Cached until a user write
+# bumps "teachers" or a student write bumps "roster:*".
+TEACHER_SCOPE = 'teachers'
+TEACHER_STATUSES = ('pending', 'active', 'suspended', 'rejected')
+# The User columns the cached panel holds. Writes to the others (last_login
+# on every sign-in, password) leave it alone; last_login is read fresh.
+TEACHER_PANEL_COLUMNS = ('id', 'username', 'role', 'full_name', 'email', 'phone', 'assigned_class',
+                         'preferred_class', 'status', 'registration_message', 'approved_by', 'approved_at',
+                         'created_at')
+
+_coverage_cache = {}
+_coverage_lock = threading.Lock()
+
+def known_classes(*extra):
+    """Configured classes in age order, then any other class names in use."""
+    classes = [student_class for student_class, _ in app.config['CLASS_AGE_BANDS']]
+    others = {name for names in extra for name in names if name and name not in classes}
+    return classes + sorted(others)
+
+def class_coverage():
+    """{'teachers': {status: [rows]}, 'classes': [...], 'assignments': {class: {...}}} from two queries."""
+    scopes = [TEACHER_SCOPE, roster_scopes('*')[0]]
+    versions = tuple(get_data_versions(scopes)[scope] for scope in scopes)
+    with _coverage_lock:
+        cached = _coverage_cache.get('coverage')
+    if cached and cached[0] == versions:
+        return cached[1]
+
+    teachers = {status: [] for status in TEACHER_STATUSES}
+    columns = [User.__table__.c[name] for name in TEACHER_PANEL_COLUMNS]
+    for row in db.session.execute(db.select(*columns).where(User.role == 'teacher').order_by(User.id)):
+        teachers.setdefault(row.status, []).append(row)
+    student_counts = dict(db.session.query(Student.student_class, db.func.count(Student.id))
+                          .filter(Student.status == 'active').group_by(Student.student_class))
+
+    assigned = {}
+    for teacher in teachers['active']:
+        assigned.setdefault(teacher.assigned_class, teacher)
+    classes = known_classes(student_counts, assigned)
+    coverage = {
+        'teachers': teachers,
+        'classes': classes,
+        'assignments': {class_name: {'teacher': assigned.get(class_name),
+                                     'student_count': student_counts.get(class_name, 0)}
+                        for class_name in classes},
+    }
+    with _coverage_lock:
+        _coverage_cache['coverage'] = (versions, coverage)
+    return coverage
+
+# -------------------------------
+# Helper: Streaming Excel export
+# -------------------------------
+def write_workbook(sheet_name, header, rows, output=None):
+    """Stream `rows` into a write-only workbook saved to `output`.
+
+    Rows are flushed to disk as they are appended, so memory stays flat no
+    matter how many rows are written. Without `output` a temp file is used;
+    it is returned rewound.
+    """
+    from openpyxl import Workbook  # Loaded on the first export, not at startup
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+
+    output = output or tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+def iter_attendance_rows(sundays, student_class=None, batch_size=1000):
+    """Yield [name, "P"/"A", ...] per active student, one column per Sunday.
+
+    Present marks stream in student id order and are merged with the
+    cached roster, so only one student's marks are held at a time.
+    """
+    if not sundays:
+        return
+    columns = {sunday: index for index, sunday in enumerate(sundays)}
+
+    marks = db.session.query(Attendance.student_id, Attendance.date).join(
+        Student, Attendance.student_id == Student.id
+    ).filter(
+        Student.status == "active",
+        Attendance.date.between(sundays[0], sundays[-1]),
+        Attendance.present == True
+    )
+    if student_class:
+        marks = marks.filter(Student.student_class == student_class)
+
+    marks = iter(marks.order_by(Attendance.student_id).yield_per(batch_size))
+    mark = next(marks, None)
+    for student_id, name, _ in get_roster(student_class):
+        row = ["A"] * len(sundays)
+        while mark is not None and mark[0] <= student_id:
+            if mark[0] == student_id and mark[1] in columns:
+                row[columns[mark[1]]] = "P"
+            mark = next(marks, None)
+        yield [name] + row
+
+# -------------------------------
+# Report Cache
+# -------------------------------
+def report_version(student_class, year, month):
+    """Version string for a class's month (or all classes when student_class is None)."""
+    scopes = [
+        attendance_scopes(student_class or '*', date(year, month, 1))[0],
+        roster_scopes(student_class or '*')[0]
+    ]
+    versions = get_data_versions(scopes)
+    return "-".join(str(versions[scope]) for scope in scopes)
+
+def report_cache_path(name, version):
+    return os.path.join(app.config['REPORT_CACHE_DIR'], f"{secure_filename(name)}__{version}.pdf")
+
+def report_cache_get(name, version):
+    """Return the path of the cached report `name` at `version`, or None."""
+    path = report_cache_path(name, version)
+    try:
+        os.utime(path)  # Mark as recently used
+    except FileNotFoundError:
+        return None
+    return path
+
+def report_cache_put(name, version, data):
+    """Store a rendered report, replacing older versions of it, and return its path."""
+    cache_dir = app.config['REPORT_CACHE_DIR']
+    os.makedirs(cache_dir, exist_ok=True)
+    path = report_cache_path(name, version)
+
+    prefix = f"{secure_filename(name)}__"
+    for entry in os.scandir(cache_dir):
+        if entry.name.startswith(prefix) and entry.path != path:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+    evict_report_cache()
+    return path
+
+def evict_report_cache():
+    """Delete least recently used reports until the cache fits its size limit."""
+    entries = []
+    for entry in os.scandir(app.config['REPORT_CACHE_DIR']):
+        if entry.name.endswith(".pdf"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= app.config['REPORT_CACHE_MAX_BYTES']:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+# -------------------------------
+# Report Builders
+# -------------------------------
+# Each builder writes one export for the given query arguments to `output`
+# and returns the download filename. They run on the report job pool.
+EXCEL_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+def build_attendance_excel(params, output):
+    start, end = get_report_range(params)
+    selected_class = params.get("class_name")
+
+    sundays = get_sundays_between(start, end)
+    date_format = '%d %b' if start[0] == end[0] else '%d %b %Y'
+    header = ["Name"] + [sunday.strftime(date_format) for sunday in sundays]
+
+    # Rows go straight from the query into the workbook
+    with perf_timer('export_ms'):
+        write_workbook('Attendance', header, iter_attendance_rows(sundays, selected_class), output)
+
+    (year, month), (end_year, end_month) = start, end
+    if params.get("period") == "year":
+        return f"attendance_report_{year}.xlsx"
+    if start == end:
+        return f"attendance_report_{month}_{year}.xlsx"
+    return f"attendance_report_{month}_{year}_to_{end_month}_{end_year}.xlsx"
+
+def attendance_pdf_cache_entry(params):
+    """Return (cache name, data version, download filename) for an attendance PDF."""
+    year, month, selected_class = report_params(params)
+    return (f"attendance_{selected_class or 'All'}_{year}_{month:02d}",
+            report_version(selected_class, year, month),
+            f"Attendance_{selected_class or 'All'}_{month}_{year}.pdf")
+
+def build_attendance_pdf(params, output):
+    cache_name, version, filename = attendance_pdf_cache_entry(params)
+    path = report_cache_get(cache_name, version)
+
+    if not path:
+        # Render HTML
+        html = render_template("attendance_pdf.html", **report_context(*report_params(params)))
+
+        # Generate PDF with xhtml2pdf, loaded on the first export (it takes about a second to import)
+        from xhtml2pdf import pisa
+        pdf = BytesIO()
+        with perf_timer('export_ms'):
+            pisa_status = pisa.CreatePDF(html, dest=pdf)
+        if pisa_status.err:
+            raise RuntimeError("PDF generation error")
+
+        path = report_cache_put(cache_name, version, pdf.getvalue())
+
+    with open(path, "rb") as cached:
+        shutil.copyfileobj(cached, output)
+    return filename
+
+def build_inventory_pdf(params, output):
+    items = Inventory.query.order_by(Inventory.category, Inventory.item_name).all()
+
+    # Create simple HTML for PDF
+    html_content = f"""
+    <html>
+    <head>
+        <title>Inventory Report</title>
+        <style>
+            body {{ font-family: Arial, sans-serif; }}
+            table {{ width: 100%; border-collapse: collapse; }}
+            th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
+            th {{ background-color: #f2f2f2; }}
+            .available {{ color: green; }}
+            .missing {{ color: red; }}
+        </style>
+    </head>
+    <body>
+        <h1>Inventory Report</h1>
+        <p>Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+        <table>
+            <tr>
+                <th>QR Code</th>
+                <th>Item Name</th>
+                <th>Category</th>
+                <th>Status</th>
+            </tr>
+    """
+
+    for item in items:
+        status = "Available" if item.quantity > 0 else "Missing"
+        status_class = "available" if item.quantity > 0 else "missing"
+
+        html_content += f"""
+            <tr>
+                <td>{item.qr_code or 'N/A'}</td>
+                <td>{item.item_name}</td>
+                <td>{item.category or ''}</td>
+                <td class="{status_class}">{status}</td>
+            </tr>
+        """
+
+    html_content += """
+        </table>
+    </body>
+    </html>
+    """
+
+    # Generate PDF
+    from xhtml2pdf import pisa
+    with perf_timer('export_ms'):
+        pisa_status = pisa.CreatePDF(html_content, dest=output)
+    if pisa_status.err:
+        raise RuntimeError("PDF generation error")
+
+    return f"Inventory_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+
+def build_inventory_excel(params, output):
+    def rows():
+        query = db.session.query(Inventory.qr_code, Inventory.item_name, Inventory.category, Inventory.quantity) \
+            .order_by(Inventory.category, Inventory.item_name)
+        for qr_code, item_name, category, quantity in query.yield_per(1000):
+            status = "Available" if quantity > 0 else "Missing"
+            yield [qr_code or 'N/A', item_name, category or '', status]
+
+    # Export to Excel
+    with perf_timer('export_ms'):
+        write_workbook('Inventory', ['QR Code', 'Item Name', 'Category', 'Status'], rows(), output)
+    return f"Inventory_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+
+REPORT_BUILDERS = {
+    'attendance_excel': (build_attendance_excel, EXCEL_MIMETYPE),
+    'attendance_pdf': (build_attendance_pdf, 'application/pdf'),
+    'inventory_pdf': (build_inventory_pdf, 'application/pdf'),
+    'inventory_excel': (build_inventory_excel, EXCEL_MIMETYPE),
+}
+
+def month_range(start, end):
+    """[(year, month), ...] from start to end inclusive."""
+    (year, month), months = start, []
+    while (year, month) <= end:
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+def report_scopes(kind, params):
+    """Data-version scopes an export of `kind` with `params` is built from."""
+    if kind.startswith('inventory'):
+        return [INVENTORY_SCOPE]
+    selected_class = params.get("class_name") or '*'
+    if kind == 'attendance_pdf':
+        months = [report_params(params)[:2]]
+    else:
+        months = month_range(*get_report_range(params))
+    return [roster_scopes(selected_class)[0]] + \
+        [attendance_scopes(selected_class, date(year, month, 1))[0] for year, month in months]
+
+# -------------------------------
+# Report Jobs
+# -------------------------------
+report_executor = None  # Started by create_app() with REPORT_JOB_WORKERS threads
+
+def wants_json():
+    return request.accept_mimetypes.best == 'application/json'
+
+def enqueue_report_job(kind, params):
+    """Queue an export for the current user and answer with its job id.
+
+    JSON clients get {"job_id", "status_url"}; browsers get a page that
+    polls the job and starts the download when it is ready.
+    """
+    unchanged = not_modified(report_scopes(kind, params), kind)
+    if unchanged:
+        return unchanged
+
+    # The same export of unchanged data is sent again rather than rebuilt
+    etag = g.validators[0]
+    built = ReportJob.query.filter_by(kind=kind, etag=etag, status='done') \
+        .order_by(ReportJob.finished_at.desc()).first()
+    if built and built.file_path and os.path.exists(built.file_path):
+        return send_file(built.file_path, download_name=built.filename, as_attachment=True, mimetype=built.mimetype)
+
+    cleanup_report_jobs()
+
+    user_id = session.get("user_id")
+    in_progress = ReportJob.query.filter(
+        ReportJob.user_id == user_id,
+        ReportJob.status.in_(['queued', 'running'])
+    ).count()
+    if in_progress >= app.config['REPORT_JOBS_PER_USER']:
+        message = "You already have exports in progress. Please wait for them to finish."
+        if wants_json():
+            return {"error": message}, 429
+        flash(message, "warning")
+        return redirect(request.referrer or url_for("dashboard"))
+
+    job = ReportJob(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        params=json.dumps(params),
+        user_id=user_id,
+        mimetype=REPORT_BUILDERS[kind][1],
+        etag=etag
+    )
+    db.session.add(job)
+    db.session.commit()
+    report_executor.submit(run_report_job, job.id)
+
+    if wants_json():
+        return {"job_id": job.id, "status_url": url_for("report_job_status", job_id=job.id)}, 202
+    return render_template("report_job.html", job_id=job.id), 202
+
+def run_report_job(job_id):
+    """Build a queued export on the pool and record the outcome on its job row."""
+    with app.app_context():
+        job = db.session.get(ReportJob, job_id)
+        if job is None:
+            return
+        job.status = 'running'
+        db.session.commit()
+        perf_begin()
+
+        builder, _ = REPORT_BUILDERS[job.kind]
+        os.makedirs(app.config['REPORT_JOB_DIR'], exist_ok=True)
+        path = os.path.join(app.config['REPORT_JOB_DIR'], job.id)
+        try:
+            with open(path, "wb") as output:
+                filename = builder(json.loads(job.params or "{}"), output)
+            job.filename = filename
+            job.file_path = path
+            job.status = 'done'
+        except Exception as e:
+            db.session.rollback()
+            if os.path.exists(path):
+                os.remove(path)
+            job = db.session.get(ReportJob, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+            print(f"Report job {job_id} ({job.kind}) failed: {e}")
+
+        job.finished_at = datetime.now()
+        db.session.commit()
+        perf_finish(f"JOB {job.kind}", job.status)
+
+def cleanup_report_jobs():
+    """Delete jobs older than the TTL along with their files.
+
+    This also clears jobs that never finished because the process stopped,
+    and any stray files left behind by them.
+    """
+    cutoff = datetime.now() - timedelta(minutes=app.config['REPORT_JOB_TTL_MINUTES'])
+    expired = ReportJob.query.filter(ReportJob.created_at < cutoff).all()
+    for job in expired:
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        db.session.delete(job)
+    if expired:
+        db.session.commit()
+
+    if os.path.isdir(app.config['REPORT_JOB_DIR']):
+        for entry in os.scandir(app.config['REPORT_JOB_DIR']):
+            try:
+                if entry.stat().st_mtime < cutoff.timestamp():
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
 # -------------------------------
 # Jinja Filter + Now Context
 # -------------------------------
-@app.template_filter('todatetime')
-def to_datetime_filter(s):
-    return datetime.strptime(s, "%Y-%m-%d")
+@app.template_filter('age')
+def age_filter(dob):
+    return age_on(dob)
 
 @app.context_processor
 def inject_now():
@@ -300,9 +2616,7 @@ def dashboard():
     assigned_class = session.get("assigned_class")
 
     today = date.today()
-    month = int(request.args.get("month", today.month))
-    year = int(request.args.get("year", today.year))
-    selected_class = request.args.get("class_name")
+    year, month, selected_class = report_params(request.args, today)
 
     # For teachers, allow viewing all classes but default to their assigned class
     if user_role == "teacher" and assigned_class and not selected_class:
@@ -325,50 +2639,25 @@ def dashboard():
     if current_sunday is None:
         current_sunday = today
 
-    if selected_class:
-        filtered_students = Student.query.filter(
-            Student.student_class == selected_class,
-            Student.status == "active"
-        ).all()
-    else:
-        filtered_students = Student.query.filter_by(status="active").all()
-
     # Check for students at risk of deactivation (for admin notification)
     at_risk_count = 0
     if session.get("role") == "admin":
-        # Get the last 4 Sundays for at-risk check
-        today = datetime.now()
-        check_sundays = []
-        current_date = today
-
-        for _ in range(4):
-            days_back = (current_date.weekday() + 1) % 7
-            if days_back == 0 and current_date.date() == today.date():
-                days_back = 7
-
-            sunday = current_date - timedelta(days=days_back)
-            check_sundays.append(sunday.date())
-            current_date = sunday - timedelta(days=1)
-
-        # Count students at risk (all active students, not just filtered)
-        all_active_students = Student.query.filter_by(status='active').all()
-        for student in all_active_students:
-            missed_count = 0
-            for sunday in check_sundays:
-                attendance = Attendance.query.filter_by(student_id=student.id, date=sunday).first()
-                if not attendance or not attendance.present:
-                    missed_count += 1
-
-            if missed_count >= 3:  # At risk if missed 3+ Sundays
-                at_risk_count += 1
+        at_risk_count = len(attendance_risk())
+
+    # Counted in the database, since only the first page of rows is rendered
+    present_query = db.session.query(db.func.count(Attendance.id)) \
+        .join(Student, Student.id == Attendance.student_id) \
+        .filter(Attendance.date == current_sunday, Attendance.present == True, Student.status == "active")
+    if selected_class:
+        present_query = present_query.filter(Student.student_class == selected_class)
 
     return render_template("dashboard.html",
-                           students=filtered_students,
-                           sundays=sundays,
+                           **dashboard_rows(selected_class, sundays),
                            month=month,
                            year=year,
                            selected_class=selected_class,
                            current_sunday=current_sunday,
+                           present_count=present_query.scalar(),
                            at_risk_count=at_risk_count)
 
 # -------------------------------
@@ -377,48 +2666,29 @@ def dashboard():
 @app.route("/add_student", methods=["POST"])
 def add_student():
     name = request.form["name"]
-    dob = request.form["dob"]
     parent = request.form.get("parent", "")
     contact = request.form.get("contact", "")
     family_id = request.form.get("family_id", "")
 
-    birth = datetime.strptime(dob, "%Y-%m-%d")
-    today = datetime.now()
+    try:
+        dob = date.fromisoformat(request.form["dob"])
+    except ValueError:
+        flash("Please enter a valid date of birth.", "error")
+        return redirect(url_for("dashboard"))
 
-    if birth > today:
+    if dob > date.today():
         flash("Date of birth cannot be in the future!", "error")
         return redirect(url_for("dashboard"))
 
-    age = (today - birth).days // 365
-
-    if age <= 5:
-        assigned_class = "Genesis"
-    elif age <= 7:
-        assigned_class = "Exodus"
-    elif age <= 9:
-        assigned_class = "Psalms"
-    elif age <= 11:
-        assigned_class = "Proverbs"
-    elif age <= 13:
-        assigned_class = "Revelation"
-    else:
-        assigned_class = "High Schoolers"
+    assigned_class = class_for_dob(dob)
 
     # Handle profile image upload
     profile_image_filename = None
     if 'profile_image' in request.files:
         file = request.files['profile_image']
         if file and file.filename != '' and allowed_file(file.filename):
-            # Create unique filename
-            timestamp = int(datetime.now().timestamp())
-            filename = secure_filename(f"{timestamp}_{file.filename}")
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-
             try:
-                file.save(filepath)
-                # Resize image to save space
-                resize_image(filepath)
-                profile_image_filename = filename
+                profile_image_filename = store_upload(file)
             except Exception as e:
                 flash(f"Error uploading image: {str(e)}", "warning")
 
@@ -512,26 +2782,94 @@ def mark_attendance():
     if user and user.status == 'suspended':
         return "Account suspended", 403
 
-    student_id = request.form.get("student_id")
-    date_str = request.form.get("date")
+    try:
+        student_id = int(request.form.get("student_id"))
+        date_obj = datetime.strptime(request.form.get("date") or "", "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return "student_id and date (YYYY-MM-DD) are required", 400
     present = request.form.get("present") == "true"
 
-    date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
+    # Insert, or flip the existing mark; the foreign key rejects unknown students
+    try:
+        upsert_attendance([{"student_id": student_id, "date": date_obj, "present": present}])
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return "Student not found", 400
+    return "Attendance marked", 200
 
-    # Check if already marked
-    record = Attendance.query.filter_by(student_id=student_id, date=date_obj).first()
-    if record:
-        record.present = present
-    else:
-        record = Attendance(student_id=student_id, date=date_obj, present=present)
-        db.session.add(record)
+@app.route("/attendance/stream")
+def attendance_stream():
+    """Live attendance marks for ?class_name= (all classes without it) as server-sent events."""
+    if "user" not in session:
+        return {"error": "Unauthorized"}, 401
+    # 204 tells a dashboard rendered before the switch not to reconnect
+    if not app.config['ATTENDANCE_STREAM_ENABLED']:
+        return "", 204
+
+    client = subscribe_attendance(request.args.get("class_name") or None)
+    if client is None:
+        return {"error": "Too many live dashboards open; reload later"}, 503
+    return app.response_class(attendance_events(client), mimetype="text/event-stream",
+                              headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/mark_attendance/bulk", methods=["POST"])
+def mark_attendance_bulk():
+    """Save a batch of checkbox toggles in one transaction.
+
+    Expects a JSON array of {"student_id", "date", "present"} objects. If
+    the same student and date appear more than once, the last one wins.
+    """
+    if "user" not in session:
+        return {"error": "Unauthorized"}, 401
+
+    # Block suspended teachers
+    user = User.query.get(session.get("user_id"))
+    if user and user.status == 'suspended':
+        return {"error": "Account suspended"}, 403
+
+    marks = request.get_json(silent=True)
+    if not isinstance(marks, list):
+        return {"error": "Expected a JSON array of attendance marks"}, 400
+
+    records = {}
+    try:
+        for mark in marks:
+            student_id = int(mark["student_id"])
+            date_obj = datetime.strptime(mark["date"], "%Y-%m-%d").date()
+            # Only JSON true/false; "false", "0" and 1 would all read as present
+            if not isinstance(mark["present"], bool):
+                raise TypeError(mark["present"])
+            records[(student_id, date_obj)] = {
+                "student_id": student_id,
+                "date": date_obj,
+                "present": mark["present"]
+            }
+    except (KeyError, TypeError, ValueError):
+        return {"error": "Each mark needs student_id, date (YYYY-MM-DD) and present (true or false)"}, 400
+
+    try:
+        upsert_attendance(list(records.values()))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        student_ids = {student_id for student_id, _ in records}
+        known = {row[0] for row in db.session.query(Student.id).filter(Student.id.in_(student_ids))}
+        return {"error": "Unknown students; nothing was saved", "student_ids": sorted(student_ids - known)}, 400
+    except Exception:
+        db.session.rollback()
+        return {"error": "Could not save attendance"}, 500
+
+    return {"saved": len(records)}
 
-    db.session.commit()
-    return "Attendance marked", 200
 
+@app.context_processor
+def inject_profile_photo():
+    return {'profile_photo': profile_photo}
 
 @app.context_processor
 def utility_functions():
+    # Per-cell lookup, only used when a template has no attendance_grid row
     def attendance_present(student_id, sunday):
         record = Attendance.query.filter_by(student_id=student_id, date=sunday).first()
         return record.present if record else False
@@ -543,89 +2881,52 @@ def attendance_report():
     if "user" not in session:
         return redirect(url_for("home"))
 
-    today = date.today()
-    month = int(request.args.get("month", today.month))
-    year = int(request.args.get("year", today.year))
-    selected_class = request.args.get("class_name")
+    year, month, selected_class = report_params(request.args)
+    trend_start = (year - 1, month + 1) if month < 12 else (year, 1)
 
-    sundays = get_sundays(year, month)
+    # The class comparison covers every class, and the trend the last 12 months
+    unchanged = not_modified([roster_scopes('*')[0]] +
+                             [attendance_scopes('*', date(*month_key, 1))[0]
+                              for month_key in month_range(trend_start, (year, month))],
+                             session.get("user_id"), date.today())
+    if unchanged:
+        return unchanged
 
-    # Fetch students
-    if selected_class:
-        students = Student.query.filter_by(student_class=selected_class, status="active").all()
-    else:
-        students = Student.query.filter_by(status="active").all()
+    # Totals and trends come from the rollups
+    return render_template("attendance_report.html",
+                           **report_context(year, month, selected_class),
+                           classes=class_comparison(year, month),
+                           trend=attendance_trend(trend_start, (year, month), selected_class))
 
-    # Fetch all attendance records for this month
-    last_day = calendar.monthrange(year, month)[1]
-    all_attendance = Attendance.query.filter(
-        Attendance.date.between(date(year, month, 1), date(year, month, last_day))
-    ).all()
 
-    # Create quick lookup: {(student_id, date): present}
-    attendance_map = {
-        (a.student_id, a.date): a.present for a in all_attendance
-    }
+@app.route("/attendance/trends")
+def attendance_trends():
+    """Monthly attendance totals from the rollup, e.g. ?start_year=2023&end_year=2026&class_name=Genesis."""
+    if "user" not in session:
+        return {"error": "Unauthorized"}, 401
 
-    return render_template("attendance_report.html", students=students,
-                           sundays=sundays, month=month, year=year,
-                           selected_class=selected_class, attendance_map=attendance_map)
+    today = date.today()
+    start = (request.args.get("start_year", today.year - 2, type=int), request.args.get("start_month", 1, type=int))
+    end = (request.args.get("end_year", today.year, type=int), request.args.get("end_month", 12, type=int))
+    return {"class": request.args.get("class_name"),
+            "months": attendance_trend(start, end, request.args.get("class_name"))}
+
+@app.route("/attendance/classes")
+def attendance_classes():
+    """Side-by-side class totals for one month from the rollup."""
+    if "user" not in session:
+        return {"error": "Unauthorized"}, 401
 
+    today = date.today()
+    return {"classes": class_comparison(request.args.get("year", today.year, type=int),
+                                        request.args.get("month", today.month, type=int))}
 
 @app.route("/download_attendance")
 def download_attendance():
     if "user" not in session:
         return redirect(url_for("home"))
 
-    today = date.today()
-    month = int(request.args.get("month", today.month))
-    year = int(request.args.get("year", today.year))
-    selected_class = request.args.get("class_name")
-
-    sundays = get_sundays(year, month)
-
-    # Get students
-    if selected_class:
-        students = Student.query.filter_by(student_class=selected_class, status="active").all()
-    else:
-        students = Student.query.filter_by(status="active").all()
-
-    # Attendance records
-    last_day = calendar.monthrange(year, month)[1]
-    all_attendance = Attendance.query.filter(
-        Attendance.date.between(date(year, month, 1), date(year, month, last_day))
-    ).all()
-
-    attendance_map = {
-        (a.student_id, a.date): a.present for a in all_attendance
-    }
-
-    # Build DataFrame rows
-    data = []
-    for student in students:
-        row = {"Name": student.name}
-        for sunday in sundays:
-            status = "P" if attendance_map.get((student.id, sunday), False) else "A"
-            row[sunday.strftime('%d %b')] = status
-        data.append(row)
-
-    df = pd.DataFrame(data)
-
-    # Export to Excel
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-     df.to_excel(writer, index=False, sheet_name='Attendance')
-    output.seek(0)
-
-
-    filename = f"attendance_report_{month}_{year}.xlsx"
-    return send_file(output,
-                     download_name=filename,
-                     as_attachment=True,
-                     mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-
-
-
+    return enqueue_report_job('attendance_excel', request.args.to_dict())
 
 
 @app.route("/attendance_pdf")
@@ -633,62 +2934,75 @@ def attendance_pdf():
     if "user" not in session:
         return redirect(url_for("home"))
 
-    # Get data
-    today = date.today()
-    month = int(request.args.get("month", today.month))
-    year = int(request.args.get("year", today.year))
-    selected_class = request.args.get("class_name")
+    # Serve the cached copy straight away while nothing behind it has changed
+    params = request.args.to_dict()
+    unchanged = not_modified(report_scopes('attendance_pdf', params), 'attendance_pdf')
+    if unchanged:
+        return unchanged
+    cache_name, version, filename = attendance_pdf_cache_entry(params)
+    cached = report_cache_get(cache_name, version)
+    if cached:
+        return send_file(cached, download_name=filename, as_attachment=True)
 
-    sundays = get_sundays(year, month)
+    return enqueue_report_job('attendance_pdf', params)
 
-    if selected_class:
-        students = Student.query.filter_by(student_class=selected_class, status="active").all()
-    else:
-        students = Student.query.filter_by(status="active").all()
+# -------------------------------
+# Report Job Status and Download
+# -------------------------------
+@app.route('/jobs/<job_id>')
+def report_job_status(job_id):
+    if "user" not in session:
+        return {"error": "Unauthorized"}, 401
 
-    last_day = calendar.monthrange(year, month)[1]
-    records = Attendance.query.filter(
-        Attendance.date.between(date(year, month, 1), date(year, month, last_day))
-    ).all()
+    job = ReportJob.query.get_or_404(job_id)
+    if job.user_id != session.get("user_id") and session.get("role") != "admin":
+        return {"error": "Access denied"}, 403
 
-    attendance_map = {
-        (a.student_id, a.date): a.present for a in records
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "filename": job.filename,
+        "error": job.error,
+        "download_url": url_for("download_report_job", job_id=job.id) if job.status == 'done' else None
     }
 
-    # Render HTML
-    html = render_template("attendance_pdf.html",
-                           students=students,
-                           sundays=sundays,
-                           month=month,
-                           year=year,
-                           selected_class=selected_class,
-                           attendance_map=attendance_map)
+@app.route('/jobs/<job_id>/download')
+def download_report_job(job_id):
+    if "user" not in session:
+        return redirect(url_for("home"))
 
-    # Generate PDF with xhtml2pdf
-    pdf = BytesIO()
-    pisa_status = pisa.CreatePDF(html, dest=pdf)
-    if pisa_status.err:
-        return "PDF generation error", 500
+    job = ReportJob.query.get_or_404(job_id)
+    if job.user_id != session.get("user_id") and session.get("role") != "admin":
+        flash("Access denied.", "danger")
+        return redirect(url_for("dashboard"))
 
-    pdf.seek(0)
-    filename = f"Attendance_{selected_class or 'All'}_{month}_{year}.pdf"
-    return send_file(pdf, download_name=filename, as_attachment=True)
+    if job.status != 'done' or not job.file_path or not os.path.exists(job.file_path):
+        return {"error": f"Report is {job.status}"}, 409
+
+    return send_file(job.file_path, download_name=job.filename, as_attachment=True, mimetype=job.mimetype,
+                     etag=job.etag or True)
 
 @app.route('/get_student/<int:student_id>')
 def get_student(student_id):
     if "user" not in session:
         return {"error": "Unauthorized"}, 401
 
+    unchanged = not_modified([roster_scopes('*')[0], PHOTO_SCOPE])
+    if unchanged:
+        return unchanged
+
     student = Student.query.get_or_404(student_id)
     return {
         "id": student.id,
         "name": student.name,
-        "dob": student.dob,
+        "dob": student.dob.isoformat(),
         "parent": student.parent,
         "contact": student.contact,
         "student_class": student.student_class,
         "family_id": student.family_id,
-        "profile_image": student.profile_image
+        "profile_image": student.profile_image,
+        "profile_photo": profile_photo(student.profile_image) if student.profile_image else None
     }
 
 @app.route('/edit_student', methods=['POST'])
@@ -702,7 +3016,11 @@ def edit_student():
 
     # Update basic info
     student.name = request.form.get("name")
-    student.dob = request.form.get("dob")
+    try:
+        student.dob = date.fromisoformat(request.form.get("dob", ""))
+    except ValueError:
+        flash("Please enter a valid date of birth.", "error")
+        return redirect(url_for("dashboard"))
     student.parent = request.form.get("parent", "")
     student.contact = request.form.get("contact", "")
     student.family_id = request.form.get("family_id", "") or None
@@ -711,41 +3029,14 @@ def edit_student():
     if 'profile_image' in request.files:
         file = request.files['profile_image']
         if file and file.filename != '' and allowed_file(file.filename):
-            # Delete old image if exists
-            if student.profile_image:
-                old_path = os.path.join(app.config['UPLOAD_FOLDER'], student.profile_image)
-                if os.path.exists(old_path):
-                    os.remove(old_path)
-
-            # Save new image
-            timestamp = int(datetime.now().timestamp())
-            filename = secure_filename(f"{timestamp}_{file.filename}")
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-
             try:
-                file.save(filepath)
-                resize_image(filepath)
-                student.profile_image = filename
+                # The old file stays for siblings sharing it; the orphan sweep clears it otherwise
+                student.profile_image = store_upload(file)
             except Exception as e:
                 flash(f"Error uploading image: {str(e)}", "warning")
 
     # Recalculate class based on age
-    birth = datetime.strptime(student.dob, "%Y-%m-%d")
-    today = datetime.now()
-    age = (today - birth).days // 365
-
-    if age <= 5:
-        student.student_class = "Genesis"
-    elif age <= 7:
-        student.student_class = "Exodus"
-    elif age <= 9:
-        student.student_class = "Psalms"
-    elif age <= 11:
-        student.student_class = "Proverbs"
-    elif age <= 13:
-        student.student_class = "Revelation"
-    else:
-        student.student_class = "High Schoolers"
+    student.student_class = class_for_dob(student.dob)
 
     db.session.commit()
     flash(f"Student '{student.name}' updated successfully!", "success")
@@ -759,18 +3050,10 @@ def student_detail(student_id):
 
     student = Student.query.get_or_404(student_id)
 
-    # Calculate age
-    birth_date = datetime.strptime(student.dob, "%Y-%m-%d")
-    today = datetime.now()
-    age = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
-
-    # Format date for display
-    formatted_date = birth_date.strftime("%B %d, %Y")
-
     return render_template("student_detail.html",
                          student=student,
-                         age=age,
-                         formatted_date=formatted_date)
+                         age=age_on(student.dob),
+                         formatted_date=student.dob.strftime("%B %d, %Y"))
 
 @app.route("/all_students")
 def all_students():
@@ -783,26 +3066,51 @@ def all_students():
     
     class_list = ['Genesis', 'Exodus', 'Psalms', 'Proverbs', 'Revelation', 'High Schoolers']
 
-    # Base query - filter by active status AND profile image (only show students with photos)
-    query = Student.query.filter(Student.status == "active", Student.profile_image != None)
-
-    # Apply class filter
-    if selected_class:
-        query = query.filter_by(student_class=selected_class)
+    # Search name, parent and contact in the database, one page at a time
+    rows = all_students_rows(selected_class, search_query)
+    total = search_students(all_students_query(selected_class), search_query).order_by(None).count()
 
-    # Get students
-    students = query.order_by(Student.name).all()
+    return render_template("all_students.html", **rows, total=total, selected_class=selected_class, class_list=class_list, search_query=search_query)
 
-    # Apply search filter on the list (for name, parent, contact)
-    if search_query:
-        search_lower = search_query.lower()
-        students = [s for s in students if 
-            search_lower in s.name.lower() or
-            (s.parent and search_lower in s.parent.lower()) or
-            (s.contact and search_lower in s.contact.lower())
-        ]
+@app.route("/students/autocomplete")
+def students_autocomplete():
+    if "user" not in session:
+        return {"error": "Not logged in"}, 401
+
+    query = Student.query.filter(Student.status == "active")
+    if request.args.get("class_name"):
+        query = query.filter_by(student_class=request.args["class_name"])
+    if not search_terms(request.args.get("q")):
+        return {"results": []}
+
+    students = search_students(query, request.args["q"]).limit(AUTOCOMPLETE_LIMIT).all()
+    return {"results": [
+        {"id": s.id, "name": s.name, "student_class": s.student_class, "parent": s.parent,
+         "url": url_for("student_detail", student_id=s.id)}
+        for s in students
+    ]}
+
+@app.route("/students/turning")
+def students_turning_age():
+    """Active students reaching an age before a date, e.g. ?age=6&before=2026-09-01&class_name=Genesis."""
+    if "user" not in session:
+        return {"error": "Not logged in"}, 401
 
-    return render_template("all_students.html", students=students, selected_class=selected_class, class_list=class_list, search_query=search_query)
+    try:
+        age = int(request.args["age"])
+        before = date.fromisoformat(request.args["before"])
+        since = date.fromisoformat(request.args["since"]) if request.args.get("since") else None
+    except (KeyError, ValueError):
+        return {"error": "age and before (YYYY-MM-DD) are required"}, 400
+
+    query = students_turning(age, before, since)
+    if request.args.get("class_name"):
+        query = query.filter(Student.student_class == request.args["class_name"])
+    return {"age": age, "before": before.isoformat(), "students": [
+        {"id": s.id, "name": s.name, "dob": s.dob.isoformat(), "student_class": s.student_class,
+         "birthday": years_before(s.dob, -age).isoformat()}
+        for s in query
+    ]}
 
 @app.route('/inventory')
 def inventory():
@@ -810,32 +3118,25 @@ def inventory():
         flash("Access denied.", "danger")
         return redirect(url_for("dashboard"))
 
-    items = Inventory.query.all()
+    items = Inventory.query.order_by(Inventory.item_name, Inventory.id).all()
+    categories = [c.name for c in Category.query.order_by(Category.name)]
 
-    # Get all unique categories dynamically
-    categories = set()
+    # Organize items by category in one pass
+    items_by_category = {category: [] for category in categories}
     for item in items:
-        if item.description and " - QR: " in item.description:
-            category = item.description.split(" - QR: ")[0]
-            # Skip placeholder items when showing categories
-            if not item.item_name.endswith(" Placeholder"):
-                categories.add(category)
-
-    # Organize items by category
-    all_items = items
-    items_by_category = {}
-
-    for category in categories:
-        items_by_category[category] = [
-            item for item in items
-            if item.description and item.description.startswith(category + " - QR: ")
-        ]
+        if item.category in items_by_category:
+            items_by_category[item.category].append(item)
 
     return render_template("inventory.html",
-                         all_items=all_items,
-                         categories=sorted(categories),
+                         all_items=items,
+                         categories=categories,
                          items_by_category=items_by_category)
 
+def ensure_category(name):
+    """Add an inventory category if it is new (not committed)."""
+    if not Category.query.filter_by(name=name).first():
+        db.session.add(Category(name=name))
+
 @app.route('/add_item', methods=['POST'])
 def add_item():
     if not session.get("role") == "admin":
@@ -854,42 +3155,41 @@ def add_item():
     if name and item_type:
         # If no QR code provided, generate a unique one
         if not qr_code or qr_code.strip() == "":
-            import time
-            import random
-            timestamp = int(time.time())
-            random_num = random.randint(100, 999)
-            qr_code = f"AUTO_{timestamp}_{random_num}"
-
-        # Check if QR code already exists
-        existing_item = Inventory.query.filter(
-            Inventory.description.like(f"%QR: {qr_code}%")
-        ).first()
-
-        if existing_item:
+            qr_code = f"AUTO_{uuid.uuid4().hex[:12].upper()}"
+        qr_code = qr_code.strip()
+
+        # Check if QR code already exists (an index lookup on qr_code)
+        if Inventory.query.filter_by(qr_code=qr_code).first():
             flash(f"Item with QR code '{qr_code}' already exists!", "error")
             return redirect(url_for("inventory"))
 
+        ensure_category(item_type)
+
         # Create new inventory item
         new_item = Inventory(
             item_name=name,
             quantity=1,
-            description=f"{item_type} - QR: {qr_code}",
+            category=item_type,
+            qr_code=qr_code,
             date_added=datetime.now(),
             last_checked=datetime.now()
         )
 
-        db.session.add(new_item)
-        db.session.commit()
-
-        # Log the action
-        audit_log = InventoryAudit(
-            item_id=new_item.id,
+        # Log the action in the same transaction
+        db.session.add(InventoryAudit(
+            item=new_item,
             action='added',
             user=session.get('user', 'Unknown'),
             notes=f"Item added via {'QR scan' if not qr_code.startswith('AUTO_') else 'manual entry'}"
-        )
-        db.session.add(audit_log)
-        db.session.commit()
+        ))
+        db.session.add(new_item)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another admin saved the same code between the check and now
+            db.session.rollback()
+            flash(f"Item with QR code '{qr_code}' already exists!", "error")
+            return redirect(url_for("inventory"))
 
         if qr_code.startswith("AUTO_"):
             flash(f"Item '{name}' added successfully with auto-generated ID: {qr_code}!", "success")
@@ -939,132 +3239,334 @@ def add_category():
         flash("Category name is required!", "error")
         return redirect(url_for("inventory"))
 
-    # Create a placeholder item for the new category to make the tab appear
-    placeholder_item = Inventory(
-        item_name=f"{category_name} Placeholder",
-        quantity=0,
-        description=f"{category_name} - QR: PLACEHOLDER_{int(datetime.now().timestamp())}",
-        date_added=datetime.now(),
-        last_checked=datetime.now(),
-        notes="Placeholder item to create category tab. Add real items to this category."
-    )
-
-    db.session.add(placeholder_item)
+    ensure_category(category_name)
     db.session.commit()
 
     flash(f"Category '{category_name}' added successfully! You can now add items to this category.", "success")
     return redirect(url_for("inventory"))
 
+# -------------------------------
+# Inventory Stock-Take
+# -------------------------------
+SCAN_BATCH_LIMIT = 1000
+
+def scan_items_query(scan_session):
+    query = Inventory.query
+    if scan_session.category:
+        query = query.filter(Inventory.category == scan_session.category)
+    return query
+
+def found_item_ids(scan_session_id, item_ids=None):
+    query = db.session.query(InventoryAudit.item_id).filter(
+        InventoryAudit.scan_session_id == scan_session_id,
+        InventoryAudit.action == 'found'
+    )
+    if item_ids is not None:
+        query = query.filter(InventoryAudit.item_id.in_(item_ids))
+    return {item_id for (item_id,) in query.distinct()}
+
+def record_scans(scan_session, codes, user):
+    """Resolve a batch of scanned codes and log each newly found item. Does not commit.
+
+    Returns (found, unknown): the items found for the first time in this
+    session, and the codes that match no item (or one outside the session's
+    category).
+    """
+    now = datetime.now()
+    items = {}
+    for start in range(0, len(codes), UPSERT_CHUNK_SIZE):
+        chunk = codes[start:start + UPSERT_CHUNK_SIZE]
+        for item_id, qr_code in scan_items_query(scan_session) \
+                .filter(Inventory.qr_code.in_(chunk)).with_entities(Inventory.id, Inventory.qr_code):
+            items[qr_code] = item_id
+    unknown = [code for code in codes if code not in items]
+
+    already_found = set()
+    item_ids = list(items.values())
+    for start in range(0, len(item_ids), UPSERT_CHUNK_SIZE):
+        already_found |= found_item_ids(scan_session.id, item_ids[start:start + UPSERT_CHUNK_SIZE])
+    found = [(code, item_id) for code, item_id in items.items() if item_id not in already_found]
+
+    if items:
+        bump_data_versions([INVENTORY_SCOPE])
+        # A found item counts as available again
+        for start in range(0, len(item_ids), UPSERT_CHUNK_SIZE):
+            Inventory.query.filter(Inventory.id.in_(item_ids[start:start + UPSERT_CHUNK_SIZE])).update({
+                Inventory.last_checked: now,
+                Inventory.quantity: db.case((Inventory.quantity > 0, Inventory.quantity), else_=1)
+            }, synchronize_session=False)
+    if found:
+        db.session.execute(db.insert(InventoryAudit), [
+            {"item_id": item_id, "action": "found", "date": now, "user": user,
+             "notes": f"Scanned: {code}", "scan_session_id": scan_session.id}
+            for code, item_id in found
+        ])
+    ScanSession.query.filter_by(id=scan_session.id).update({
+        ScanSession.scanned_count: ScanSession.scanned_count + len(codes),
+        ScanSession.unknown_count: ScanSession.unknown_count + len(unknown)
+    }, synchronize_session=False)
+    return found, unknown
+
+def scan_summary(scan_session, missing=None):
+    expected = scan_items_query(scan_session).count()
+    found = len(found_item_ids(scan_session.id))
+    summary = {
+        "session_id": scan_session.id,
+        "category": scan_session.category,
+        "started_at": scan_session.started_at.isoformat(),
+        "closed_at": scan_session.closed_at.isoformat() if scan_session.closed_at else None,
+        "scanned": scan_session.scanned_count,
+        "unknown": scan_session.unknown_count,
+        "expected": expected,
+        "found": found,
+    }
+    if missing is not None:
+        summary["missing_count"] = len(missing)
+        summary["missing"] = [
+            {"id": item.id, "item_name": item.item_name, "category": item.category, "qr_code": item.qr_code}
+            for item in missing
+        ]
+    return summary
+
+@app.route('/inventory/scan', methods=['POST'])
+def inventory_scan():
+    """Record a batch of scanned QR codes for a stock-take, in one transaction.
+
+    Expects {"codes": [...], "session_id": optional, "category": optional}.
+    Without a session_id a new session is started (limited to `category`
+    if given); scanners post later batches with the id they get back.
+    """
+    if not session.get("role") == "admin":
+        return {"error": "Access denied"}, 403
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("codes"), list):
+        return {"error": "Expected {\"codes\": [...], \"session_id\": ...}"}, 400
+    codes = list(dict.fromkeys(str(code).strip() for code in payload["codes"] if str(code).strip()))
+    if len(codes) > SCAN_BATCH_LIMIT:
+        return {"error": f"At most {SCAN_BATCH_LIMIT} codes per batch"}, 400
+
+    if payload.get("session_id"):
+        scan_session = db.session.get(ScanSession, payload["session_id"])
+        if scan_session is None:
+            return {"error": "Unknown scan session"}, 404
+        if scan_session.closed_at:
+            return {"error": "Scan session is closed"}, 409
+    else:
+        scan_session = ScanSession(id=uuid.uuid4().hex, category=payload.get("category") or None,
+                                   started_by=session.get("user"))
+        db.session.add(scan_session)
+        db.session.flush()
+
+    try:
+        found, unknown = record_scans(scan_session, codes, session.get("user", "Unknown"))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        return {"error": "Could not record scans"}, 500
+
+    return {
+        "session_id": scan_session.id,
+        "received": len(codes),
+        "found": [code for code, _ in found],
+        "unknown": unknown,
+    }
+
+@app.route('/inventory/scan/<session_id>')
+def inventory_scan_status(session_id):
+    if not session.get("role") == "admin":
+        return {"error": "Access denied"}, 403
+    scan_session = db.session.get(ScanSession, session_id)
+    if scan_session is None:
+        return {"error": "Unknown scan session"}, 404
+    return scan_summary(scan_session)
+
+@app.route('/inventory/scan/<session_id>/close', methods=['POST'])
+def inventory_scan_close(session_id):
+    """Close a stock-take: mark every expected item that was not scanned as missing."""
+    if not session.get("role") == "admin":
+        return {"error": "Access denied"}, 403
+    scan_session = db.session.get(ScanSession, session_id)
+    if scan_session is None:
+        return {"error": "Unknown scan session"}, 404
+    if scan_session.closed_at:
+        return {"error": "Scan session is already closed"}, 409
+
+    found = db.session.query(InventoryAudit.item_id).filter(
+        InventoryAudit.scan_session_id == scan_session.id,
+        InventoryAudit.action == 'found'
+    )
+    missing = scan_items_query(scan_session).filter(~Inventory.id.in_(found)) \
+        .order_by(Inventory.category, Inventory.item_name).all()
+
+    now = datetime.now()
+    if missing:
+        db.session.execute(db.insert(InventoryAudit), [
+            {"item_id": item.id, "action": "missing", "date": now, "user": session.get("user", "Unknown"),
+             "notes": "Not scanned during stock-take", "scan_session_id": scan_session.id}
+            for item in missing
+        ])
+        missing_ids = [item.id for item in missing]
+        bump_data_versions([INVENTORY_SCOPE])
+        for start in range(0, len(missing_ids), UPSERT_CHUNK_SIZE):
+            Inventory.query.filter(Inventory.id.in_(missing_ids[start:start + UPSERT_CHUNK_SIZE])) \
+                .update({Inventory.quantity: 0}, synchronize_session=False)
+    scan_session.closed_at = now
+    db.session.commit()
+
+    return scan_summary(scan_session, missing)
+
+# -------------------------------
+# Class Promotion
+# -------------------------------
+# Students are moved with one UPDATE per target class. Every move is first
+# copied into promotion_log by an INSERT ... SELECT over the same rows.
+def needs_move(student_class):
+    return db.or_(Student.student_class.is_(None), Student.student_class != student_class)
+
+def promotion_diff(today=None):
+    """Active students whose class doesn't match their age, without changing anything."""
+    today = today or date.today()
+    target = target_class_expression(today)
+    rows = db.session.query(Student.id, Student.name, Student.dob, Student.student_class, target) \
+        .filter(Student.status == 'active', needs_move(target)) \
+        .order_by(Student.student_class, Student.name)
+    moves = [{'student_id': student_id, 'name': name, 'age': age_on(dob, today),
+              'from_class': from_class, 'to_class': to_class}
+             for student_id, name, dob, from_class, to_class in rows]
+    totals = Counter((move['from_class'], move['to_class']) for move in moves)
+    return {'moves': moves,
+            'totals': [{'from_class': from_class, 'to_class': to_class, 'count': count}
+                       for (from_class, to_class), count in sorted(totals.items(), key=lambda item: -item[1])]}
+
+def move_students(condition, to_class, kind, run_id, user_id):
+    """Log and move the active students matching `condition` into `to_class`. Does not commit."""
+    condition = db.and_(Student.status == 'active', condition, needs_move(to_class))
+    db.session.execute(db.insert(PromotionLog).from_select(
+        ['run_id', 'student_id', 'from_class', 'to_class', 'kind', 'promoted_by', 'promoted_at'],
+        db.select(db.literal(run_id), Student.id, Student.student_class, db.literal(to_class),
+                  db.literal(kind), db.literal(user_id, db.Integer), db.literal(datetime.now())).where(condition)
+    ))
+    return Student.query.filter(condition).update({Student.student_class: to_class}, synchronize_session=False)
+
+def finish_promotion(run_id):
+    # Bulk updates skip the flush hook, so bump the rosters they touched
+    classes = db.session.query(PromotionLog.from_class, PromotionLog.to_class).filter_by(run_id=run_id).distinct()
+    bump_data_versions([scope for pair in classes for student_class in pair for scope in roster_scopes(student_class)])
+
+def promote_by_age(user_id, today=None):
+    """Move every active student into the class for their age. Returns (run_id, moved)."""
+    run_id, moved = uuid.uuid4().hex, 0
+    for student_class, born_after, born_on_or_before in age_band_ranges(today):
+        moved += move_students(dob_in_range(born_after, born_on_or_before), student_class,
+                               'automatic', run_id, user_id)
+    finish_promotion(run_id)
+    return run_id, moved
+
+def promote_selected(student_ids, new_class, user_id):
+    """Move the given students into `new_class`. Returns (run_id, moved, skipped).
+
+    Like automatic runs, only active students not already in `new_class`
+    move. `skipped` counts the rest by reason: 'already', 'inactive' and
+    'missing' (no such student).
+    """
+    run_id, moved, skipped = uuid.uuid4().hex, 0, Counter()
+    for start in range(0, len(student_ids), UPSERT_CHUNK_SIZE):
+        chunk = student_ids[start:start + UPSERT_CHUNK_SIZE]
+        found = 0
+        for status, student_class in db.session.query(Student.status, Student.student_class) \
+                .filter(Student.id.in_(chunk)):
+            found += 1
+            if status != 'active':
+                skipped['inactive'] += 1
+            elif student_class == new_class:
+                skipped['already'] += 1
+        skipped['missing'] += len(chunk) - found
+        moved += move_students(Student.id.in_(chunk), new_class, 'manual', run_id, user_id)
+    finish_promotion(run_id)
+    return run_id, moved, +skipped
+
+def recent_promotions(limit=10):
+    """The latest promotion runs with who ran them and how many students moved."""
+    return db.session.query(
+        PromotionLog.run_id, PromotionLog.kind, db.func.max(PromotionLog.promoted_at).label('promoted_at'),
+        db.func.count(PromotionLog.id).label('moved'), User.full_name
+    ).outerjoin(User, User.id == PromotionLog.promoted_by) \
+        .group_by(PromotionLog.run_id, PromotionLog.kind, User.full_name) \
+        .order_by(db.func.max(PromotionLog.promoted_at).desc()).limit(limit).all()
+
 @app.route('/promote_students', methods=['GET', 'POST'])
 def promote_students():
     if not session.get("role") == "admin":
         flash("Access denied.", "danger")
         return redirect(url_for("dashboard"))
 
+    classes = [student_class for student_class, _ in app.config['CLASS_AGE_BANDS']]
+
     if request.method == 'POST':
         promotion_type = request.form.get('promotion_type')
 
         if promotion_type == 'automatic':
-            # Automatic promotion based on age
-            students = Student.query.filter_by(status='active').all()
-            promoted_count = 0
-
-            for student in students:
-                birth_date = datetime.strptime(student.dob, "%Y-%m-%d")
-                today = datetime.now()
-                age = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
-
-                # Determine correct class based on current age
-                if age <= 5:
-                    new_class = "Genesis"
-                elif age <= 7:
-                    new_class = "Exodus"
-                elif age <= 9:
-                    new_class = "Psalms"
-                elif age <= 11:
-                    new_class = "Proverbs"
-                elif age <= 13:
-                    new_class = "Revelation"
-                else:
-                    new_class = "High Schoolers"
-
-                # Only update if class needs to change
-                if student.student_class != new_class:
-                    old_class = student.student_class
-                    student.student_class = new_class
-                    promoted_count += 1
-
-                    # Log the promotion
-                    print(f"Promoted {student.name} from {old_class} to {new_class} (Age: {age})")
-
+            # Dry run: show who would move where, change nothing
+            if request.form.get('dry_run'):
+                preview = promotion_diff()
+                if wants_json():
+                    return preview
+                return render_template("promote_students.html", preview=preview, student_data=[],
+                                       classes=classes, age_bands=age_band_labels(),
+                                       recent_runs=recent_promotions())
+
+            _, promoted_count = promote_by_age(session.get("user_id"))
             db.session.commit()
             flash(f"Successfully promoted {promoted_count} students to age-appropriate classes!", "success")
 
         elif promotion_type == 'manual':
             # Manual promotion for selected students
-            selected_students = request.form.getlist('student_ids')
             new_class = request.form.get('new_class')
+            try:
+                selected_students = sorted({int(student_id) for student_id in request.form.getlist('student_ids')})
+            except ValueError:
+                flash("Invalid student selection.", "error")
+                return redirect(url_for('promote_students'))
 
             if not selected_students or not new_class:
                 flash("Please select students and a target class.", "error")
                 return redirect(url_for('promote_students'))
+            if new_class not in classes:
+                flash(f"Unknown class {new_class}.", "error")
+                return redirect(url_for('promote_students'))
 
-            promoted_count = 0
-            for student_id in selected_students:
-                student = Student.query.get(student_id)
-                if student:
-                    old_class = student.student_class
-                    student.student_class = new_class
-                    promoted_count += 1
-                    print(f"Manually moved {student.name} from {old_class} to {new_class}")
-
+            _, promoted_count, skipped = promote_selected(selected_students, new_class, session.get("user_id"))
             db.session.commit()
-            flash(f"Successfully moved {promoted_count} students to {new_class}!", "success")
+            message = f"Successfully moved {promoted_count} students to {new_class}!"
+            if skipped:
+                reasons = {'already': f"already in {new_class}", 'inactive': "not active",
+                           'missing': "no longer in the register"}
+                message += f" Skipped {sum(skipped.values())}: " + ", ".join(
+                    f"{count} {reasons[reason]}" for reason, count in skipped.items()) + "."
+            flash(message, "success")
 
         return redirect(url_for('promote_students'))
 
-    # GET request - show promotion interface
-    students = Student.query.filter_by(status='active').all()
-
-    # Calculate age and suggested class for each student
-    student_data = []
-    for student in students:
-        birth_date = datetime.strptime(student.dob, "%Y-%m-%d")
-        today = datetime.now()
-        age = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
-
-        # Determine suggested class based on age
-        if age <= 5:
-            suggested_class = "Genesis"
-        elif age <= 7:
-            suggested_class = "Exodus"
-        elif age <= 9:
-            suggested_class = "Psalms"
-        elif age <= 11:
-            suggested_class = "Proverbs"
-        elif age <= 13:
-            suggested_class = "Revelation"
-        else:
-            suggested_class = "High Schoolers"
-
-        needs_promotion = student.student_class != suggested_class
-
-        student_data.append({
-            'student': student,
-            'age': age,
-            'current_class': student.student_class,
-            'suggested_class': suggested_class,
-            'needs_promotion': needs_promotion
-        })
-
-    # Sort by those needing promotion first
-    student_data.sort(key=lambda x: (not x['needs_promotion'], x['student'].name))
-
-    classes = ["Genesis", "Exodus", "Psalms", "Proverbs", "Revelation", "High Schoolers"]
+    # GET request - show promotion interface, students needing a move first
+    today = date.today()
+    target = target_class_expression(today)
+    rows = db.session.query(Student, target).filter(Student.status == 'active') \
+        .order_by(db.case((needs_move(target), 0), else_=1), Student.name)
+
+    student_data = [{
+        'student': student,
+        'age': age_on(student.dob, today),
+        'current_class': student.student_class,
+        'suggested_class': suggested_class,
+        'needs_promotion': student.student_class != suggested_class
+    } for student, suggested_class in rows]
 
     return render_template("promote_students.html",
                          student_data=student_data,
-                         classes=classes)
+                         classes=classes,
+                         age_bands=age_band_labels(),
+                         recent_runs=recent_promotions())
 
 @app.route('/activate_student/<int:student_id>', methods=['POST'])
 def activate_student(student_id):
@@ -1092,14 +3594,12 @@ def manage_status():
             return redirect(url_for('manage_status'))
 
         updated_count = 0
-        for student_id in selected_students:
-            student = Student.query.get(student_id)
-            if student:
-                if action == 'activate':
-                    student.status = 'active'
-                elif action == 'deactivate':
-                    student.status = 'inactive'
-                updated_count += 1
+        for student in Student.query.filter(Student.id.in_(selected_students)):
+            if action == 'activate':
+                student.status = 'active'
+            elif action == 'deactivate':
+                student.status = 'inactive'
+            updated_count += 1
 
         db.session.commit()
         status_text = "activated" if action == 'activate' else "deactivated"
@@ -1108,13 +3608,47 @@ def manage_status():
         return redirect(url_for('manage_status'))
 
     # GET request - show status management interface
-    students = Student.query.all()
-    active_students = [s for s in students if s.status == 'active']
-    inactive_students = [s for s in students if s.status == 'inactive']
+    status_counts = dict(db.session.query(Student.status, db.func.count(Student.id)).group_by(Student.status))
 
     return render_template("manage_status.html",
-                         active_students=active_students,
-                         inactive_students=inactive_students)
+                         active=status_rows('active'),
+                         inactive=status_rows('inactive'),
+                         active_count=status_counts.get('active', 0),
+                         inactive_count=status_counts.get('inactive', 0),
+                         total_count=sum(status_counts.values()))
+
+@app.route('/students/rows/<view>')
+def student_rows(view):
+    """Next page of a student list as an HTML fragment, for infinite scroll.
+
+    The cursor for the page after it is sent in the X-Next-Cursor header
+    (empty on the last page).
+    """
+    if "user" not in session:
+        return "Not logged in", 401
+
+    cursor = request.args.get("cursor")
+    try:
+        if view == "dashboard":
+            today = date.today()
+            sundays = get_sundays(request.args.get("year", today.year, type=int),
+                                  request.args.get("month", today.month, type=int))
+            rows = dashboard_rows(request.args.get("class_name"), sundays, cursor)
+            template = "_dashboard_rows.html"
+        elif view == "all_students":
+            rows = all_students_rows(request.args.get("class_name"), request.args.get("search", "").strip(), cursor)
+            template = "_all_students_rows.html"
+        elif view in ("active", "inactive") and session.get("role") == "admin":
+            rows = status_rows(view, cursor)
+            template = "_status_cards.html"
+        else:
+            return "Unknown student list", 404
+    except ValueError as e:
+        return str(e), 400
+
+    response = app.make_response(render_template(template, **rows))
+    response.headers["X-Next-Cursor"] = rows["next_cursor"] or ""
+    return response
 
 @app.route('/check_attendance_deactivation', methods=['POST'])
 def check_attendance_deactivation():
@@ -1122,66 +3656,22 @@ def check_attendance_deactivation():
         flash("Access denied.", "danger")
         return redirect(url_for("dashboard"))
 
-    # Get the last 4 Sundays
-    today = datetime.now()
-    sundays = []
-    current_date = today
-
-    # Find the last 4 Sundays
-    for _ in range(4):
-        # Go back to find the most recent Sunday
-        days_back = (current_date.weekday() + 1) % 7
-        if days_back == 0 and current_date.date() == today.date():
-            days_back = 7  # If today is Sunday, go back to previous Sunday
-
-        sunday = current_date - timedelta(days=days_back)
-        sundays.append(sunday.date())
-        current_date = sunday - timedelta(days=1)  # Move to day before this Sunday
-
-    # Get all active students
-    active_students = Student.query.filter_by(status='active').all()
-    deactivated_count = 0
-    deactivated_students = []
-
-    for student in active_students:
-        # Check attendance for the last 4 Sundays
-        missed_count = 0
-        attendance_details = []
-
-        for sunday in sundays:
-            attendance = Attendance.query.filter_by(
-                student_id=student.id,
-                date=sunday
-            ).first()
-
-            if not attendance or not attendance.present:
-                missed_count += 1
-                attendance_details.append(f"{sunday.strftime('%m/%d/%Y')}: Absent")
-            else:
-                attendance_details.append(f"{sunday.strftime('%m/%d/%Y')}: Present")
-
-        # If student missed all 4 Sundays, deactivate them
-        if missed_count >= 4:
-            student.status = 'inactive'
-            deactivated_count += 1
-            deactivated_students.append({
-                'name': student.name,
-                'class': student.student_class,
-                'attendance': attendance_details
-            })
-
-            print(f"Auto-deactivated {student.name} for missing {missed_count}/4 Sundays")
+    deactivate_threshold = app.config['ATTENDANCE_DEACTIVATE_THRESHOLD']
+    today = date.today()
 
+    # Who is about to be deactivated, with their recent attendance for the log
+    deactivated_students = attendance_risk(threshold=deactivate_threshold, today=today, with_details=True)
+    deactivated_count = deactivate_absent_students(threshold=deactivate_threshold, today=today)
     db.session.commit()
 
     if deactivated_count > 0:
-        flash(f"Automatically deactivated {deactivated_count} students for missing 4+ consecutive Sundays. They can be reactivated when they return.", "warning")
+        flash(f"Automatically deactivated {deactivated_count} students for missing {deactivate_threshold}+ consecutive Sundays. They can be reactivated when they return.", "warning")
 
         # Log the deactivations for admin review
         for student_info in deactivated_students:
-            print(f"DEACTIVATED: {student_info['name']} ({student_info['class']})")
-            for attendance_line in student_info['attendance']:
-                print(f"  - {attendance_line}")
+            print(f"DEACTIVATED: {student_info['name']} ({student_info['class']}) for missing {student_info['missed_count']}/{len(student_info['attendance'])} Sundays")
+            for day in student_info['attendance']:
+                print(f"  - {day['date'].strftime('%m/%d/%Y')}: {'Present' if day['present'] else 'Absent'}")
     else:
         flash("No students needed automatic deactivation based on attendance.", "info")
 
@@ -1193,20 +3683,15 @@ def delete_sample_students():
         flash("Access denied.", "danger")
         return redirect(url_for("dashboard"))
 
-    deleted_count = 0
-    students = Student.query.filter_by(status='active').all()
-
-    for student in students:
-        if not student.profile_image:
-            try:
-                Attendance.query.filter_by(student_id=student.id).delete()
-                db.session.delete(student)
-                deleted_count += 1
-            except Exception as e:
-                print(f"Error deleting student {student.id}: {e}")
-
-    db.session.commit()
-    flash(f"Successfully deleted {deleted_count} students without profile photos!", "success")
+    without_photo = db.and_(Student.status == 'active',
+                            db.or_(Student.profile_image.is_(None), Student.profile_image == ''))
+    result = purge_students(without_photo, dry_run=bool(request.form.get("dry_run")))
+    if wants_json():
+        return result
+    if request.form.get("dry_run"):
+        flash(f"{result['matched']} students without profile photos would be deleted.", "info")
+    else:
+        flash(f"Successfully deleted {result['deleted']} students without profile photos!", "success")
     return redirect(url_for("dashboard"))
 
 
@@ -1221,20 +3706,15 @@ def keep_only_student(student_id):
         flash("Student not found.", "error")
         return redirect(url_for("dashboard"))
 
-    all_students = Student.query.all()
-    deleted_count = 0
-
-    for student in all_students:
-        if student.id != student_id:
-            try:
-                Attendance.query.filter_by(student_id=student.id).delete()
-                db.session.delete(student)
-                deleted_count += 1
-            except Exception as e:
-                print(f"Error deleting student {student.id}: {e}")
-
-    db.session.commit()
-    flash(f"Successfully deleted {deleted_count} students. Only {keep_student.name} remains.", "success")
+    keep_name = keep_student.name
+    result = purge_students(Student.id != student_id, dry_run=bool(request.form.get("dry_run")))
+    if wants_json():
+        return result
+    if request.form.get("dry_run"):
+        flash(f"{result['matched']} students would be deleted, leaving only {keep_name}.", "info")
+    else:
+        collect_orphan_uploads()
+        flash(f"Successfully deleted {result['deleted']} students. Only {keep_name} remains.", "success")
     return redirect(url_for("dashboard"))
 
 
@@ -1244,48 +3724,10 @@ def auto_attendance_check():
     if not session.get("role") == "admin":
         return {"error": "Access denied"}, 403
 
-    # Get the last 4 Sundays
-    today = datetime.now()
-    sundays = []
-    current_date = today
-
-    for _ in range(4):
-        days_back = (current_date.weekday() + 1) % 7
-        if days_back == 0 and current_date.date() == today.date():
-            days_back = 7
-
-        sunday = current_date - timedelta(days=days_back)
-        sundays.append(sunday.date())
-        current_date = sunday - timedelta(days=1)
-
-    active_students = Student.query.filter_by(status='active').all()
-    students_at_risk = []
-
-    for student in active_students:
-        missed_count = 0
-        recent_attendance = []
-
-        for sunday in sundays:
-            attendance = Attendance.query.filter_by(
-                student_id=student.id,
-                date=sunday
-            ).first()
-
-            if not attendance or not attendance.present:
-                missed_count += 1
-                recent_attendance.append({"date": sunday.strftime('%m/%d'), "present": False})
-            else:
-                recent_attendance.append({"date": sunday.strftime('%m/%d'), "present": True})
-
-        if missed_count >= 3:  # At risk if missed 3+ (will be deactivated at 4)
-            students_at_risk.append({
-                'id': student.id,
-                'name': student.name,
-                'class': student.student_class,
-                'missed_count': missed_count,
-                'attendance': recent_attendance,
-                'will_deactivate': missed_count >= 4
-            })
+    students_at_risk = attendance_risk(with_details=True)
+    for student in students_at_risk:
+        for day in student['attendance']:
+            day['date'] = day['date'].strftime('%m/%d')
 
     return {
         'students_at_risk': students_at_risk,
@@ -1301,30 +3743,16 @@ def admin_teachers():
         flash("Access denied.", "danger")
         return redirect(url_for("dashboard"))
 
-    # Get all users
-    pending_teachers = User.query.filter_by(status='pending', role='teacher').all()
-    active_teachers = User.query.filter_by(status='active', role='teacher').all()
-    suspended_teachers = User.query.filter_by(status='suspended', role='teacher').all()
-    rejected_teachers = User.query.filter_by(status='rejected', role='teacher').all()
-
-    # Get class assignment overview
-    classes = ["Genesis", "Exodus", "Psalms", "Proverbs", "Revelation", "High Schoolers"]
-    class_assignments = {}
-    for class_name in classes:
-        teacher = User.query.filter_by(assigned_class=class_name, status='active').first()
-        student_count = Student.query.filter_by(student_class=class_name, status='active').count()
-        class_assignments[class_name] = {
-            'teacher': teacher,
-            'student_count': student_count
-        }
-
+    coverage = class_coverage()
+    teachers = coverage['teachers']
     return render_template("admin_teachers.html",
-                         pending_teachers=pending_teachers,
-                         active_teachers=active_teachers,
-                         suspended_teachers=suspended_teachers,
-                         rejected_teachers=rejected_teachers,
-                         class_assignments=class_assignments,
-                         classes=classes)
+                         pending_teachers=teachers['pending'],
+                         active_teachers=teachers['active'],
+                         suspended_teachers=teachers['suspended'],
+                         rejected_teachers=teachers['rejected'],
+                         class_assignments=coverage['assignments'],
+                         classes=coverage['classes'],
+                         last_logins=dict(db.session.query(User.id, User.last_login).filter(User.role == 'teacher')))
 
 @app.route('/admin/approve-teacher/<int:user_id>', methods=['POST'])
 def approve_teacher(user_id):
@@ -1439,12 +3867,42 @@ def delete_teacher(user_id):
 
     user = User.query.get_or_404(user_id)
     name = user.full_name
+    # Databases created before approved_by had ON DELETE SET NULL still need this
+    User.query.filter_by(approved_by=user.id).update({User.approved_by: None})
     db.session.delete(user)
     db.session.commit()
 
     flash(f"Teacher {name} has been permanently deleted.", "danger")
     return redirect(url_for('admin_teachers'))
 
+# -------------------------------
+# Admin Performance
+# -------------------------------
+@app.route('/admin/perf', methods=['GET'])
+def admin_perf():
+    if not session.get("role") == "admin":
+        flash("Access denied.", "danger")
+        return redirect(url_for("dashboard"))
+
+    summary = perf_summary()
+    if wants_json():
+        return summary
+    return render_template("admin_perf.html", **summary,
+                           n_plus_one_threshold=app.config['PERF_N_PLUS_ONE_THRESHOLD'],
+                           slow_request_ms=app.config['PERF_SLOW_REQUEST_MS'])
+
+@app.route('/admin/perf/reset', methods=['POST'])
+def reset_perf():
+    if not session.get("role") == "admin":
+        flash("Access denied.", "danger")
+        return redirect(url_for("dashboard"))
+
+    with _perf_lock:
+        _perf_routes.clear()
+        _perf_recent.clear()
+    flash("Performance statistics cleared.", "success")
+    return redirect(url_for("admin_perf"))
+
 # -------------------------------
 # Admin Student Deletion
 # -------------------------------
@@ -1459,12 +3917,8 @@ def delete_student(student_id):
     student_class = student.student_class
 
     try:
-        # Delete associated attendance records first (to maintain referential integrity)
-        Attendance.query.filter_by(student_id=student_id).delete()
-
-        # Delete the student
-        db.session.delete(student)
-        db.session.commit()
+        # Attendance and promotion history are removed with the student
+        purge_students(Student.id == student_id)
 
         flash(f"Student '{student_name}' from {student_class} class has been permanently deleted.", "success")
 
@@ -1501,65 +3955,7 @@ def inventory_pdf_report():
         flash("Access denied.", "danger")
         return redirect(url_for("dashboard"))
 
-    items = Inventory.query.all()
-
-    # Create simple HTML for PDF
-    html_content = f"""
-    <html>
-    <head>
-        <title>Inventory Report</title>
-        <style>
-            body {{ font-family: Arial, sans-serif; }}
-            table {{ width: 100%; border-collapse: collapse; }}
-            th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-            th {{ background-color: #f2f2f2; }}
-            .available {{ color: green; }}
-            .missing {{ color: red; }}
-        </style>
-    </head>
-    <body>
-        <h1>Inventory Report</h1>
-        <p>Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-        <table>
-            <tr>
-                <th>QR Code</th>
-                <th>Item Name</th>
-                <th>Category</th>
-                <th>Status</th>
-            </tr>
-    """
-
-    for item in items:
-        qr_code = item.description.split(' - QR: ')[1] if ' - QR: ' in item.description else 'N/A'
-        category = item.description.split(' - QR: ')[0] if ' - QR: ' in item.description else item.description
-        status = "Available" if item.quantity > 0 else "Missing"
-        status_class = "available" if item.quantity > 0 else "missing"
-
-        html_content += f"""
-            <tr>
-                <td>{qr_code}</td>
-                <td>{item.item_name}</td>
-                <td>{category}</td>
-                <td class="{status_class}">{status}</td>
-            </tr>
-        """
-
-    html_content += """
-        </table>
-    </body>
-    </html>
-    """
-
-    # Generate PDF
-    pdf = BytesIO()
-    pisa_status = pisa.CreatePDF(html_content, dest=pdf)
-    if pisa_status.err:
-        flash("PDF generation error", "error")
-        return redirect(url_for("inventory"))
-
-    pdf.seek(0)
-    filename = f"Inventory_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    return send_file(pdf, download_name=filename, as_attachment=True)
+    return enqueue_report_job('inventory_pdf', {})
 
 @app.route('/inventory_excel_report')
 def inventory_excel_report():
@@ -1567,51 +3963,61 @@ def inventory_excel_report():
         flash("Access denied.", "danger")
         return redirect(url_for("dashboard"))
 
-    items = Inventory.query.all()
-
-    # Prepare data for Excel
-    data = []
-    for item in items:
-        qr_code = item.description.split(' - QR: ')[1] if ' - QR: ' in item.description else 'N/A'
-        category = item.description.split(' - QR: ')[0] if ' - QR: ' in item.description else item.description
-        status = "Available" if item.quantity > 0 else "Missing"
-
-        data.append({
-            'QR Code': qr_code,
-            'Item Name': item.item_name,
-            'Category': category,
-            'Status': status
-        })
-
-    df = pd.DataFrame(data)
-
-    # Export to Excel
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Inventory')
-    output.seek(0)
-
-    filename = f"Inventory_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    return send_file(output,
-                     download_name=filename,
-                     as_attachment=True,
-                     mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    return enqueue_report_job('inventory_excel', {})
 
 # -------------------------------
-# Run App
+# App Factory
 # -------------------------------
-if __name__ == "__main__":
-    with app.app_context():
-        db.create_all()
-        create_default_users()
-    app.run(debug=True)
+_bound_database = None  # (URI, engine options) the db was last bound with
+
+def create_app(config=None, prepare_database=True):
+    """Bind the database and return the app, e.g. gunicorn 'app:create_app()'.
+
+    Importing this module only defines the routes and models. `config`
+    overrides settings before the database is bound. The module holds a
+    single app, so calling it again with a different database is an error
+    rather than a silent reuse of the first engine. The worker pools and
+    the /admin/perf buffer are (re)built here from the current config. prepare_database creates
+    the upload folder, applies migrations and adds the default users;
+    scripts that manage their own schema turn it off.
+    """
+    global _bound_database, image_executor, report_executor, _perf_recent
+    if config:
+        app.config.update(config)
+        if 'SQLALCHEMY_DATABASE_URI' in config and 'SQLALCHEMY_ENGINE_OPTIONS' not in config:
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(config['SQLALCHEMY_DATABASE_URI'])
+
+    database = (app.config['SQLALCHEMY_DATABASE_URI'], dict(app.config['SQLALCHEMY_ENGINE_OPTIONS']))
+    if _bound_database is None:
+        db.init_app(app)
+        _bound_database = database
+    elif database != _bound_database:
+        raise RuntimeError(f"The app is already bound to {_bound_database[0]}; "
+                           f"start a new process to use {database[0]}")
+
+    for executor in (image_executor, report_executor):
+        if executor is not None:
+            executor.shutdown(wait=False)
+    image_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='profile-image')
+    report_executor = ThreadPoolExecutor(max_workers=app.config['REPORT_JOB_WORKERS'],
+                                         thread_name_prefix='report-job')
+    with _perf_lock:
+        _perf_recent = deque(_perf_recent, maxlen=app.config['PERF_RECENT_REQUESTS'])
+    if app.config['PERF_INSTRUMENTATION']:
+        enable_perf_instrumentation()
+
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    if prepare_database:
+        with app.app_context():
+            db.create_all()
+            run_migrations()
+            create_default_users()
+    return app
 
 # -------------------------------
 # Run App
+# -------------------------------
 if __name__ == "__main__":
-    with app.app_context():
-        db.create_all()
-        create_default_users()
-    app.run(debug=True)
+    create_app().run(debug=True)
 
 
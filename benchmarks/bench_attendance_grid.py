@@ -0,0 +1,54 @@
+"""Dashboard attendance grid: per-cell helper vs. one batched month query.
+
+Usage: python benchmarks/bench_attendance_grid.py [sizes...]
+Default sizes are 100, 1000 and 10000 students in one class.
+"""
+import sys
+from datetime import date
+
+from common import count_queries, load_app, login, ms, reset_tables, seed_attendance, seed_students, timed
+
+app_module = load_app("attendance_grid.db")
+app, db = app_module.app, app_module.db
+
+
+def legacy_cells(students, sundays):
+    # What dashboard.html did before: one query per student x Sunday
+    attendance_present = app_module.utility_functions()["attendance_present"]
+    return [[attendance_present(s.id, sunday) for sunday in sundays] for s in students]
+
+
+def run(size):
+    reset_tables(app_module)
+    today = date.today()
+    sundays = app_module.get_sundays(today.year, today.month)
+    ids = seed_students(app_module, size)
+    seed_attendance(app_module, ids, sundays)
+
+    with app.app_context():
+        students = app_module.Student.query.filter_by(student_class="Genesis", status="active").all()
+
+        with count_queries(app_module) as legacy_q:
+            legacy_time = min(timed(lambda: legacy_cells(students, sundays), repeat=1))
+        with count_queries(app_module) as grid_q:
+            grid_time = min(timed(lambda: app_module.load_attendance_grid(students, sundays, "Genesis"), repeat=3))
+
+        grid = app_module.load_attendance_grid(students, sundays, "Genesis")
+        assert [grid[s.id] for s in students] == legacy_cells(students, sundays)
+
+    client = app.test_client()
+    login(client, "teacher", "Genesis")
+    with count_queries(app_module) as render_q:
+        render_time = min(timed(lambda: client.get("/dashboard?class_name=Genesis"), repeat=3))
+
+    cells = size * len(sundays)
+    print(f"{size:>6} students x {len(sundays)} Sundays ({cells} cells)")
+    print(f"    per-cell helper : {legacy_q.count:>6} queries {ms(legacy_time)}")
+    print(f"    batched grid    : {grid_q.count // 3:>6} queries {ms(grid_time)}")
+    print(f"    /dashboard      : {render_q.count // 3:>6} queries {ms(render_time)} per render")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000]
+    for size in sizes:
+        run(size)
@@ -0,0 +1,88 @@
+"""Cost of marking attendance on a large table, before and after the indexes.
+
+Seeds 20,000 students x 50 Sundays (1M attendance rows) without indexes,
+times the old query-then-insert marking (with the version and rollup
+flush hook off, as it was then), applies only the index migration (0001),
+then times the upsert used by mark_attendance, which now also bumps data
+versions and adjusts the rollups.
+
+Usage: python benchmarks/bench_attendance_marking.py [students] [sundays] [marks]
+"""
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import event
+
+from common import load_app, ms, seed_attendance, seed_students
+
+app_module = load_app("attendance_marking.db")
+app, db, Attendance = app_module.app, app_module.db, app_module.Attendance
+
+
+def legacy_mark(student_id, day, present):
+    record = Attendance.query.filter_by(student_id=student_id, date=day).first()
+    if record:
+        record.present = present
+    else:
+        db.session.add(Attendance(student_id=student_id, date=day, present=present))
+    db.session.commit()
+
+
+def upsert_mark(student_id, day, present):
+    app_module.upsert_attendance([{"student_id": student_id, "date": day, "present": present}])
+    db.session.commit()
+
+
+def time_marks(mark, marks):
+    start = time.perf_counter()
+    for student_id, day, present in marks:
+        mark(student_id, day, present)
+    return (time.perf_counter() - start) / len(marks)
+
+
+def main(students=20000, sundays=50, count=200):
+    first = date(2020, 1, 5)
+    days = [first + timedelta(weeks=i) for i in range(sundays)]
+
+    with app.app_context():
+        for index in Attendance.__table__.indexes:
+            index.drop(db.engine)
+    ids = seed_students(app_module, students)
+    seed_attendance(app_module, ids, days)
+    # A few duplicates for the migration to clean up
+    seed_attendance(app_module, ids[:100], days[:2])
+
+    rng = random.Random(42)
+    # Half update existing rows, half insert for a new Sunday
+    new_day = days[-1] + timedelta(weeks=1)
+    marks = [(rng.choice(ids), rng.choice(days if i % 2 else [new_day]), bool(i % 3)) for i in range(count)]
+
+    with app.app_context():
+        total = Attendance.query.count()
+        event.remove(db.session, "after_flush", app_module.bump_versions_after_flush)
+        try:
+            legacy = time_marks(legacy_mark, marks)
+        finally:
+            event.listen(db.session, "after_flush", app_module.bump_versions_after_flush)
+
+        start = time.perf_counter()
+        dict(app_module.MIGRATIONS)["0001_attendance_indexes"]()
+        db.session.commit()
+        migration = time.perf_counter() - start
+
+        # The upsert adjusts rollups, so start it from correct ones
+        app_module.rebuild_attendance_rollups()
+        db.session.commit()
+        upsert = time_marks(upsert_mark, marks)
+        remaining = Attendance.query.count()
+
+    print(f"{total} attendance rows ({students} students x {sundays} Sundays + duplicates)")
+    print(f"    query-then-insert, no index    : {ms(legacy)} per mark")
+    print(f"    migration 0001 (dedupe + index): {ms(migration)} ({remaining} rows after)")
+    print(f"    upsert + versions + rollups    : {ms(upsert)} per mark")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,63 @@
+"""At-risk / deactivation check: per-student loop vs. one grouped query.
+
+Usage: python benchmarks/bench_attendance_risk.py [sizes...]
+"""
+import sys
+from datetime import date
+
+from common import count_queries, load_app, ms, reset_tables, seed_attendance, seed_students, timed
+
+app_module = load_app("attendance_risk.db")
+app, db = app_module.app, app_module.db
+Student, Attendance = app_module.Student, app_module.Attendance
+
+
+def legacy_at_risk(sundays, threshold=3):
+    # The loop that used to live in dashboard(), check_attendance_deactivation()
+    # and auto_attendance_check(): one query per active student per Sunday
+    at_risk = []
+    for student in Student.query.filter_by(status='active').all():
+        missed_count = 0
+        for sunday in sundays:
+            attendance = Attendance.query.filter_by(student_id=student.id, date=sunday).first()
+            if not attendance or not attendance.present:
+                missed_count += 1
+        if missed_count >= threshold:
+            at_risk.append((student.id, missed_count))
+    return at_risk
+
+
+def run(size):
+    reset_tables(app_module)
+    today = date.today()
+    sundays = app_module.last_sundays(4, today)
+    ids = seed_students(app_module, size)
+    # Every other student attends on alternating Sundays; a quarter never attends
+    seed_attendance(app_module, ids[: size * 3 // 4], sundays)
+
+    with app.app_context():
+        with count_queries(app_module) as legacy_q:
+            legacy_time = min(timed(lambda: legacy_at_risk(sundays), repeat=1))
+        with count_queries(app_module) as engine_q:
+            engine_time = min(timed(lambda: app_module.attendance_risk(today=today), repeat=3))
+        with count_queries(app_module) as detail_q:
+            detail_time = min(timed(lambda: app_module.attendance_risk(today=today, with_details=True), repeat=3))
+
+        engine = [(s['id'], s['missed_count']) for s in app_module.attendance_risk(today=today)]
+        assert engine == legacy_at_risk(sundays)
+
+        with count_queries(app_module) as update_q:
+            deactivated = app_module.deactivate_absent_students(today=today)
+        db.session.rollback()
+
+    print(f"{size:>6} active students, {len(engine)} at risk, {deactivated} to deactivate")
+    print(f"    per-student loop   : {legacy_q.count:>6} queries {ms(legacy_time)}")
+    print(f"    grouped aggregate  : {engine_q.count // 3:>6} queries {ms(engine_time)}")
+    print(f"    with details       : {detail_q.count // 3:>6} queries {ms(detail_time)}")
+    print(f"    bulk deactivation  : {update_q.count:>6} queries")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 5000]
+    for size in sizes:
+        run(size)
@@ -0,0 +1,75 @@
+"""Attendance trends over several years: raw attendance scan vs. the monthly rollups.
+
+Seeds students across every class with a mark for each Sunday, builds the
+rollups the way migration 0007 does, then times a per-class monthly trend
+computed from the raw rows against /attendance/trends, plus the cost the
+rollups add to a bulk save of one class's Sunday.
+
+Usage: python benchmarks/bench_attendance_rollup.py [students_per_class] [years]
+"""
+import sys
+from datetime import date
+
+from common import CLASSES, count_queries, load_app, login, ms, percentile, seed_attendance, seed_students, timed
+
+app_module = load_app("attendance_rollup.db")
+app, db, Attendance, Student = app_module.app, app_module.db, app_module.Attendance, app_module.Student
+
+
+def seed(per_class, years):
+    end = date.today().year
+    sundays = app_module.get_sundays_between((end - years + 1, 1), (end, 12))
+    with app.app_context():
+        app_module.run_migrations()
+    ids = {}
+    for student_class in CLASSES:
+        ids[student_class] = seed_students(app_module, per_class, student_class=student_class)
+        seed_attendance(app_module, ids[student_class], sundays)
+    with app.app_context():
+        app_module.rebuild_attendance_rollups()
+        db.session.commit()
+    return ids, sundays
+
+
+def raw_trend(start_year, end_year, student_class):
+    year, month = db.extract('year', Attendance.date), db.extract('month', Attendance.date)
+    return db.session.query(
+        year, month,
+        db.func.sum(db.case((Attendance.present == True, 1), else_=0)),
+        db.func.count(db.distinct(Attendance.student_id)),
+        db.func.count(db.distinct(Attendance.date))
+    ).join(Student, Student.id == Attendance.student_id).filter(
+        Student.student_class == student_class,
+        Attendance.date.between(date(start_year, 1, 1), date(end_year, 12, 31))
+    ).group_by(year, month).all()
+
+
+def report(label, samples, queries=None):
+    extra = f", {queries} queries" if queries is not None else ""
+    print(f"    {label:<28}: p50 {ms(percentile(samples, 50))}, p95 {ms(percentile(samples, 95))}{extra}")
+
+
+def main(students_per_class=2000, years=3):
+    ids, sundays = seed(students_per_class, years)
+    start_year, end_year = sundays[0].year, sundays[-1].year
+    print(f"{students_per_class * len(CLASSES)} students x {len(sundays)} Sundays")
+
+    client = app.test_client()
+    login(client, "admin")
+    with app.app_context():
+        report("raw attendance GROUP BY", timed(lambda: raw_trend(start_year, end_year, "Genesis")))
+    with count_queries(app_module) as queries:
+        samples = timed(lambda: client.get(
+            f"/attendance/trends?class_name=Genesis&start_year={start_year}&end_year={end_year}").close())
+    report("/attendance/trends (rollup)", samples, queries.count // len(samples))
+
+    # Save one class's whole Sunday, alternating between two days already in the rollup
+    marks = [[{"student_id": student_id, "date": day.isoformat(), "present": True}
+              for student_id in ids["Genesis"]] for day in sundays[-2:]]
+    samples = [s for n in range(6) for s in timed(
+        lambda: client.post("/mark_attendance/bulk", json=marks[n % 2]).close(), repeat=1)]
+    report(f"bulk save, {students_per_class} marks", samples)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
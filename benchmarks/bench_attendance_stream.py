@@ -0,0 +1,87 @@
+"""Live attendance fan-out: delivery latency and memory bound per stream.
+
+Opens N /attendance/stream connections (half for one class, half for all
+classes), each read on its own thread, while a teacher saves marks through
+/mark_attendance. Reports how long a mark takes to reach every open
+dashboard. A second run adds streams that are never read, to show their
+queues stop at ATTENDANCE_STREAM_QUEUE_SIZE and get a resync instead of
+growing.
+
+Usage: python benchmarks/bench_attendance_stream.py [streams] [marks]
+"""
+import sys
+import threading
+import time
+
+from common import load_app, login, ms, percentile, seed_students
+
+app_module = load_app("attendance_stream.db")
+app = app_module.app
+app.config["ATTENDANCE_STREAM_ENABLED"] = True
+app.config["ATTENDANCE_STREAM_KEEPALIVE_SECONDS"] = 0.2  # So reader threads notice the stop quickly
+
+
+def reader(response, received, stop):
+    for chunk in response.response:
+        if stop.is_set():
+            break
+        if chunk.startswith(b"event: marks"):
+            received.append(time.perf_counter())
+
+
+def run(streams, marks, stalled=0):
+    student_ids = seed_students(app_module, 50, "Genesis")
+    sunday = app_module.get_sundays(2026, 10)[-1]
+    viewer = app.test_client()
+    login(viewer, "teacher")
+
+    stop = threading.Event()
+    received = [[] for _ in range(streams)]
+    responses, threads = [], []
+    for index in range(streams):
+        url = "/attendance/stream?class_name=Genesis" if index % 2 else "/attendance/stream"
+        response = viewer.get(url, buffered=False)
+        next(response.response)  # retry: line
+        responses.append(response)
+        thread = threading.Thread(target=reader, args=(response, received[index], stop), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for _ in range(stalled):
+        response = viewer.get("/attendance/stream", buffered=False)
+        next(response.response)
+        responses.append(response)
+
+    writer = app.test_client()
+    login(writer, "admin")
+    latencies = []
+    for i in range(marks):
+        sent = time.perf_counter()
+        writer.post("/mark_attendance", data={"student_id": student_ids[i % len(student_ids)],
+                                              "date": sunday.isoformat(), "present": "true" if i % 2 else "false"})
+        deadline = time.time() + 5
+        while any(len(r) <= i for r in received) and time.time() < deadline:
+            time.sleep(0.0005)
+        latencies.append(max(r[i] for r in received) - sent)
+
+    queued = [client["queue"].qsize() for client in app_module._stream_clients]
+    stop.set()
+    for thread in threads:
+        thread.join()
+    for response in responses:
+        response.close()
+    return latencies, queued
+
+
+def main(streams=20, marks=200):
+    limit = app.config["ATTENDANCE_STREAM_QUEUE_SIZE"]
+    latencies, _ = run(streams, marks)
+    print(f"{streams} open dashboards, {marks} marks")
+    print(f"    save -> every dashboard : p50 {ms(percentile(latencies, 50))}, p95 {ms(percentile(latencies, 95))}")
+
+    latencies, queued = run(streams, marks, stalled=5)
+    print(f"    with 5 stalled streams  : p50 {ms(percentile(latencies, 50))}, p95 {ms(percentile(latencies, 95))}, "
+          f"largest queue {max(queued)} (limit {limit})")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
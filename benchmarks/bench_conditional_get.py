@@ -0,0 +1,57 @@
+"""Repeat requests: full responses vs. 304 revalidation and reused exports.
+
+Generates a congregation, then requests each route once to get its ETag
+and times a plain repeat against a repeat carrying If-None-Match. The
+Excel export is also clicked again without a tag, which now sends the
+file built by the first click instead of queueing a new job.
+
+Usage: python benchmarks/bench_conditional_get.py [students] [repeat]
+"""
+import sys
+import time
+
+from common import count_queries, load_app, login, ms, percentile, wait_for_job
+from synthetic_data import generate
+
+app_module = load_app("conditional_get.db")
+app = app_module.app
+
+
+def timed_get(client, url, repeat, headers):
+    samples, sizes = [], 0
+    with count_queries(app_module) as queries:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(url, headers=headers)
+            sizes += len(response.get_data())
+            samples.append(time.perf_counter() - start)
+    return percentile(samples, 50), queries.count / repeat, sizes // repeat, response.status_code
+
+
+def main(students=2000, repeat=20):
+    generate(app_module, students=students, years=2)
+    today = time.localtime()
+    year, month = today.tm_year, today.tm_mon
+    client = app.test_client()
+    login(client, "admin")
+
+    json = {"Accept": "application/json"}
+    urls = [
+        "/get_student/1",
+        f"/attendance_report?year={year}&month={month}",
+        f"/attendance_pdf?year={year}&month={month}&class_name=Genesis",
+        f"/download_attendance?year={year}&period=year",
+    ]
+    print(f"{students} students, median of {repeat} requests")
+    for url in urls:
+        first = wait_for_job(client, client.get(url, headers=json))
+        first.get_data()
+        etag = client.get(url, headers=json).headers.get("ETag")
+        full = timed_get(client, url, repeat, json)
+        cached = timed_get(client, url, repeat, dict(json, **{"If-None-Match": etag}))
+        print(f"    {url.split('?')[0]:<22} repeat {ms(full[0])} {full[1]:4.1f} queries {full[2]:>9} bytes (HTTP {full[3]})")
+        print(f"    {'':<22} 304    {ms(cached[0])} {cached[1]:4.1f} queries {cached[2]:>9} bytes (HTTP {cached[3]})")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
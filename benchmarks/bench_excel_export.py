@@ -0,0 +1,77 @@
+"""Attendance Excel export: pandas DataFrame pipeline vs. streamed write-only workbook.
+
+Seeds 10,000 students x 52 Sundays and exports the whole year both ways,
+reporting wall time and peak Python memory (tracemalloc). The old pipeline
+needs pandas installed to run.
+
+Usage: python benchmarks/bench_excel_export.py [students] [year]
+"""
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+from common import load_app, login, seed_attendance, seed_students, wait_for_job
+
+app_module = load_app("excel_export.db")
+app, Student, Attendance = app_module.app, app_module.Student, app_module.Attendance
+
+
+def legacy_export(year):
+    # The old download_attendance body, widened to a whole year
+    import pandas as pd
+    sundays = app_module.get_sundays_between((year, 1), (year, 12))
+    students = Student.query.filter_by(status="active").all()
+    all_attendance = Attendance.query.filter(Attendance.date.between(sundays[0], sundays[-1])).all()
+    attendance_map = {(a.student_id, a.date): a.present for a in all_attendance}
+    data = []
+    for student in students:
+        row = {"Name": student.name}
+        for sunday in sundays:
+            row[sunday.strftime('%d %b')] = "P" if attendance_map.get((student.id, sunday), False) else "A"
+        data.append(row)
+    df = pd.DataFrame(data)
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name='Attendance')
+    return len(output.getvalue())
+
+
+def streamed_export(client, year):
+    response = client.get(f"/download_attendance?year={year}&period=year", headers={"Accept": "application/json"})
+    response = wait_for_job(client, response)
+    size = len(response.get_data())
+    response.close()
+    return size
+
+
+def measure(fn):
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, size
+
+
+def main(students=10000, year=2025):
+    sundays = app_module.get_sundays_between((year, 1), (year, 12))
+    ids = seed_students(app_module, students)
+    seed_attendance(app_module, ids, sundays)
+    print(f"{students} students x {len(sundays)} Sundays")
+
+    client = app.test_client()
+    login(client, "admin")
+    with app.app_context():
+        runs = [("pandas DataFrame", lambda: legacy_export(year))]
+    runs.append(("streamed workbook", lambda: streamed_export(client, year)))
+    for label, fn in runs:
+        with app.app_context():
+            elapsed, peak, size = measure(fn)
+        print(f"    {label:<18}: {elapsed:6.2f} s, peak {peak / 2**20:7.1f} MiB, {size / 2**20:5.1f} MiB file")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
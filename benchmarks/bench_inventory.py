@@ -0,0 +1,74 @@
+"""Inventory add and QR lookup at 100,000 items: packed description vs. qr_code column.
+
+The old add_item checked for a duplicate QR code with
+description LIKE '%QR: <code>%' (a full scan); the new one looks the code up
+in the unique qr_code index. Both are timed for adding new items and for
+looking up existing codes.
+
+Usage: python benchmarks/bench_inventory.py [items] [operations]
+"""
+import random
+import sys
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from common import load_app, ms, percentile, timed
+
+app_module = load_app("inventory.db")
+app, db, Inventory = app_module.app, app_module.db, app_module.Inventory
+CATEGORIES = ["Chairs", "Tables", "Boards", "Projectors", "Microphones", "Bibles", "Pencils"]
+
+
+def seed(count):
+    rng = random.Random(3)
+    rows = []
+    for i in range(count):
+        category, code = rng.choice(CATEGORIES), f"QR{i:07d}"
+        rows.append({"item_name": f"{category} {i}", "quantity": 1, "category": category, "qr_code": code,
+                     "description": f"{category} - QR: {code}", "date_added": datetime.now(),
+                     "last_checked": datetime.now()})
+    with app.app_context():
+        app_module.run_migrations()
+        for start in range(0, count, 20000):
+            db.session.execute(insert(Inventory), rows[start:start + 20000])
+        db.session.commit()
+
+
+def legacy_add(code):
+    if Inventory.query.filter(Inventory.description.like(f"%QR: {code}%")).first():
+        return
+    db.session.add(Inventory(item_name="New", quantity=1, description=f"Chairs - QR: {code}"))
+    db.session.commit()
+
+
+def column_add(code):
+    if Inventory.query.filter_by(qr_code=code).first():
+        return
+    db.session.add(Inventory(item_name="New", quantity=1, category="Chairs", qr_code=code))
+    db.session.commit()
+
+
+def report(label, samples):
+    print(f"    {label:<28}: p50 {ms(percentile(samples, 50))}, p95 {ms(percentile(samples, 95))}")
+
+
+def main(items=100000, operations=50):
+    seed(items)
+    rng = random.Random(11)
+    existing = [f"QR{rng.randrange(items):07d}" for _ in range(operations)]
+    print(f"{items} items, {operations} operations each")
+
+    with app.app_context():
+        report("lookup, description LIKE", [s for code in existing for s in timed(
+            lambda: Inventory.query.filter(Inventory.description.like(f"%QR: {code}%")).first(), repeat=1)])
+        report("lookup, qr_code index", [s for code in existing for s in timed(
+            lambda: Inventory.query.filter_by(qr_code=code).first(), repeat=1)])
+        report("add, description LIKE check", [s for n in range(operations) for s in timed(
+            lambda: legacy_add(f"NEWL{n:05d}"), repeat=1)])
+        report("add, qr_code index check", [s for n in range(operations) for s in timed(
+            lambda: column_add(f"NEWC{n:05d}"), repeat=1)])
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
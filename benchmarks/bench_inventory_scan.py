@@ -0,0 +1,110 @@
+"""Stock-take throughput: several handheld scanners posting to /inventory/scan at once.
+
+Runs the app on a real threaded server. Each scanner works through its own
+share of the inventory's QR codes (plus a few unknown codes) in one shared
+scan session, first one code per request, then in batches. The session is
+closed at the end of each run to produce the missing-items summary.
+
+Usage: python benchmarks/bench_inventory_scan.py [items] [scanners] [batch_size]
+"""
+import http.client
+import json
+import logging
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+from sqlalchemy import insert
+from werkzeug.serving import make_server
+
+from common import load_app, percentile
+
+app_module = load_app("inventory_scan.db")
+app, db = app_module.app, app_module.db
+
+
+class Scanner:
+    def __init__(self, port, codes):
+        self.port = port
+        self.codes = codes
+        self.latencies = []
+        self.errors = 0
+        self.cookie = None
+        response = self.request("POST", "/login", urlencode({"email": "stock@church.org", "password": "secret123"}),
+                                "application/x-www-form-urlencoded")
+        self.cookie = response.getheader("Set-Cookie").split(";")[0]
+        self.latencies = []
+
+    def request(self, method, path, body, content_type):
+        connection = http.client.HTTPConnection("127.0.0.1", self.port)
+        headers = {"Content-Type": content_type}
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        start = time.perf_counter()
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        response.body = response.read()
+        self.latencies.append(time.perf_counter() - start)
+        connection.close()
+        if response.status >= 400:
+            self.errors += 1
+        return response
+
+    def scan(self, session_id, batch_size):
+        for start in range(0, len(self.codes), batch_size):
+            body = json.dumps({"session_id": session_id, "codes": self.codes[start:start + batch_size]})
+            self.request("POST", "/inventory/scan", body, "application/json")
+
+
+def setup(items):
+    with app.app_context():
+        app_module.run_migrations()
+        db.session.add(app_module.User(username="stock", email="stock@church.org", password="secret123",
+                                       role="admin", status="active"))
+        db.session.execute(insert(app_module.Inventory), [
+            {"item_name": f"Chair {i}", "quantity": 1, "category": "Chairs", "qr_code": f"QR{i:07d}"}
+            for i in range(items)
+        ])
+        db.session.commit()
+
+
+def run(port, items, scanners, batch_size):
+    # Scan 95% of the inventory; every 50th code is an unknown sticker
+    codes = [f"QR{i:07d}" if i % 50 else f"UNKNOWN{i}" for i in range(int(items * 0.95))]
+    crew = [Scanner(port, codes[n::scanners]) for n in range(scanners)]
+    opened = crew[0].request("POST", "/inventory/scan", json.dumps({"codes": []}), "application/json")
+    session_id = json.loads(opened.body)["session_id"]
+    crew[0].latencies = []
+
+    threads = [threading.Thread(target=s.scan, args=(session_id, batch_size)) for s in crew]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = [lat for s in crew for lat in s.latencies]
+    closed = crew[0].request("POST", f"/inventory/scan/{session_id}/close", "", "application/json")
+    summary = json.loads(closed.body)
+    print(f"    batch {batch_size:>4}: {len(codes) / elapsed * 60:10.0f} scans/min, "
+          f"p95 {percentile(latencies, 95) * 1000:7.1f} ms/request, errors {sum(s.errors for s in crew)}, "
+          f"found {summary['found']}/{summary['expected']}, missing {summary['missing_count']}, "
+          f"unknown {summary['unknown']}")
+
+
+def main(items=5000, scanners=4, batch_size=50):
+    setup(items)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"{items} items, {scanners} scanners")
+    run(server.server_port, items, scanners, 1)
+    run(server.server_port, items, scanners, batch_size)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
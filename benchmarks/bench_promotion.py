@@ -0,0 +1,86 @@
+"""Annual promotion: per-student Python loop vs. one UPDATE per class.
+
+Generates a congregation a year ago, so roughly half the students have
+aged into the next class, then runs the old promote_students loop on one
+copy of the data and promote_by_age() on another. The two must agree on
+where every student ends up.
+
+Usage: python benchmarks/bench_promotion.py [students]
+"""
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from common import count_queries, load_app, reset_tables
+from synthetic_data import generate
+
+app_module = load_app("promotion.db")
+app, db, Student = app_module.app, app_module.db, app_module.Student
+
+
+def legacy_promote():
+    # The old automatic branch of promote_students, minus the print per student
+    students = Student.query.filter_by(status='active').all()
+    for student in students:
+        birth_date = student.dob
+        today = datetime.now()
+        age = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+        if age <= 5:
+            new_class = "Genesis"
+        elif age <= 7:
+            new_class = "Exodus"
+        elif age <= 9:
+            new_class = "Psalms"
+        elif age <= 11:
+            new_class = "Proverbs"
+        elif age <= 13:
+            new_class = "Revelation"
+        else:
+            new_class = "High Schoolers"
+        if student.student_class != new_class:
+            student.student_class = new_class
+    db.session.commit()
+
+
+def placements():
+    return dict(db.session.query(Student.id, Student.student_class))
+
+
+def run(label, fn):
+    reset_tables(app_module)
+    generate(app_module, students=STUDENTS, years=1, today=date.today() - timedelta(days=365))
+    with app.app_context():
+        with count_queries(app_module) as queries:
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+        print(f"    {label:<24}: {elapsed * 1000:9.1f} ms, {queries.count} queries")
+        return placements()
+
+
+def main(students=20000):
+    global STUDENTS
+    STUDENTS = students
+    with app.app_context():
+        app_module.db.session.add(app_module.User(username="admin", password="x", role="admin", status="active"))
+    print(f"{students} students, placed a year ago")
+
+    def preview():
+        diff = app_module.promotion_diff()
+        print(f"    dry run would move {len(diff['moves'])} students")
+
+    def set_based():
+        app_module.promote_by_age(user_id=None)
+        db.session.commit()
+
+    run("dry-run preview", preview)
+    legacy = run("python loop", legacy_promote)
+    updated = run("UPDATE per class", set_based)
+    with app.app_context():
+        logged = db.session.query(app_module.PromotionLog).count()
+    changed = sum(1 for student_id, student_class in updated.items() if legacy[student_id] != student_class)
+    print(f"    {logged} moves logged, {changed} students placed differently")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
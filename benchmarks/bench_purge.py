@@ -0,0 +1,71 @@
+"""Purging students: per-student ORM deletes vs. chunked cascading deletes.
+
+Generates a congregation, then deletes every student without a photo the
+old way (bulk-delete each student's attendance, refresh their rollups,
+delete the student, one commit at the end) on one copy and with
+purge_students() on another. Also reports the longest time the write lock
+is held, which is what a teacher marking attendance would wait for.
+
+Usage: python benchmarks/bench_purge.py [students] [years]
+"""
+import sys
+import time
+
+from common import count_queries, load_app, reset_tables
+from synthetic_data import generate
+
+app_module = load_app("purge.db")
+app, db, Student, Attendance = app_module.app, app_module.db, app_module.Student, app_module.Attendance
+AttendanceRollup = app_module.AttendanceRollup
+
+WITHOUT_PHOTO = db.or_(Student.profile_image.is_(None), Student.profile_image == "")
+
+
+def legacy_purge():
+    # The old delete_sample_students loop; the whole purge is one transaction
+    start = time.perf_counter()
+    for student in Student.query.filter(WITHOUT_PHOTO).all():
+        months = {(student.id, year, month) for year, month in db.session.query(
+            AttendanceRollup.year, AttendanceRollup.month).filter_by(student_id=student.id)}
+        Attendance.query.filter_by(student_id=student.id).delete()
+        app_module.refresh_attendance_rollups(months)
+        db.session.delete(student)
+    db.session.commit()
+    return time.perf_counter() - start
+
+
+def chunked_purge():
+    lock_times = []
+    last = [time.perf_counter()]
+
+    def progress(deleted, matched):
+        now = time.perf_counter()
+        lock_times.append(now - last[0])
+        last[0] = now
+
+    app_module.purge_students(WITHOUT_PHOTO, progress=progress)
+    return max(lock_times)
+
+
+def run(label, fn, students, years):
+    reset_tables(app_module)
+    generate(app_module, students=students, years=years)
+    with app.app_context():
+        matched = app_module.purge_students(WITHOUT_PHOTO, dry_run=True)["matched"]
+        with count_queries(app_module) as queries:
+            start = time.perf_counter()
+            longest_lock = fn()
+            elapsed = time.perf_counter() - start
+        left = db.session.query(Attendance).join(Student).count()
+    print(f"    {label:<16}: {matched} students in {elapsed * 1000:8.1f} ms, {queries.count:6d} queries, "
+          f"longest transaction {longest_lock * 1000:8.1f} ms, {left} marks left")
+
+
+def main(students=2000, years=2):
+    print(f"{students} students, {years} years of attendance")
+    run("per-student", legacy_purge, students, years)
+    run("chunked cascade", chunked_purge, students, years)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,130 @@
+"""Route benchmark suite over a synthetic congregation.
+
+Generates students, attendance, teachers and inventory with
+synthetic_data.generate(), then drives the key routes through the Flask
+test client: dashboard, mark_attendance, attendance_report, the Excel and
+PDF exports (until the file is ready), all_students search and
+promote_students. Each route reports p50/p95/p99 latency and queries per
+request. Exports are built cold each time (the report cache and finished
+job files are cleared, so nothing is reused).
+
+Save a run with --save and compare a later one against it with
+--baseline; routes whose p95 or query count grew by more than 20% are
+marked REGRESSION.
+
+Usage: python benchmarks/bench_routes.py [--students N] [--years N] [--repeat N]
+                                         [--save FILE] [--baseline FILE]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import time
+
+from common import count_queries, load_app, login, percentile, wait_for_job
+from synthetic_data import generate
+
+app_module = load_app("routes.db")
+app = app_module.app
+REGRESSION = 1.2
+
+
+def scenarios(rng, summary):
+    """(name, repeat divisor, request function) for every benchmarked route."""
+    today = time.localtime()
+    year, month = today.tm_year, today.tm_mon
+    searches = ["mary", "kam 0712", "grace njeri", "ouma", "jos"]
+
+    def mark_attendance(client):
+        sunday = app_module.get_sundays(year, month)[0]
+        return client.post("/mark_attendance", data={
+            "student_id": rng.randrange(1, summary["students"] + 1),
+            "date": sunday.isoformat(), "present": rng.choice(["true", "false"])})
+
+    def cold_export(url):
+        def export(client):
+            shutil.rmtree(app.config["REPORT_CACHE_DIR"], ignore_errors=True)
+            shutil.rmtree(app.config["REPORT_JOB_DIR"], ignore_errors=True)
+            return wait_for_job(client, client.get(url, headers={"Accept": "application/json"}))
+        return export
+
+    return [
+        ("dashboard", 1, lambda c: c.get(f"/dashboard?month={month}&year={year}&class_name=Genesis")),
+        ("mark_attendance", 1, mark_attendance),
+        ("attendance_report", 1, lambda c: c.get(f"/attendance_report?month={month}&year={year}")),
+        ("excel export (year)", 4, cold_export(f"/download_attendance?year={year}&period=year")),
+        ("pdf export (class)", 4, cold_export(f"/attendance_pdf?month={month}&year={year}&class_name=Genesis")),
+        ("all_students search", 1, lambda c: c.get(f"/all_students?search={rng.choice(searches)}")),
+        ("promote_students", 4, lambda c: c.post("/promote_students", data={"promotion_type": "automatic"})),
+    ]
+
+
+def run(repeat, summary):
+    client = app.test_client()
+    login(client, "admin")
+    rng = random.Random(5)
+    results = {}
+    for name, divisor, request in scenarios(rng, summary):
+        request(client).close()  # Warm-up
+        samples = []
+        with count_queries(app_module) as queries:
+            for _ in range(max(1, repeat // divisor)):
+                start = time.perf_counter()
+                response = request(client)
+                response.get_data()
+                samples.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{name}: HTTP {response.status_code}")
+                response.close()
+        results[name] = {
+            "p50_ms": round(percentile(samples, 50) * 1000, 1),
+            "p95_ms": round(percentile(samples, 95) * 1000, 1),
+            "p99_ms": round(percentile(samples, 99) * 1000, 1),
+            "queries": round(queries.count / len(samples), 1),
+            "runs": len(samples),
+        }
+    return results
+
+
+def report(results, baseline=None):
+    print(f"    {'route':<22} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8}")
+    for name, r in results.items():
+        line = f"    {name:<22} {r['p50_ms']:>6.1f} ms {r['p95_ms']:>6.1f} ms {r['p99_ms']:>6.1f} ms {r['queries']:>8}"
+        before = (baseline or {}).get(name)
+        if before:
+            p95 = r["p95_ms"] / before["p95_ms"] if before["p95_ms"] else 1
+            queries = r["queries"] / before["queries"] if before["queries"] else 1
+            line += f"   p95 x{p95:.2f}, queries x{queries:.2f}"
+            if p95 > REGRESSION or queries > REGRESSION:
+                line += "  REGRESSION"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--save")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+
+    summary = generate(app_module, students=args.students, years=args.years)
+    print(f"{summary['students']} students, {summary['attendance']} attendance marks, "
+          f"{summary['users']} users, {summary['items']} items")
+
+    results = run(args.repeat, summary)
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["routes"]
+    report(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"students": args.students, "years": args.years, "routes": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
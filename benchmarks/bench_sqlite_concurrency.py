@@ -0,0 +1,134 @@
+"""Mixed read/write load across threads and processes, with and without the
+production SQLite pragmas.
+
+"default" reproduces the old settings (rollback journal, synchronous=FULL,
+no busy timeout); "tuned" uses the app's SQLITE_PRAGMAS defaults (WAL,
+synchronous=NORMAL, 5 s busy timeout, mmap and a 64 MB cache).
+
+Usage: python benchmarks/bench_sqlite_concurrency.py [seconds] [write_percent]
+"""
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from common import ROOT, percentile
+
+MODES = {
+    "default": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "SQLITE_BUSY_TIMEOUT_MS": "0",
+                "SQLITE_MMAP_SIZE": "0", "SQLITE_CACHE_SIZE_KB": "2000"},
+    "tuned": {},
+}
+LAYOUTS = [(1, 8), (4, 4)]  # (processes, threads per process)
+CLASSES = [f"Class {n:02d}" for n in range(30)]
+PER_CLASS = 60
+STUDENTS = len(CLASSES) * PER_CLASS
+SUNDAYS = [date(2024, 1, 7) + timedelta(weeks=i) for i in range(52)]
+
+
+def import_app(db_url, mode):
+    for name in MODES["default"]:
+        os.environ.pop(name, None)
+    os.environ.update(MODES[mode])
+    os.environ["DATABASE_URL"] = db_url
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import app as app_module
+    app_module.create_app(prepare_database=False)
+    return app_module
+
+
+def prepare(db_url):
+    from common import seed_attendance, seed_students
+    app_module = import_app(db_url, "tuned")
+    with app_module.app.app_context():
+        app_module.db.create_all()
+    for class_name in CLASSES:
+        ids = seed_students(app_module, PER_CLASS, class_name)
+        seed_attendance(app_module, ids, SUNDAYS[:26])
+    with app_module.app.app_context():
+        app_module.db.engine.dispose()
+
+
+def worker(db_url, mode, threads, seconds, write_percent, seed, results):
+    app_module = import_app(db_url, mode)
+    app, db = app_module.app, app_module.db
+    deadline = time.time() + seconds
+    stats = {"reads": 0, "writes": 0, "errors": 0, "latencies": []}
+    lock = threading.Lock()
+
+    def run(thread_seed):
+        rng = random.Random(thread_seed)
+        with app.app_context():
+            while time.time() < deadline:
+                start = time.perf_counter()
+                is_write = rng.randrange(100) < write_percent
+                try:
+                    if is_write:
+                        # One teacher saving a toggle
+                        app_module.upsert_attendance([{"student_id": rng.randint(1, STUDENTS),
+                                                       "date": rng.choice(SUNDAYS), "present": rng.random() < 0.5}])
+                    else:
+                        # One teacher loading their class's month
+                        class_name = rng.choice(CLASSES)
+                        students = app_module.Student.query.filter_by(student_class=class_name, status="active").all()
+                        first = rng.randrange(0, 48)
+                        app_module.load_attendance_grid(students, SUNDAYS[first:first + 4], class_name)
+                    db.session.commit()
+                    outcome = "writes" if is_write else "reads"
+                except Exception:
+                    db.session.rollback()
+                    outcome = "errors"
+                elapsed = time.perf_counter() - start
+                with lock:
+                    stats[outcome] += 1
+                    stats["latencies"].append(elapsed)
+
+    pool = [threading.Thread(target=run, args=(seed * 1000 + n,)) for n in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(stats)
+
+
+def run_layout(db_url, mode, processes, threads, seconds, write_percent):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    workers = [ctx.Process(target=worker, args=(db_url, mode, threads, seconds, write_percent, n, results))
+               for n in range(processes)]
+    for proc in workers:
+        proc.start()
+    collected = [results.get() for _ in workers]
+    for proc in workers:
+        proc.join()
+
+    reads = sum(s["reads"] for s in collected)
+    writes = sum(s["writes"] for s in collected)
+    errors = sum(s["errors"] for s in collected)
+    latencies = [lat for s in collected for lat in s["latencies"]]
+    print(f"    {mode:<8} {processes} proc x {threads} threads: {(reads + writes) / seconds:8.1f} ops/s "
+          f"({reads} reads, {writes} writes), {errors} locked/failed, "
+          f"p95 {percentile(latencies, 95) * 1000:7.1f} ms")
+
+
+def main(seconds=5, write_percent=20):
+    db_path = os.path.join(tempfile.mkdtemp(prefix="ccl_bench_"), "concurrency.db")
+    db_url = f"sqlite:///{db_path}"
+    prepare(db_url)
+    print(f"{STUDENTS} students, {write_percent}% writes, {seconds} s per run")
+    for processes, threads in LAYOUTS:
+        for mode in MODES:
+            if mode == "default":
+                # journal_mode is stored in the file, so switch it back explicitly
+                sqlite3.connect(db_path).execute("PRAGMA journal_mode = DELETE").close()
+            run_layout(db_url, mode, processes, threads, seconds, write_percent)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,80 @@
+"""Worker startup: cold import, create_app() and first-request latency.
+
+Each run is a fresh Python process on an empty database, so nothing is
+warm: it times `import app`, create_app() (schema, migrations, default
+users), then the first login page, dashboard, Excel export and PDF
+export. The exports are where openpyxl and xhtml2pdf now get imported.
+
+Usage: python benchmarks/bench_startup.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+STEPS = ["import app", "create_app()", "GET / (login page)", "GET /dashboard",
+         "first Excel export", "first PDF export"]
+
+
+def child(scratch):
+    timings = []
+    start = time.perf_counter()
+    import app as app_module
+    timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    app = app_module.create_app({
+        "REPORT_CACHE_DIR": os.path.join(scratch, "report_cache"),
+        "REPORT_JOB_DIR": os.path.join(scratch, "report_jobs"),
+        "UPLOAD_FOLDER": os.path.join(scratch, "uploads"),
+    })
+    timings.append(time.perf_counter() - start)
+
+    from common import login, wait_for_job
+    client = app.test_client()
+    json_headers = {"Accept": "application/json"}
+    requests = [
+        lambda: client.get("/"),
+        lambda: (login(client, "admin"), client.get("/dashboard"))[1],
+        lambda: wait_for_job(client, client.get("/download_attendance", headers=json_headers)),
+        lambda: wait_for_job(client, client.get("/attendance_pdf", headers=json_headers)),
+    ]
+    for request in requests:
+        start = time.perf_counter()
+        response = request()
+        response.get_data()
+        timings.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            raise RuntimeError(f"HTTP {response.status_code}")
+    print(json.dumps(timings))
+
+
+def run_once():
+    scratch = tempfile.mkdtemp(prefix="ccl_startup_")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(scratch, 'startup.db')}")
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", scratch],
+                            cwd=os.path.dirname(here), env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main(runs=5):
+    results = [run_once() for _ in range(runs)]
+    print(f"{runs} cold starts (median / max)")
+    for index, step in enumerate(STEPS):
+        samples = [result[index] for result in results]
+        print(f"    {step:<22}: {statistics.median(samples) * 1000:8.1f} ms / {max(samples) * 1000:8.1f} ms")
+    to_first_page = [result[0] + result[1] + result[2] for result in results]
+    print(f"    {'ready to serve login':<22}: {statistics.median(to_first_page) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        here = os.path.dirname(os.path.abspath(__file__))
+        sys.path[:0] = [os.path.dirname(here), here]
+        child(sys.argv[2])
+    else:
+        main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,79 @@
+"""Student search at scale: Python substring filtering vs. the FTS5 index.
+
+Seeds 50,000 active students with photos, then times the old all_students
+search (load every row, filter with .lower() in Python), the new paginated
+/all_students search and the /students/autocomplete endpoint.
+
+Usage: python benchmarks/bench_student_search.py [students]
+"""
+import random
+import sys
+from datetime import date
+
+from sqlalchemy import insert
+
+from common import CLASSES, count_queries, load_app, login, ms, percentile, timed
+from synthetic_data import FIRST, LAST
+
+app_module = load_app("student_search.db")
+app, db, Student = app_module.app, app_module.db, app_module.Student
+
+SEARCHES = ["jos", "mary kam", "0712", "wanj", "ouma", "grace njeri"]
+
+
+def seed(count):
+    rng = random.Random(7)
+    rows = [
+        {"name": f"{rng.choice(FIRST)} {rng.choice(LAST)} {i}", "dob": date(2016, 1, 1),
+         "parent": f"{rng.choice(FIRST)} {rng.choice(LAST)}", "contact": f"07{rng.randrange(10**8):08d}",
+         "student_class": rng.choice(CLASSES), "status": "active", "profile_image": "photo.jpg",
+         "deletion_requested": False}
+        for i in range(count)
+    ]
+    with app.app_context():
+        app_module.run_migrations()
+        db.session.execute(insert(Student), rows)
+        db.session.commit()
+
+
+def legacy_search(search_query):
+    # The old all_students body
+    students = Student.query.filter(Student.status == "active", Student.profile_image != None) \
+        .order_by(Student.name).all()
+    search_lower = search_query.lower()
+    return [s for s in students if
+            search_lower in s.name.lower() or
+            (s.parent and search_lower in s.parent.lower()) or
+            (s.contact and search_lower in s.contact.lower())]
+
+
+def report(label, samples, queries):
+    print(f"    {label:<22}: p50 {ms(percentile(samples, 50))}, p95 {ms(percentile(samples, 95))}, "
+          f"{queries} queries")
+
+
+def main(students=50000):
+    seed(students)
+    print(f"{students} active students, {len(SEARCHES)} search terms")
+    client = app.test_client()
+    login(client, "admin")
+
+    legacy, fts, suggest = [], [], []
+    with count_queries(app_module) as legacy_queries, app.app_context():
+        for term in SEARCHES:
+            legacy += timed(lambda: legacy_search(term), repeat=3)
+    with count_queries(app_module) as page_queries:
+        for term in SEARCHES:
+            fts += timed(lambda: client.get(f"/all_students?search={term}").close(), repeat=3)
+    with count_queries(app_module) as suggest_queries:
+        for term in SEARCHES:
+            suggest += timed(lambda: client.get(f"/students/autocomplete?q={term}").close(), repeat=3)
+
+    runs = len(SEARCHES) * 3
+    report("python filter (query)", legacy, legacy_queries.count // runs)
+    report("/all_students page", fts, page_queries.count // runs)
+    report("/students/autocomplete", suggest, suggest_queries.count // runs)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
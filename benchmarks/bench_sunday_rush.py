@@ -0,0 +1,119 @@
+"""Simulated Sunday-morning rush: 20 teachers each ticking 60 students at once.
+
+Runs the app on a real threaded server and compares one POST per checkbox
+(/mark_attendance) with debounced batches (/mark_attendance/bulk).
+
+Usage: python benchmarks/bench_sunday_rush.py [teachers] [students_per_teacher] [batch_size]
+"""
+import http.client
+import json
+import logging
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+from werkzeug.serving import make_server
+
+from common import load_app, percentile, reset_tables, seed_students
+
+app_module = load_app("sunday_rush.db")
+app, db, User = app_module.app, app_module.db, app_module.User
+
+
+class Teacher:
+    def __init__(self, port, email, student_ids):
+        self.port = port
+        self.student_ids = student_ids
+        self.latencies = []
+        self.errors = 0
+        response = self.request("POST", "/login", urlencode({"email": email, "password": "secret123"}),
+                                "application/x-www-form-urlencoded")
+        self.cookie = response.getheader("Set-Cookie").split(";")[0]
+
+    def request(self, method, path, body, content_type):
+        connection = http.client.HTTPConnection("127.0.0.1", self.port)
+        headers = {"Content-Type": content_type}
+        if getattr(self, "cookie", None):
+            headers["Cookie"] = self.cookie
+        start = time.perf_counter()
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        response.read()
+        self.latencies.append(time.perf_counter() - start)
+        connection.close()
+        if response.status >= 400:
+            self.errors += 1
+        return response
+
+    def tick_one_by_one(self, sunday):
+        for student_id in self.student_ids:
+            body = urlencode({"student_id": student_id, "date": sunday.isoformat(), "present": "true"})
+            self.request("POST", "/mark_attendance", body, "application/x-www-form-urlencoded")
+
+    def tick_in_batches(self, sunday, batch_size):
+        for start in range(0, len(self.student_ids), batch_size):
+            marks = [{"student_id": sid, "date": sunday.isoformat(), "present": True}
+                     for sid in self.student_ids[start:start + batch_size]]
+            self.request("POST", "/mark_attendance/bulk", json.dumps(marks), "application/json")
+
+
+def setup(teachers, per_teacher):
+    reset_tables(app_module)
+    rosters = []
+    with app.app_context():
+        for n in range(teachers):
+            class_name = f"Class {n:02d}"
+            db.session.add(User(username=f"t{n}", email=f"t{n}@church.org", password="secret123",
+                                role="teacher", status="active", assigned_class=class_name))
+            db.session.commit()
+            rosters.append((f"t{n}@church.org", seed_students(app_module, per_teacher, class_name)))
+    return rosters
+
+
+def rush(mode, port, rosters, sunday, batch_size):
+    with app.app_context():
+        db.session.query(app_module.Attendance).delete()
+        db.session.commit()
+    teachers = [Teacher(port, email, ids) for email, ids in rosters]
+    for teacher in teachers:
+        teacher.latencies = []  # Leave the login out of the numbers
+
+    if mode == "single":
+        threads = [threading.Thread(target=t.tick_one_by_one, args=(sunday,)) for t in teachers]
+    else:
+        threads = [threading.Thread(target=t.tick_in_batches, args=(sunday, batch_size)) for t in teachers]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = [lat for t in teachers for lat in t.latencies]
+    errors = sum(t.errors for t in teachers)
+    with app.app_context():
+        saved = app_module.Attendance.query.filter_by(date=sunday, present=True).count()
+    marks = sum(len(ids) for _, ids in rosters)
+    print(f"    {mode:<6}: {len(latencies):>5} requests in {elapsed:6.2f} s "
+          f"= {len(latencies) / elapsed:7.1f} req/s, {marks / elapsed:7.1f} marks/s, "
+          f"p95 {percentile(latencies, 95) * 1000:7.1f} ms, errors {errors}, saved {saved}/{marks}")
+
+
+def main(teachers=20, per_teacher=60, batch_size=10):
+    rosters = setup(teachers, per_teacher)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    today = date.today()
+    sunday = today + timedelta(days=(6 - today.weekday()) % 7)
+
+    print(f"{teachers} teachers x {per_teacher} students, bulk batch size {batch_size}")
+    rush("single", server.server_port, rosters, sunday, batch_size)
+    rush("bulk", server.server_port, rosters, sunday, batch_size)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
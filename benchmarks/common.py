@@ -0,0 +1,137 @@
+"""Shared helpers for the benchmark scripts.
+
+Every script points the app at a throwaway SQLite file before importing it,
+so the real instance/church_register.db is never touched.
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+from contextlib import contextmanager
+
+from sqlalchemy import event, insert
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+CLASSES = ["Genesis", "Exodus", "Psalms", "Proverbs", "Revelation", "High Schoolers"]
+
+
+def load_app(db_name="bench.db"):
+    """Import app.py bound to a fresh temporary database and create the tables."""
+    scratch = tempfile.mkdtemp(prefix="ccl_bench_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, db_name)}"
+    import app as app_module
+    app_module.create_app({
+        "REPORT_CACHE_DIR": os.path.join(scratch, "report_cache"),
+        "REPORT_JOB_DIR": os.path.join(scratch, "report_jobs"),
+        "UPLOAD_FOLDER": os.path.join(scratch, "uploads"),
+    }, prepare_database=False)
+    with app_module.app.app_context():
+        app_module.db.create_all()
+    return app_module
+
+
+def reset_tables(app_module):
+    with app_module.app.app_context():
+        app_module.db.drop_all()
+        app_module.db.create_all()
+
+
+def seed_students(app_module, count, student_class="Genesis", dob=date(2020, 1, 1)):
+    """Insert `count` active students in one statement and return their ids."""
+    db, Student = app_module.db, app_module.Student
+    rows = [
+        {"name": f"Student {i:06d}", "dob": dob, "parent": f"Parent {i}",
+         "contact": f"07{i:08d}", "student_class": student_class, "status": "active",
+         "deletion_requested": False}
+        for i in range(count)
+    ]
+    with app_module.app.app_context():
+        db.session.execute(insert(Student), rows)
+        db.session.commit()
+        return [row[0] for row in db.session.query(Student.id).filter_by(student_class=student_class)]
+
+
+def seed_attendance(app_module, student_ids, days, present_every=2):
+    """Insert one Attendance row per student per day (every other one present)."""
+    db, Attendance = app_module.db, app_module.Attendance
+    with app_module.app.app_context():
+        batch = []
+        for n, student_id in enumerate(student_ids):
+            for day in days:
+                batch.append({"student_id": student_id, "date": day,
+                              "present": (n + day.toordinal()) % present_every == 0})
+                if len(batch) >= 50000:
+                    db.session.execute(insert(Attendance), batch)
+                    batch = []
+        if batch:
+            db.session.execute(insert(Attendance), batch)
+        db.session.commit()
+
+
+def login(client, role="teacher", assigned_class="Genesis", user_id=1):
+    with client.session_transaction() as sess:
+        sess["user"] = f"{role}@church.org"
+        sess["user_id"] = user_id
+        sess["role"] = role
+        sess["assigned_class"] = assigned_class if role == "teacher" else None
+        sess["full_name"] = role.title()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+@contextmanager
+def count_queries(app_module):
+    """Count statements sent to the app's engine inside the block."""
+    counter = QueryCounter()
+    with app_module.app.app_context():
+        engine = app_module.db.engine
+    event.listen(engine, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
+
+
+def wait_for_job(client, response, timeout=300):
+    """Follow a queued export (202 + job id) to its finished file and return the download response."""
+    if response.status_code != 202:
+        return response
+    job_id = response.get_json()["job_id"]
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(f"/jobs/{job_id}").get_json()
+        if status["status"] == "done":
+            return client.get(status["download_url"])
+        if status["status"] == "failed":
+            raise RuntimeError(status["error"])
+        time.sleep(0.05)
+    raise TimeoutError(job_id)
+
+
+def timed(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def ms(seconds):
+    return f"{seconds * 1000:9.1f} ms"
@@ -0,0 +1,155 @@
+"""Reproducible synthetic congregation for load tests.
+
+Generates students spread over the six age classes (with birth dates that
+match each class's age band), several years of Sunday attendance with a
+per-student attendance habit, teachers, and inventory items. The same
+seed always produces the same data.
+
+As a script it fills a database file of your choosing (never the real
+instance database unless you point it there):
+
+Usage: python benchmarks/synthetic_data.py out.db [students] [years] [teachers] [items]
+"""
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+
+from common import CLASSES, ROOT
+
+# Youngest and oldest age in each class, matching the promotion rules
+CLASS_AGES = {
+    "Genesis": (3, 5),
+    "Exodus": (6, 7),
+    "Psalms": (8, 9),
+    "Proverbs": (10, 11),
+    "Revelation": (12, 13),
+    "High Schoolers": (14, 17),
+}
+FIRST = ["Mary", "Joseph", "Wanjiru", "Achieng", "Brian", "Faith", "Kevin", "Grace", "Otieno", "Mercy",
+         "David", "Esther", "Samuel", "Ruth", "Daniel", "Naomi", "Peter", "Joy", "John", "Sharon"]
+LAST = ["Kamau", "Odhiambo", "Mwangi", "Njeri", "Kiprono", "Wafula", "Mutua", "Chebet", "Ouma", "Wambui",
+        "Karanja", "Atieno", "Kimani", "Nyambura", "Barasa", "Cherono", "Macharia", "Akinyi", "Kiptoo", "Moraa"]
+ITEM_CATEGORIES = {
+    "Chairs": ["Plastic Chair", "Folding Chair", "Kids Chair"],
+    "Tables": ["Folding Table", "Kids Table"],
+    "Boards": ["Whiteboard", "Flip Chart Stand"],
+    "Electronics": ["Projector", "Microphone", "Speaker", "Extension Cable"],
+    "Books": ["Children's Bible", "Song Book", "Activity Book"],
+    "Stationery": ["Crayon Box", "Pencil Pack", "Glue Stick"],
+}
+BATCH = 50000
+
+
+def birth_date(rng, student_class, today):
+    youngest, oldest = CLASS_AGES[student_class]
+    days = rng.randrange(int(youngest * 365.25) + 1, int((oldest + 1) * 365.25) - 1)
+    return today - timedelta(days=days)
+
+
+def insert_batches(db, model, rows):
+    for start in range(0, len(rows), BATCH):
+        db.session.execute(insert(model), rows[start:start + BATCH])
+
+
+def generate(app_module, students=2000, years=2, teachers=12, items=500, seed=2024, today=None):
+    """Fill the app's database and return a summary of what was created.
+
+    Run inside no app context; migrations are applied first so the data
+    goes through the same schema (FTS index, rollups) as production.
+    """
+    app, db = app_module.app, app_module.db
+    Student, Attendance, User = app_module.Student, app_module.Attendance, app_module.User
+    rng = random.Random(seed)
+    today = today or date.today()
+
+    with app.app_context():
+        app_module.run_migrations()
+
+        student_rows = []
+        for i in range(students):
+            student_class = CLASSES[i % len(CLASSES)]
+            last = rng.choice(LAST)
+            student_rows.append({
+                "name": f"{rng.choice(FIRST)} {last} {i}",
+                "dob": birth_date(rng, student_class, today),
+                "parent": f"{rng.choice(FIRST)} {last}",
+                "contact": f"07{rng.randrange(10**8):08d}",
+                "student_class": student_class,
+                "status": "active" if rng.random() < 0.9 else "inactive",
+                "deletion_requested": False,
+                "profile_image": "photo.jpg" if rng.random() < 0.8 else None,
+                "family_id": f"FAM{i // 3:05d}" if rng.random() < 0.3 else None,
+            })
+        insert_batches(db, Student, student_rows)
+
+        # Each student keeps roughly the same habit from week to week
+        sundays = app_module.get_sundays_between((today.year - years + 1, 1), (today.year, today.month))
+        sundays = [sunday for sunday in sundays if sunday <= today]
+        marks = 0
+        batch = []
+        for student_id, status in db.session.query(Student.id, Student.status).order_by(Student.id):
+            habit = rng.uniform(0.35, 0.95) if status == "active" else rng.uniform(0.0, 0.3)
+            for sunday in sundays:
+                batch.append({"student_id": student_id, "date": sunday, "present": rng.random() < habit})
+            if len(batch) >= BATCH:
+                db.session.execute(insert(Attendance), batch)
+                marks += len(batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(Attendance), batch)
+            marks += len(batch)
+        app_module.rebuild_attendance_rollups()
+
+        user_rows = [{"username": "admin@church.org", "email": "admin@church.org", "password": "admin123",
+                      "role": "admin", "full_name": "System Administrator", "status": "active",
+                      "created_at": datetime.now()}]
+        for i in range(teachers):
+            student_class = CLASSES[i % len(CLASSES)]
+            status = "active" if i < len(CLASSES) else rng.choice(["active", "pending", "suspended"])
+            user_rows.append({
+                "username": f"teacher{i}@church.org", "email": f"teacher{i}@church.org", "password": "teacher123",
+                "role": "teacher", "full_name": f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+                "phone": f"07{rng.randrange(10**8):08d}", "status": status,
+                "assigned_class": student_class if status != "pending" else None,
+                "preferred_class": student_class, "created_at": datetime.now(),
+            })
+        insert_batches(db, User, user_rows)
+
+        item_rows = []
+        categories = sorted(ITEM_CATEGORIES)
+        for i in range(items):
+            category = categories[i % len(categories)]
+            item_rows.append({
+                "item_name": f"{rng.choice(ITEM_CATEGORIES[category])} {i}", "quantity": int(rng.random() < 0.97),
+                "category": category, "qr_code": f"CCL{i:07d}",
+                "date_added": datetime.now(), "last_checked": datetime.now(),
+            })
+        insert_batches(db, app_module.Inventory, item_rows)
+        for category in categories:
+            db.session.add(app_module.Category(name=category))
+
+        db.session.commit()
+
+    return {"students": students, "sundays": len(sundays), "attendance": marks,
+            "users": len(user_rows), "items": items, "classes": list(CLASSES)}
+
+
+def main(path, students=2000, years=2, teachers=12, items=500):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(path)}"
+    sys.path.insert(0, ROOT)
+    import app as app_module
+    app_module.create_app(prepare_database=False)
+    with app_module.app.app_context():
+        app_module.db.create_all()
+    summary = generate(app_module, students, years, teachers, items)
+    print(f"{path}: {summary['students']} students, {summary['attendance']} attendance marks over "
+          f"{summary['sundays']} Sundays, {summary['users']} users, {summary['items']} inventory items")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    main(sys.argv[1], *[int(arg) for arg in sys.argv[2:]])
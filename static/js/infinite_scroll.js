@@ -0,0 +1,57 @@
+// Infinite scroll for paginated student lists.
+//
+// Markup: a container with data-rows-url (the /students/rows/<view> URL with
+// its filters) and data-cursor (the next page's cursor, empty when there is
+// none), followed by a .load-more element holding a fallback button. Each
+// page is appended to the container and a "rows:loaded" event is fired on
+// it so page scripts can pick up the new rows.
+document.querySelectorAll('[data-rows-url]').forEach(container => {
+    const loadMore = document.querySelector('.load-more[data-for="' + container.id + '"]');
+    if (!loadMore) return;
+    const button = loadMore.querySelector('button');
+    let loading = false;
+
+    function finish() {
+        loadMore.remove();
+        if (observer) observer.disconnect();
+    }
+
+    function loadNextPage() {
+        const cursor = container.dataset.cursor;
+        if (!cursor) return finish();
+        if (loading) return;
+        loading = true;
+        button.disabled = true;
+
+        const url = container.dataset.rowsUrl + (container.dataset.rowsUrl.includes('?') ? '&' : '?') +
+            'cursor=' + encodeURIComponent(cursor);
+        fetch(url, { headers: { 'Accept': 'text/html' } })
+            .then(response => {
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                container.dataset.cursor = response.headers.get('X-Next-Cursor') || '';
+                return response.text();
+            })
+            .then(html => {
+                container.insertAdjacentHTML('beforeend', html);
+                container.dispatchEvent(new CustomEvent('rows:loaded', { bubbles: true }));
+                loading = false;
+                button.disabled = false;
+                if (!container.dataset.cursor) finish();
+            })
+            .catch(() => {
+                // Leave the button for a manual retry
+                loading = false;
+                button.disabled = false;
+            });
+    }
+
+    button.addEventListener('click', loadNextPage);
+    const observer = 'IntersectionObserver' in window ? new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) loadNextPage();
+    }, { rootMargin: '400px' }) : null;
+    if (!container.dataset.cursor) {
+        finish();
+    } else if (observer) {
+        observer.observe(loadMore);
+    }
+});
@@ -0,0 +1,70 @@
+"""Shared fixtures: the app bound to a throwaway SQLite database per test.
+
+The real instance/church_register.db is never touched.
+"""
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def bound_app(tmp_path_factory):
+    # One database per run: the module holds a single app (see create_app)
+    scratch = tmp_path_factory.mktemp("ccl")
+    return app_module.create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{scratch / 'test.db'}",
+        "REPORT_CACHE_DIR": str(scratch / "report_cache"),
+        "REPORT_JOB_DIR": str(scratch / "report_jobs"),
+        "UPLOAD_FOLDER": str(scratch / "uploads"),
+    })
+
+
+@pytest.fixture
+def app(bound_app):
+    """The app with empty tables (plus the default users) and no cached data."""
+    with bound_app.app_context():
+        db = app_module.db
+        for table in reversed(db.metadata.sorted_tables):
+            if table.name != "schema_migration":
+                db.session.execute(table.delete())
+        db.session.commit()
+        app_module.create_default_users()
+        # Data versions start again from zero, so version-keyed caches are stale
+        app_module._roster_cache.clear()
+        app_module._coverage_cache.clear()
+        yield bound_app
+        db.session.remove()
+
+
+@pytest.fixture
+def db(app):
+    return app_module.db
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, role="admin", assigned_class=None, user_id=1):
+    with client.session_transaction() as sess:
+        sess["user"] = f"{role}@church.org"
+        sess["user_id"] = user_id
+        sess["role"] = role
+        sess["assigned_class"] = assigned_class
+        sess["full_name"] = role.title()
+
+
+def add_student(name, student_class="Genesis", dob=date(2021, 3, 1), status="active", **fields):
+    student = app_module.Student(name=name, dob=dob, parent=f"Parent of {name}", contact="0700000000",
+                                 student_class=student_class, status=status, **fields)
+    app_module.db.session.add(student)
+    app_module.db.session.commit()
+    return student
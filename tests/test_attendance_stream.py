@@ -0,0 +1,17 @@
+import app as app_module
+from conftest import login
+
+
+def test_stream_off_by_default(client):
+    login(client)
+    assert client.get("/attendance/stream").status_code == 204
+    assert "window.EventSource && false" in client.get("/dashboard").get_data(as_text=True)
+
+
+def test_stream_capped_when_enabled(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, "ATTENDANCE_STREAM_ENABLED", True)
+    monkeypatch.setitem(app.config, "ATTENDANCE_STREAM_MAX_CLIENTS", 0)
+    login(client)
+    assert client.get("/attendance/stream").status_code == 503
+    assert "window.EventSource && true" in client.get("/dashboard").get_data(as_text=True)
+    assert app_module._stream_clients == []
@@ -0,0 +1,45 @@
+from app import get_sundays
+from conftest import add_student, login
+
+MARCH = get_sundays(2026, 3)
+
+
+def revalidate(client, url):
+    first = client.get(url)
+    assert first.status_code == 200 and first.headers["ETag"]
+    assert "no-cache" in first.headers["Cache-Control"]
+    return first.headers["ETag"]
+
+
+def test_student_304_until_edited(client, db):
+    ada = add_student("Ada")
+    login(client)
+    url = f"/get_student/{ada.id}"
+    etag = revalidate(client, url)
+
+    repeat = client.get(url, headers={"If-None-Match": etag})
+    assert repeat.status_code == 304 and repeat.data == b""
+
+    ada.parent = "New parent"
+    db.session.commit()
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.get_json()["parent"] == "New parent"
+    assert changed.headers["ETag"] != etag
+
+
+def test_report_304_until_attendance_marked(client, db):
+    ada = add_student("Ada")
+    login(client)
+    url = "/attendance_report?year=2026&month=3"
+    etag = revalidate(client, url)
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/mark_attendance", data={"student_id": ada.id, "date": MARCH[0].isoformat(), "present": "true"})
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_etag_is_per_url(client, db):
+    login(client)
+    etag = revalidate(client, "/attendance_report?year=2026&month=3")
+    assert client.get("/attendance_report?year=2026&month=2", headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,32 @@
+import app as app_module
+from conftest import login
+
+
+def teachers_version():
+    return app_module.get_data_versions([app_module.TEACHER_SCOPE])[app_module.TEACHER_SCOPE]
+
+
+def test_login_leaves_teacher_panel_cached(client):
+    before = teachers_version()
+    response = client.post("/login", data={"email": "teacher@church.org", "password": "teacher123"})
+    assert response.status_code == 302
+    teacher = app_module.User.query.filter_by(email="teacher@church.org").one()
+    assert teacher.last_login is not None
+    assert teachers_version() == before
+
+
+def test_teacher_status_change_bumps_version(client):
+    teacher = app_module.User.query.filter_by(email="teacher@church.org").one()
+    before = teachers_version()
+    login(client)
+    client.post(f"/admin/suspend-teacher/{teacher.id}")
+    assert app_module.db.session.get(app_module.User, teacher.id).status == "suspended"
+    assert teachers_version() > before
+
+
+def test_teacher_page_shows_fresh_last_login(client):
+    login(client)
+    assert b"Last login: Never" in client.get("/admin/teachers").data
+    client.post("/login", data={"email": "teacher@church.org", "password": "teacher123"})
+    login(client)
+    assert b"Last login: Never" not in client.get("/admin/teachers").data
@@ -0,0 +1,60 @@
+import threading
+from datetime import date
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import app as app_module
+from app import Attendance, engine_options, upsert_attendance
+from conftest import add_student
+
+
+def pragma(db, name):
+    return db.session.execute(db.text(f"PRAGMA {name}")).scalar()
+
+
+def test_connections_get_the_pragmas(db):
+    assert pragma(db, "journal_mode") == "wal"
+    assert pragma(db, "foreign_keys") == 1
+    assert pragma(db, "synchronous") == 1  # NORMAL
+    assert pragma(db, "busy_timeout") == 5000
+
+
+def test_foreign_keys_are_enforced(db):
+    db.session.add(Attendance(student_id=999, date=date(2026, 3, 1), present=True))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+
+def test_engine_options(monkeypatch):
+    assert engine_options("sqlite://") == {}
+    monkeypatch.setenv("DB_POOL_SIZE", "4")
+    options = engine_options("sqlite:///church_register.db")
+    assert options["pool_size"] == 4 and "pool_pre_ping" not in options
+    options = engine_options("postgresql://register@db/register")
+    assert options["pool_pre_ping"] and options["pool_recycle"] == 1800
+
+
+def test_concurrent_marks_wait_instead_of_failing(app, db):
+    students = [add_student(f"Student {i}").id for i in range(8)]
+    days = app_module.get_sundays(2026, 3)
+    errors = []
+
+    def teacher(student_id):
+        with app.app_context():
+            try:
+                for day in days:
+                    upsert_attendance([{"student_id": student_id, "date": day, "present": True}])
+                    db.session.commit()
+            except Exception as exc:  # Reported below rather than lost in the thread
+                errors.append(exc)
+
+    threads = [threading.Thread(target=teacher, args=(student_id,)) for student_id in students]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert Attendance.query.count() == len(students) * len(days)
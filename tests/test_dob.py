@@ -0,0 +1,53 @@
+from datetime import date
+
+import pytest
+
+from app import Student, age_on, parse_legacy_dob, students_turning
+from conftest import add_student, login
+
+
+@pytest.mark.parametrize("value", ["2019-02-28", "28/02/2019", "2019/02/28", "28-02-2019", "28.02.2019", " 2019-02-28 "])
+def test_parse_legacy_dob_formats(value):
+    assert parse_legacy_dob(value) == date(2019, 2, 28)
+
+
+@pytest.mark.parametrize("value", ["", "31/02/2019", "next week", None])
+def test_parse_legacy_dob_rejects_unreadable(value):
+    assert parse_legacy_dob(value) is None
+
+
+def test_age_on_counts_the_birthday():
+    assert age_on(date(2020, 9, 1), date(2026, 8, 31)) == 5
+    assert age_on(date(2020, 9, 1), date(2026, 9, 1)) == 6
+    assert age_on(date(2020, 2, 29), date(2026, 3, 1)) == 6
+
+
+def test_dob_is_stored_as_a_date(db):
+    ada = add_student("Ada", dob=date(2020, 5, 17))
+    db.session.expire_all()
+    assert db.session.get(Student, ada.id).dob == date(2020, 5, 17)
+    assert Student.query.filter(Student.dob > date(2020, 5, 16)).all() == [ada]
+
+
+def test_students_turning(db):
+    add_student("Early", dob=date(2020, 3, 1))
+    add_student("Late", dob=date(2020, 8, 31))
+    add_student("On the day", dob=date(2020, 9, 1))
+    add_student("Younger", dob=date(2021, 1, 1))
+    add_student("Left", dob=date(2020, 4, 1), status="inactive")
+
+    turning = students_turning(6, date(2026, 9, 1))
+    assert [s.name for s in turning] == ["Early", "Late"]
+    turning = students_turning(6, date(2026, 9, 1), since=date(2026, 6, 1))
+    assert [s.name for s in turning] == ["Late"]
+
+
+def test_students_turning_route(client, db):
+    add_student("Ada", dob=date(2020, 3, 1))
+    add_student("Ben", dob=date(2020, 4, 1), student_class="Exodus")
+    login(client)
+
+    data = client.get("/students/turning?age=6&before=2026-09-01&class_name=Genesis").get_json()
+    assert [(s["name"], s["birthday"]) for s in data["students"]] == [("Ada", "2026-03-01")]
+    assert client.get("/students/turning?age=6&before=September").status_code == 400
+    assert client.get("/students/turning?before=2026-09-01").status_code == 400
@@ -0,0 +1,57 @@
+import pytest
+
+from app import Attendance, get_sundays
+from conftest import add_student, login
+
+SUNDAY = get_sundays(2026, 3)[0].isoformat()
+
+
+def test_mark_saves_and_flips(client, db):
+    ada = add_student("Ada")
+    login(client)
+    assert client.post("/mark_attendance", data={"student_id": ada.id, "date": SUNDAY, "present": "true"}).status_code == 200
+    assert client.post("/mark_attendance", data={"student_id": ada.id, "date": SUNDAY, "present": "false"}).status_code == 200
+    assert [row.present for row in Attendance.query.filter_by(student_id=ada.id)] == [False]
+
+
+def test_mark_rejects_bad_input(client, db):
+    login(client)
+    assert client.post("/mark_attendance", data={"student_id": 999, "date": SUNDAY, "present": "true"}).status_code == 400
+    assert client.post("/mark_attendance", data={"student_id": 1, "present": "true"}).status_code == 400
+    assert client.post("/mark_attendance", data={"date": SUNDAY, "present": "true"}).status_code == 400
+    assert Attendance.query.count() == 0
+
+
+def test_bulk_last_mark_wins(client, db):
+    ada = add_student("Ada")
+    login(client)
+    response = client.post("/mark_attendance/bulk", json=[
+        {"student_id": ada.id, "date": SUNDAY, "present": True},
+        {"student_id": ada.id, "date": SUNDAY, "present": False},
+    ])
+    assert response.get_json() == {"saved": 1}
+    assert Attendance.query.one().present is False
+
+
+def test_bulk_rejects_unknown_students_without_saving(client, db):
+    ada = add_student("Ada")
+    login(client)
+    response = client.post("/mark_attendance/bulk", json=[
+        {"student_id": ada.id, "date": SUNDAY, "present": True},
+        {"student_id": 999, "date": SUNDAY, "present": True},
+    ])
+    assert response.status_code == 400
+    assert response.get_json()["student_ids"] == [999]
+    assert Attendance.query.count() == 0
+
+    bad_date = client.post("/mark_attendance/bulk", json=[{"student_id": ada.id, "date": "03/01/2026", "present": True}])
+    assert bad_date.status_code == 400
+
+
+@pytest.mark.parametrize("present", ["false", "0", 1, 0, None])
+def test_bulk_requires_boolean_present(client, db, present):
+    ada = add_student("Ada")
+    login(client)
+    response = client.post("/mark_attendance/bulk", json=[{"student_id": ada.id, "date": SUNDAY, "present": present}])
+    assert response.status_code == 400
+    assert Attendance.query.count() == 0
@@ -0,0 +1,9 @@
+from conftest import login
+
+
+def test_no_profiling_headers_unless_enabled(app, client):
+    assert not app.config["PERF_INSTRUMENTATION"]
+    login(client)
+    response = client.get("/dashboard")
+    assert response.status_code == 200
+    assert "X-Query-Count" not in response.headers
@@ -0,0 +1,36 @@
+from app import PromotionLog, Student
+from conftest import add_student, login
+
+
+def promote(client, student_ids, new_class):
+    return client.post("/promote_students", data={"promotion_type": "manual", "student_ids": student_ids,
+                                                  "new_class": new_class}, follow_redirects=True)
+
+
+def test_manual_promotion_moves_selected(client, db):
+    ada, ben = add_student("Ada"), add_student("Ben")
+    login(client)
+    promote(client, [str(ada.id)], "Exodus")
+    db.session.expire_all()
+    assert (ada.student_class, ben.student_class) == ("Exodus", "Genesis")
+    assert PromotionLog.query.one().student_id == ada.id
+
+
+def test_manual_promotion_rejects_bad_input(client, db):
+    ada = add_student("Ada")
+    login(client)
+    assert b"Invalid student selection" in promote(client, [str(ada.id), "abc"], "Exodus").data
+    assert b"Unknown class" in promote(client, [str(ada.id)], "Narnia").data
+    assert Student.query.filter_by(student_class="Genesis").count() == 1
+    assert PromotionLog.query.count() == 0
+
+
+def test_manual_promotion_reports_skipped_students(client, db):
+    ada, ben = add_student("Ada"), add_student("Ben", student_class="Exodus")
+    gone = add_student("Gone", status="inactive")
+    login(client)
+    page = promote(client, [str(ada.id), str(ben.id), str(gone.id), "999"], "Exodus").get_data(as_text=True)
+    assert "moved 1 students to Exodus" in page
+    assert "Skipped 3: 1 already in Exodus, 1 not active, 1 no longer in the register." in page
+    db.session.expire_all()
+    assert gone.student_class == "Genesis"
@@ -0,0 +1,64 @@
+import app as app_module
+from app import (Attendance, AttendanceRollup, ClassAttendanceDay, ClassAttendanceRollup, PromotionLog, Student,
+                 User, purge_students, upsert_attendance)
+from conftest import add_student, login
+
+MARCH = app_module.get_sundays(2026, 3)
+
+
+def seed(db):
+    keep, go = add_student("Keep"), add_student("Go")
+    upsert_attendance([{"student_id": s.id, "date": day, "present": True}
+                       for s in (keep, go) for day in MARCH[:2]])
+    db.session.add(PromotionLog(run_id="run", student_id=go.id, from_class="Genesis", to_class="Exodus",
+                                kind="manual", promoted_by=1))
+    db.session.commit()
+    return keep, go
+
+
+def test_purge_cascades_and_refreshes_class_rollups(db):
+    keep_id, go_id = (student.id for student in seed(db))
+
+    assert purge_students(Student.id == go_id) == {"matched": 1, "deleted": 1}
+    assert Attendance.query.filter_by(student_id=go_id).count() == 0
+    assert AttendanceRollup.query.filter_by(student_id=go_id).count() == 0
+    assert PromotionLog.query.count() == 0
+    assert Attendance.query.filter_by(student_id=keep_id).count() == 2
+
+    totals = ClassAttendanceRollup.query.filter_by(student_class="Genesis", year=2026, month=3).one()
+    assert (totals.present_count, totals.student_count, totals.sundays_held) == (2, 1, 2)
+    assert [row.marked_count for row in ClassAttendanceDay.query.order_by(ClassAttendanceDay.date)] == [1, 1]
+
+
+def test_purge_in_chunks_with_dry_run(db):
+    for i in range(5):
+        add_student(f"Student {i}")
+    progress = []
+
+    assert purge_students(db.true(), dry_run=True) == {"matched": 5, "deleted": 0}
+    assert Student.query.count() == 5
+    assert purge_students(db.true(), chunk_size=2, progress=lambda *args: progress.append(args)) \
+        == {"matched": 5, "deleted": 5}
+    assert progress == [(2, 5), (4, 5), (5, 5)]
+    assert Student.query.count() == 0
+
+
+def test_purge_bumps_roster_version(db):
+    go_id = seed(db)[1].id
+    before = app_module.get_data_versions(["roster:Genesis"])["roster:Genesis"]
+    purge_students(Student.id == go_id)
+    assert app_module.get_data_versions(["roster:Genesis"])["roster:Genesis"] > before
+
+
+def test_deleting_teacher_clears_approved_by(client, db):
+    teacher = User.query.filter_by(email="teacher@church.org").one()
+    approved = User(username="new", password="x", role="teacher", email="new@church.org",
+                    status="active", approved_by=teacher.id)
+    db.session.add(approved)
+    db.session.commit()
+    login(client)
+
+    client.post(f"/admin/delete-teacher/{teacher.id}")
+    db.session.expire_all()
+    assert db.session.get(User, teacher.id) is None
+    assert db.session.get(User, approved.id).approved_by is None
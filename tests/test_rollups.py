@@ -0,0 +1,125 @@
+from datetime import date
+
+import app as app_module
+from app import Attendance, AttendanceRollup, ClassAttendanceDay, ClassAttendanceRollup, upsert_attendance
+from conftest import add_student
+
+MARCH = app_module.get_sundays(2026, 3)
+
+
+def mark(student, day, present):
+    upsert_attendance([{"student_id": student.id, "date": day, "present": present}])
+    app_module.db.session.commit()
+
+
+def class_totals(student_class="Genesis", year=2026, month=3):
+    row = ClassAttendanceRollup.query.filter_by(student_class=student_class, year=year, month=month).first()
+    return row and (row.present_count, row.student_count, row.sundays_held)
+
+
+def snapshot():
+    return (
+        sorted((r.student_id, r.year, r.month, r.student_class, r.present_count, r.marked_count)
+               for r in AttendanceRollup.query),
+        sorted((r.student_class, r.year, r.month, r.present_count, r.student_count, r.sundays_held)
+               for r in ClassAttendanceRollup.query if r.student_count),
+        sorted((r.student_class, r.date, r.marked_count) for r in ClassAttendanceDay.query),
+    )
+
+
+def test_mark_and_unmark_adjust_totals(db):
+    ada, ben = add_student("Ada"), add_student("Ben")
+
+    mark(ada, MARCH[0], True)
+    mark(ben, MARCH[0], True)
+    assert class_totals() == (2, 2, 1)
+
+    mark(ben, MARCH[0], False)
+    assert class_totals() == (1, 2, 1)
+    assert AttendanceRollup.query.filter_by(student_id=ben.id).one().marked_count == 1
+
+    mark(ada, MARCH[1], False)
+    assert class_totals() == (1, 2, 2)
+
+
+def test_repeat_mark_changes_nothing(db):
+    ada = add_student("Ada")
+    mark(ada, MARCH[0], True)
+    versions = app_module.get_data_versions(["attendance:Genesis:2026-03"])
+
+    mark(ada, MARCH[0], True)
+    assert app_module.get_data_versions(["attendance:Genesis:2026-03"]) == versions
+    assert class_totals() == (1, 1, 1)
+
+
+def test_deleting_last_mark_empties_month(db):
+    ada, ben = add_student("Ada"), add_student("Ben")
+    mark(ada, MARCH[0], True)
+    mark(ben, MARCH[1], True)
+
+    db.session.delete(Attendance.query.filter_by(student_id=ben.id).one())
+    db.session.commit()
+    assert AttendanceRollup.query.filter_by(student_id=ben.id).count() == 0
+    assert class_totals() == (1, 1, 1)
+
+
+def test_month_stays_with_class_it_was_marked_in(db):
+    ada = add_student("Ada")
+    mark(ada, MARCH[0], True)
+    ada.student_class = "Exodus"
+    db.session.commit()
+
+    mark(ada, MARCH[1], True)
+    assert class_totals("Genesis") == (2, 1, 2)
+    assert class_totals("Exodus") is None
+
+
+def test_deltas_match_full_rebuild(db):
+    students = [add_student(f"Student {i}", student_class) for i, student_class in
+                enumerate(["Genesis", "Genesis", "Exodus", "Exodus", None])]
+    days = MARCH + app_module.get_sundays(2026, 4)
+    for n in range(40):
+        upsert_attendance([{"student_id": students[(n * 7 + i) % len(students)].id,
+                            "date": days[(n + i * 3) % len(days)], "present": (n + i) % 3 != 0}
+                           for i in range(4)])
+        db.session.commit()
+    db.session.delete(Attendance.query.first())
+    db.session.add(Attendance(student_id=students[0].id, date=date(2026, 5, 3), present=False))
+    db.session.commit()
+
+    incremental = snapshot()
+    app_module.rebuild_attendance_rollups()
+    db.session.commit()
+    assert snapshot() == incremental
+
+
+def test_moving_a_row_moves_its_counts(db):
+    ada, ben = add_student("Ada"), add_student("Ben", "Exodus")
+    mark(ada, MARCH[0], True)
+    mark(ada, MARCH[1], True)
+    record = Attendance.query.filter_by(student_id=ada.id, date=MARCH[1]).one()
+
+    record.student_id, record.date = ben.id, date(2026, 4, 5)
+    db.session.commit()
+    assert class_totals("Genesis") == (1, 1, 1)
+    assert class_totals("Exodus", month=4) == (1, 1, 1)
+
+    incremental = snapshot()
+    app_module.rebuild_attendance_rollups()
+    db.session.commit()
+    assert snapshot() == incremental
+
+
+def test_flush_looks_up_classes_once(db):
+    student_ids = [add_student(f"Student {i}").id for i in range(5)]
+    statements = []
+    listen = lambda *args: statements.append(args[2])
+    app_module.event.listen(db.engine, "before_cursor_execute", listen)
+    try:
+        db.session.add_all([Attendance(student_id=student_id, date=MARCH[0], present=True)
+                            for student_id in student_ids])
+        db.session.commit()
+    finally:
+        app_module.event.remove(db.engine, "before_cursor_execute", listen)
+    assert sum("student.student_class" in sql and "FROM student" in sql for sql in statements) == 1
+    assert class_totals() == (5, 5, 1)
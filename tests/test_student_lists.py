@@ -0,0 +1,39 @@
+import pytest
+
+from app import Student, keyset_page
+from conftest import add_student
+
+
+def walk(query, per_page):
+    names, cursor = [], None
+    while True:
+        students, cursor = keyset_page(query, cursor, per_page)
+        names.extend(student.name for student in students)
+        if cursor is None:
+            return names
+
+
+@pytest.mark.parametrize("per_page", [1, 2, 3, 50])
+def test_pages_cover_students_without_a_class(db, per_page):
+    for name, student_class in [("Ben", None), ("Ada", None), ("Cal", "Exodus"),
+                                ("Dee", "Genesis"), ("Eve", None), ("Fay", "Exodus")]:
+        add_student(name, student_class)
+
+    assert walk(Student.query.filter(Student.status == "active"), per_page) == \
+        ["Ada", "Ben", "Eve", "Cal", "Fay", "Dee"]
+
+
+def test_same_name_pages_by_id(db):
+    ids = [add_student("Sam", None).id for _ in range(3)] + [add_student("Sam", "Genesis").id for _ in range(2)]
+    seen, cursor = [], None
+    while True:
+        students, cursor = keyset_page(Student.query, cursor, 2)
+        seen.extend(student.id for student in students)
+        if cursor is None:
+            break
+    assert seen == ids
+
+
+def test_malformed_cursor_is_rejected(db):
+    with pytest.raises(ValueError):
+        keyset_page(Student.query, "not-a-cursor")
@@ -0,0 +1,65 @@
+import os
+from io import BytesIO
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+import app as app_module
+from app import file_digest, process_profile_image, store_upload
+from conftest import add_student
+
+
+def photo_upload(size=(64, 48), fmt="JPEG", gps=False, filename="photo.jpg"):
+    exif = Image.Exif()
+    if gps:
+        exif[0x8825] = {2: (51.0, 30.0, 0.0)}  # GPSInfo: latitude
+    data = BytesIO()
+    Image.new("RGB", size, "teal").save(data, fmt, exif=exif.tobytes())
+    data.seek(0)
+    return FileStorage(stream=data, filename=filename)
+
+
+def stored_path(app, filename):
+    return os.path.join(app.config["UPLOAD_FOLDER"], filename)
+
+
+def test_upload_is_named_after_its_stripped_bytes(app):
+    filename = store_upload(photo_upload(gps=True))
+    path = stored_path(app, filename)
+    assert filename == f"{file_digest(path)}.jpg"
+    with Image.open(path) as stored:
+        assert not stored.getexif()
+
+
+def test_oversized_upload_is_capped(app):
+    filename = store_upload(photo_upload(size=(2400, 1200), fmt="PNG", filename="big.png"))
+    path = stored_path(app, filename)
+    with Image.open(path) as stored:
+        assert max(stored.size) == app_module.PROFILE_ORIGINAL_MAX_SIZE
+    assert filename == f"{file_digest(path)}.png"
+
+
+def test_same_photo_twice_is_stored_once(app):
+    assert store_upload(photo_upload(gps=True)) == store_upload(photo_upload(gps=True))
+
+
+def test_variants_leave_original_untouched(app):
+    filename = store_upload(photo_upload(size=(1000, 800)))
+    app_module.image_executor.submit(lambda: None).result()  # One worker, so the queued run is done
+    process_profile_image(filename)
+    assert filename == f"{file_digest(stored_path(app, filename))}.jpg"
+    variant = app_module.image_variant_name(filename, app_module.PROFILE_IMAGE_SIZES["card"], "webp")
+    assert os.path.exists(os.path.join(app_module.variant_folder(), variant))
+
+
+def test_removed_photo_waits_for_the_sweep(app):
+    filename = store_upload(photo_upload())
+    student = add_student("Ada", profile_image=filename)
+    app_module.purge_students(app_module.Student.id == student.id)
+    assert os.path.exists(stored_path(app, filename))
+
+    assert app_module.collect_orphan_uploads() == 0  # Still inside the grace period
+    old = os.path.getmtime(stored_path(app, filename)) - app.config["UPLOAD_GC_GRACE_MINUTES"] * 60 - 1
+    os.utime(stored_path(app, filename), (old, old))
+    assert app_module.collect_orphan_uploads() == 1
+    assert not os.path.exists(stored_path(app, filename))